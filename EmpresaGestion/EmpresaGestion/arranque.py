@@ -0,0 +1,22 @@
+# EmpresaGestion/arranque.py
+
+"""
+Preparación de un worker WSGI/ASGI en el perfil de producción (settings.PERFIL).
+
+Django importa la URLconf (vistas, serializadores, ViewSets) y compila las
+expresiones de las rutas y las tablas de reverse() en la primera petición
+que las necesita, que tarda así decenas de milisegundos más que las
+siguientes. wsgi.py y asgi.py lo hacen al cargarse: con 'gunicorn --preload'
+una sola vez en el proceso maestro, que los workers heredan al crearse.
+"""
+
+from django.urls import get_resolver
+
+
+def preparar_urls():
+    """Importa la URLconf y construye las tablas de resolución y de reverse() del idioma activo."""
+    resolver = get_resolver()
+    resolver.url_patterns
+    # Recorre todas las rutas (también las incluidas) compilando sus expresiones
+    resolver.reverse_dict
+    return resolver
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "EmpresaGestion.settings")
 
 application = get_asgi_application()
+
+# Perfil de producción: las URLs se preparan al cargar el módulo, no en la primera petición (arranque.py)
+if getattr(settings, "PERFIL", None) == "produccion":
+    from EmpresaGestion.arranque import preparar_urls
+
+    preparar_urls()
@@ -9,20 +9,32 @@ https://docs.djangoproject.com/en/5.0/topics/settings/
 Para ver la lista completa de configuraciones y sus valores predeterminados, consulte
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
-from decouple import config
+import os
+
+from decouple import Config, Csv, RepositoryEmpty, config
 from pathlib import Path
 from django.conf.global_settings import INTERNAL_IPS
+from django.core.exceptions import ImproperlyConfigured
 
 # Construye rutas dentro del proyecto como: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Perfil de ejecución: 'desarrollo' (por defecto) o 'produccion' (DJANGO_PERFIL=produccion en el entorno
+# de los workers WSGI/ASGI). En producción la configuración se lee solo de las variables de entorno, sin
+# buscar ni leer un .env, DEBUG queda desactivado y wsgi.py/asgi.py preparan las URLs al cargarse
+PERFIL = os.environ.get('DJANGO_PERFIL', 'desarrollo')
+if PERFIL not in ('desarrollo', 'produccion'):
+    raise ImproperlyConfigured("DJANGO_PERFIL debe ser 'desarrollo' o 'produccion', no %r." % PERFIL)
+if PERFIL == 'produccion':
+    config = Config(RepositoryEmpty())
+
 
 # Configuración de seguridad
 # ¡ADVERTENCIA DE SEGURIDAD: mantenga la clave secreta utilizada en producción en secreto!
 SECRET_KEY = config('SECRET_KEY')
 
 # ¡ADVERTENCIA DE SEGURIDAD: no ejecute con DEBUG = True en producción!
-DEBUG = config('DEBUG', default=False, cast=bool)
+DEBUG = PERFIL == 'desarrollo' and config('DEBUG', default=False, cast=bool)
 
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default=[], cast=list)
 
@@ -37,14 +49,14 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',  # Añade Django REST Framework
     'gestion_empresa', # Añade tu aplicación
-    'tailwind',  # Añade Tailwind CSS
-    'django_browser_reload',  # Añade Django Browser Reload para recarga automática
-    'theme',  # Nombre de la aplicación de Tailwind CSS
     'users',  # Añade tu aplicación de usuarios
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.gzip.GZipMiddleware', # Respuestas comprimidas si el cliente envía Accept-Encoding: gzip
+    'gestion_empresa.middleware.MetricasMiddleware', # Métricas por endpoint (/api/metricas/), antes de comprimir
+    'gestion_empresa.middleware.ReplicaMiddleware', # Lecturas GET en réplicas (routers.py)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -53,6 +65,16 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Solo en desarrollo (DEBUG): Tailwind CSS y la recarga automática del navegador. Sin DEBUG no se
+# importan al arrancar cada worker, ni sus comprobaciones, plantillas y middleware
+if DEBUG:
+    INSTALLED_APPS += [
+        'tailwind',  # Añade Tailwind CSS
+        'django_browser_reload',  # Añade Django Browser Reload para recarga automática
+        'theme',  # Nombre de la aplicación de Tailwind CSS
+    ]
+    MIDDLEWARE += ['django_browser_reload.middleware.BrowserReloadMiddleware']
+
 ROOT_URLCONF = 'EmpresaGestion.urls'
 
 TEMPLATES = [
@@ -85,16 +107,81 @@ if config('DB_ENGINE', default='mysql') == 'mysql': # Verifica el motor de la ba
             "USER": config('DB_USER'),
             "PASSWORD": config('DB_PASSWORD'),
             "HOST": config('DB_HOST'),
-            "PORT": config('DB_PORT')
+            "PORT": config('DB_PORT'),
+            # Conexiones persistentes: cada hilo reutiliza su conexión durante DB_CONN_MAX_AGE
+            # segundos (Django no tiene pool propio para MySQL) y la comprueba antes de usarla.
+            # Con ASGI conviene DB_CONN_MAX_AGE=0.
+            "CONN_MAX_AGE": config('DB_CONN_MAX_AGE', default=60, cast=int),
+            "CONN_HEALTH_CHECKS": True,
         }
     }
+    # Réplicas de solo lectura (mismo usuario y base de datos): DB_REPLICA_HOSTS=host1,host2
+    for i, host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), start=1):
+        DATABASES['replica_%d' % i] = dict(DATABASES['default'], HOST=host, TEST={'MIRROR': 'default'})
 elif config('DB_ENGINE', default='mysql') == 'sqlite':
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',  # Base de datos SQLite en el directorio del proyecto
-        }
+            # La migración 0004 (cambio de clave primaria de Producto) no se puede aplicar en SQLite;
+            # la base de datos de pruebas se crea directamente a partir de los modelos.
+            # En memoria por defecto; las pruebas con varios hilos (escrituras concurrentes)
+            # necesitan un fichero: SQLITE_TEST_NAME=/tmp/test_empresa.sqlite3
+            'TEST': {'MIGRATE': False, 'NAME': config('SQLITE_TEST_NAME', default=None)},
+        },
+        # Réplica local para probar el enrutado de lecturas con dos ficheros SQLite
+        # (p. ej. una copia de db.sqlite3); solo se usa con SQLITE_USAR_REPLICA=True
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('SQLITE_REPLICA_NAME', default=str(BASE_DIR / 'db_replica.sqlite3')),
+            'TEST': {'MIGRATE': False},
+        },
+    }
+
+# Lecturas de los ViewSets de gestion_empresa en réplicas (gestion_empresa/routers.py)
+if config('DB_ENGINE', default='mysql') == 'sqlite':
+    REPLICA_DATABASES = ['replica'] if config('SQLITE_USAR_REPLICA', default=False, cast=bool) else []
+else:
+    REPLICA_DATABASES = [alias for alias in DATABASES if alias.startswith('replica_')]
+DATABASE_ROUTERS = ['gestion_empresa.routers.ReplicaRouter']
+REPLICA_STICKY_COOKIE = 'db_primario'
+# Segundos que un cliente lee del primario tras escribir (retraso máximo esperado de la réplica)
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+
+
+# Caché
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Por defecto, memoria local del proceso; en producción conviene un backend compartido
+# (p. ej. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache y CACHE_LOCATION=redis://...)
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='empresa-gestion'),
     }
+}
+
+API_CACHE_TIMEOUT = config('API_CACHE_TIMEOUT', default=300, cast=int) # Segundos que una respuesta de la API permanece en caché
+# Segundos que se reutiliza un informe de ventas (/api/informes/) con los mismos parámetros
+INFORMES_CACHE_TIMEOUT = config('INFORMES_CACHE_TIMEOUT', default=60, cast=int)
+
+
+# Métricas de rendimiento por endpoint (gestion_empresa.middleware.MetricasMiddleware)
+
+METRICAS_ACTIVAS = config('METRICAS_ACTIVAS', default=True, cast=bool)
+# Peticiones más lentas que este umbral se registran con su SQL y EXPLAIN en el logger
+# 'gestion_empresa.lento'; 0 lo desactiva
+METRICAS_UMBRAL_LENTO_MS = config('METRICAS_UMBRAL_LENTO_MS', default=0, cast=float)
+
+# API de sincronización (/api/cambios/): un hueco en la secuencia del registro de cambios más
+# reciente que esto puede ser una transacción aún abierta y el cursor no lo rebasa
+CAMBIOS_MARGEN_SEGUNDOS = config('CAMBIOS_MARGEN_SEGUNDOS', default=60, cast=int)
+
+# Consulta por lotes (<recurso>/batch/): número máximo de claves por petición
+API_BATCH_MAXIMO = config('API_BATCH_MAXIMO', default=100, cast=int)
+
+# Serie de numeración de las facturas que se dan de alta sin número (gestion_empresa/numeracion.py)
+FACTURAS_SERIE = config('FACTURAS_SERIE', default='A')
 
 
 # Validadores de contraseña
@@ -136,6 +223,11 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'  # Directorio para archivos subidos por el
+# Ficheros generados por los trabajos en segundo plano (gestion_empresa/trabajos.py); no se
+# sirven como media: se descargan por la API, solo el personal
+TRABAJOS_DIR = config('TRABAJOS_DIR', default=str(MEDIA_ROOT / 'trabajos'))
+# Procesos del pool de 'manage.py trabajos'; 0: uno por CPU
+TRABAJOS_PROCESOS = config('TRABAJOS_PROCESOS', default=0, cast=int)
 
 # Tipo de campo de clave primaria predeterminado
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -157,10 +249,11 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny' # Permite acceso sin autenticación para este ejemplo.
                                              # Para producción, deberías usar 'IsAuthenticated', etc.
     ],
-    'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer', # Útil para depuración en el navegador
-    ],
+    # JSON con orjson si está instalado (ver renderers.py); la API navegable, solo en desarrollo
+    'DEFAULT_RENDERER_CLASSES': ['gestion_empresa.renderers.JSONRapidoRenderer'] + (
+        ['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # Filtros por parámetros de consulta declarados en cada ViewSet ('filtros')
+    'DEFAULT_FILTER_BACKENDS': ['gestion_empresa.filters.FiltrosPorParametroBackend'],
     'PAGE_SIZE': 10 # Número de elementos por página en las respuestas de la API
 }
@@ -16,10 +16,15 @@ Incluyendo otra configuración de URL
     1. Importa la función include(): from django.urls import include, path
     2. Agrega una URL a urlpatterns: path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('gestion_empresa.urls')), # Incluye las URLs de tu aplicación gestion_empresa
-]
\ No newline at end of file
+]
+
+# Recarga automática del navegador: solo en desarrollo, como su aplicación (settings.py)
+if settings.DEBUG:
+    urlpatterns += [path('__reload__/', include('django_browser_reload.urls'))]
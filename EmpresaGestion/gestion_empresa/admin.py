@@ -1,3 +1,207 @@
+# gestion_empresa/admin.py
+
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from . import services
+from .filters import filtrar_prefijo
+from .models import Cliente, Factura, FacturaDetalle, Pedido, PedidoLinea, Producto, Proveedor, SerieFactura, Trabajo
+
+
+def filas_estimadas(modelo, alias):
+    """
+    Número aproximado de filas de la tabla de 'modelo' según las estadísticas
+    del motor (None si no las hay): TABLE_ROWS en MySQL, reltuples en
+    PostgreSQL y sqlite_stat1 (tras ANALYZE) en SQLite.
+    """
+    conexion = connections[alias]
+    tabla = modelo._meta.db_table
+    with conexion.cursor() as cursor:
+        if conexion.vendor == 'mysql':
+            cursor.execute('SELECT TABLE_ROWS FROM information_schema.TABLES '
+                           'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', [tabla])
+        elif conexion.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)',
+                           [conexion.ops.quote_name(tabla)])
+        elif conexion.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [tabla])
+        else:
+            return None
+        fila = cursor.fetchone()
+    if fila is None or fila[0] is None:
+        return None
+    # sqlite_stat1: 'filas [filas por valor del índice...]'; reltuples es -1 si la tabla no se ha analizado
+    estimado = int(str(fila[0]).split()[0]) if conexion.vendor == 'sqlite' else int(fila[0])
+    return estimado if estimado >= 0 else None
+
+
+# Paginador del admin con recuento estimado para los listados grandes sin filtrar
+class ConteoEstimadoPaginator(Paginator):
+    """
+    Sin filtros ni búsqueda, COUNT(*) recorre la tabla entera en cada página
+    del listado. Si las estadísticas del motor indican al menos 'minimo'
+    filas se usa su estimación (el número de páginas es aproximado); con
+    filtros, o en tablas pequeñas, el recuento es exacto.
+    """
+    minimo = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimado = filas_estimadas(queryset.model, queryset.db)
+            if estimado is not None and estimado >= self.minimo:
+                return estimado
+        return queryset.count()
+
+
+# Admin base: listados sin recuento total ni consultas por fila
+class ListadoRapidoAdmin(admin.ModelAdmin):
+    """
+    - show_full_result_count = False: sin el segundo COUNT(*) sobre la tabla
+      completa cuando hay filtros ("N resultados (M en total)").
+    - Las subclases declaran list_select_related con las relaciones que usan
+      list_display y __str__, y widgets de clave ajena que no cargan todas
+      las filas relacionadas en un <select> (raw_id_fields / autocomplete_fields).
+    """
+    show_full_result_count = False
+    paginator = ConteoEstimadoPaginator
+
+
+# Mixin para buscar por prefijo sobre el índice Lower(campo) (filters.py); un número busca por clave
+class BusquedaPorPrefijoMixin:
+    campo_prefijo = None
+
+    def get_search_results(self, request, queryset, search_term):
+        termino = search_term.strip()
+        if not termino:
+            return queryset, False
+        if termino.isdigit():
+            return queryset.filter(pk=int(termino)), False
+        return filtrar_prefijo(queryset, self.campo_prefijo, termino), False
+
+
+# Admin de Cliente
+@admin.register(Cliente)
+class ClienteAdmin(BusquedaPorPrefijoMixin, ListadoRapidoAdmin):
+    list_display = ('id', 'NombreCliente', 'celular', 'updated_at')
+    search_fields = ('NombreCliente',)
+    campo_prefijo = 'NombreCliente'
+
+
+# Admin de Proveedor: el borrado (botón y acción "Eliminar seleccionados") se hace por bloques
+@admin.register(Proveedor)
+class ProveedorAdmin(ListadoRapidoAdmin):
+    """
+    Borrar un proveedor arrastra sus productos y las líneas de pedido y de
+    factura de esos productos. El borrado estándar del admin carga todos
+    esos objetos, primero para la página de confirmación y después para la
+    cascada; aquí la confirmación muestra recuentos y el borrado usa
+    services.borrar_proveedor_por_bloques.
+    """
+    list_display = ('rut', 'razon_social', 'telefono')
+    search_fields = ('razon_social',)
+
+    def get_deleted_objects(self, objs, request):
+        proveedores = [obj.pk for obj in objs]
+        recuentos = {
+            Proveedor._meta.verbose_name_plural: len(proveedores),
+            Producto._meta.verbose_name_plural: Producto.objects.filter(id_proveedor__in=proveedores).count(),
+            PedidoLinea._meta.verbose_name_plural:
+                PedidoLinea.objects.filter(producto__id_proveedor__in=proveedores).count(),
+            FacturaDetalle._meta.verbose_name_plural:
+                FacturaDetalle.objects.filter(producto__id_proveedor__in=proveedores).count(),
+        }
+        permisos = set() if self.has_delete_permission(request) else {Proveedor._meta.verbose_name}
+        return [str(obj) for obj in objs], {k: v for k, v in recuentos.items() if v}, permisos, []
+
+    def delete_model(self, request, obj):
+        services.borrar_proveedor_por_bloques(obj)
+
+    def delete_queryset(self, request, queryset):
+        for proveedor in queryset:
+            services.borrar_proveedor_por_bloques(proveedor)
+
+
+# Admin de Producto
+@admin.register(Producto)
+class ProductoAdmin(BusquedaPorPrefijoMixin, ListadoRapidoAdmin):
+    list_display = ('codigo', 'descripcion', 'precio', 'id_proveedor')
+    list_select_related = ('id_proveedor',)
+    autocomplete_fields = ('id_proveedor',)
+    search_fields = ('descripcion',)
+    campo_prefijo = 'descripcion'
+
+
+# Líneas de un pedido dentro de su formulario; el producto se elige por código
+class PedidoLineaInline(admin.TabularInline):
+    model = PedidoLinea
+    fields = ('producto', 'cantidad')
+    raw_id_fields = ('producto',)
+    extra = 0
+
+
+# Admin de Pedido
+@admin.register(Pedido)
+class PedidoAdmin(ListadoRapidoAdmin):
+    list_display = ('id_pedido', 'fecha', 'cliente')
+    list_select_related = ('cliente',)
+    autocomplete_fields = ('cliente',)
+    # fecha y la clave recorren el índice pedidos_fecha_pk_idx, también al acotar por año o mes
+    date_hierarchy = 'fecha'
+    ordering = ('-fecha', '-id_pedido')
+    inlines = [PedidoLineaInline]
+
+
+# Admin de PedidoLinea
+@admin.register(PedidoLinea)
+class PedidoLineaAdmin(ListadoRapidoAdmin):
+    list_display = ('id', 'pedido', 'producto', 'cantidad')
+    list_select_related = ('pedido__cliente', 'producto')
+    raw_id_fields = ('pedido', 'producto')
+
+
+# Líneas de una factura dentro de su formulario; el producto se elige por código
+class FacturaDetalleInline(admin.TabularInline):
+    model = FacturaDetalle
+    fields = ('producto', 'cantidad', 'precio_unitario')
+    raw_id_fields = ('producto',)
+    extra = 0
+
+
+# Admin de Factura
+@admin.register(Factura)
+class FacturaAdmin(ListadoRapidoAdmin):
+    list_display = ('num', 'fecha', 'cliente', 'importe')
+    list_select_related = ('cliente',)
+    autocomplete_fields = ('cliente',)
+    date_hierarchy = 'fecha'
+    ordering = ('-fecha', '-num')
+    inlines = [FacturaDetalleInline]
+
+
+# Admin de FacturaDetalle
+@admin.register(FacturaDetalle)
+class FacturaDetalleAdmin(ListadoRapidoAdmin):
+    list_display = ('id', 'factura', 'producto', 'cantidad', 'precio_unitario')
+    list_select_related = ('factura', 'producto')
+    raw_id_fields = ('factura', 'producto')
+
+
+# Admin de SerieFactura: los cambios no afectan a los bloques ya reservados por los procesos (numeracion.py)
+@admin.register(SerieFactura)
+class SerieFacturaAdmin(admin.ModelAdmin):
+    list_display = ('codigo', 'siguiente', 'hasta', 'sin_huecos', 'tamano_bloque')
+
 
-# Register your models here.
+# Admin de Trabajo: consulta de la cola; los trabajos se encolan por la API y los ejecuta 'manage.py trabajos'
+@admin.register(Trabajo)
+class TrabajoAdmin(ListadoRapidoAdmin):
+    list_display = ('id', 'tipo', 'estado', 'creado', 'iniciado', 'terminado', 'ejecutor')
+    list_filter = ('estado', 'tipo')
+    readonly_fields = ('estado', 'creado', 'iniciado', 'terminado', 'ejecutor', 'resultado', 'fichero', 'error')
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GestionEmpresaConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "gestion_empresa"
+
+    def ready(self):
+        from . import signals  # noqa: F401  Registra los receptores de señales
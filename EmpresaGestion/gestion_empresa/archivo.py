@@ -0,0 +1,75 @@
+# gestion_empresa/archivo.py
+
+"""
+Archivo histórico de pedidos y facturas ('manage.py archivar').
+
+Las cabeceras con fecha anterior al corte se trasladan, con sus líneas, a
+las tablas *_Archivo (models.py) por bloques de 'tamano_bloque' cabeceras:
+cada bloque copia y borra sus filas en una transacción propia, así que el
+proceso se puede interrumpir y repetir sin duplicar ni perder filas, y las
+tablas vivas (y sus índices) quedan con los datos recientes.
+
+- Los resúmenes de ventas no cambian: las ventas archivadas siguen
+  contando, y rollups.reconstruir() suma también las líneas archivadas.
+- La API deja de servir las filas archivadas: se registran como bajas en
+  el registro de cambios (cambios.py) para los clientes que sincronizan.
+"""
+
+from django.db import transaction
+
+from . import cambios
+from .models import (
+    Cambio, Factura, FacturaArchivo, FacturaDetalle, FacturaDetalleArchivo, Pedido, PedidoArchivo, PedidoLinea,
+    PedidoLineaArchivo
+)
+from .services import borrar_sin_senales
+
+# Cabecera -> (modelo de archivo, campos copiados, [(modelo de las líneas, modelo de archivo, campos)])
+TABLAS = {
+    Pedido: (PedidoArchivo, ('id_pedido', 'cliente_id', 'fecha', 'updated_at'),
+             [(PedidoLinea, PedidoLineaArchivo, ('id', 'pedido_id', 'producto_id', 'cantidad', 'updated_at'))]),
+    Factura: (FacturaArchivo, ('num', 'fecha', 'importe', 'cliente_id', 'updated_at'),
+              [(FacturaDetalle, FacturaDetalleArchivo,
+                ('id', 'factura_id', 'producto_id', 'cantidad', 'precio_unitario', 'updated_at'))]),
+}
+
+
+def _copiar(queryset, modelo_archivo, campos, tamano_bloque):
+    """Copia las filas del queryset al archivo por bloques de clave primaria; devuelve las claves."""
+    claves, ultimo = [], None
+    filas = queryset.order_by('pk').values_list(*campos)
+    while True:
+        bloque = list((filas if ultimo is None else filas.filter(pk__gt=ultimo))[:tamano_bloque])
+        if not bloque:
+            return claves
+        modelo_archivo.objects.bulk_create([modelo_archivo(**dict(zip(campos, fila))) for fila in bloque])
+        claves.extend(fila[0] for fila in bloque)
+        ultimo = bloque[-1][0]
+
+
+def archivar(modelo, antes_de, tamano_bloque=1000):
+    """
+    Traslada al archivo las cabeceras de 'modelo' (Pedido o Factura) con
+    fecha anterior a 'antes_de' y sus líneas. Devuelve (cabeceras, líneas).
+    """
+    modelo_archivo, campos, dependientes = TABLAS[modelo]
+    pendientes = modelo.objects.filter(fecha__lt=antes_de).order_by('pk').values_list('pk', flat=True)
+    total_cabeceras = total_lineas = 0
+    while True:
+        with transaction.atomic():
+            claves = list(pendientes[:tamano_bloque])
+            if not claves:
+                return total_cabeceras, total_lineas
+            cabeceras = modelo.objects.filter(pk__in=claves)
+            _copiar(cabeceras, modelo_archivo, campos, tamano_bloque)
+            for modelo_linea, archivo_linea, campos_linea in dependientes:
+                lineas = modelo_linea.objects.filter(**{campos_linea[1] + '__in': claves})
+                copiadas = _copiar(lineas, archivo_linea, campos_linea, tamano_bloque)
+                # Sin señales: descontarían las ventas de los resúmenes y registrarían los cambios fila a fila
+                borrar_sin_senales(lineas)
+                total_lineas += len(copiadas)
+                if modelo_linea in cambios.RECURSOS:
+                    cambios.registrar(cambios.RECURSOS[modelo_linea], copiadas, Cambio.BAJA)
+            borrar_sin_senales(cabeceras)
+            cambios.registrar(cambios.RECURSOS[modelo], claves, Cambio.BAJA)
+            total_cabeceras += len(claves)
@@ -0,0 +1,66 @@
+# gestion_empresa/async_views.py
+
+"""
+Ruta de lectura asíncrona (ASGI) de la API: list y retrieve de los seis
+modelos con el ORM asíncrono, en /api/async/<recurso>/.
+
+Cada vista reutiliza el ViewSet síncrono equivalente (queryset, plan de
+relaciones, filtros, serializador y orden de la paginación por clave) y el
+mismo renderer JSON, de modo que los datos coinciden con los de
+/api/<recurso>/. Diferencias: los listados se paginan siempre por cursor
+(también clientes, proveedores y productos; '?page=N' no está disponible)
+y no pasan por la caché ni por los validadores ETag.
+"""
+
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.request import Request
+
+from .pagination import KeysetPagination
+from .renderers import JSONRapidoRenderer
+
+
+# Vista asíncrona de solo lectura a partir de un ViewSet de la API
+class VistaLecturaAsync(View):
+    viewset_class = None
+
+    async def get(self, request, pk=None):
+        drf_request = Request(request)
+        viewset = self.viewset_class(request=drf_request, args=(), kwargs={}, format_kwarg=None,
+                                     action='list' if pk is None else 'retrieve')
+        try:
+            # Construir el queryset y aplicar los filtros no toca la BD
+            queryset = viewset.filter_queryset(viewset.get_queryset())
+            if pk is None:
+                datos = await self.listado(viewset, queryset, drf_request)
+            else:
+                datos = await self.detalle(viewset, queryset, pk)
+        except APIException as exc:
+            # Mismo cuerpo que el manejador de excepciones de DRF
+            detalle = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            return self.respuesta(detalle, exc.status_code)
+        return self.respuesta(datos)
+
+    async def listado(self, viewset, queryset, request):
+        paginador = KeysetPagination()
+        filas = await paginador.apaginate_queryset(queryset, request, view=viewset)
+        # Las relaciones ya vienen en las filas (select_related): serializar no consulta la BD
+        return {
+            'next': paginador.get_next_link(),
+            'previous': paginador.get_previous_link(),
+            'results': viewset.get_serializer(filas, many=True).data,
+        }
+
+    async def detalle(self, viewset, queryset, pk):
+        campo = viewset.lookup_field
+        try:
+            objeto = await queryset.aget(**{campo: pk})
+        except (queryset.model.DoesNotExist, ValueError, TypeError, ValidationError):
+            raise NotFound
+        return viewset.get_serializer(objeto).data
+
+    def respuesta(self, datos, status=200):
+        return HttpResponse(JSONRapidoRenderer().render(datos), status=status,
+                            content_type='application/json')
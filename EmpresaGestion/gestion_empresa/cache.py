@@ -0,0 +1,153 @@
+# gestion_empresa/cache.py
+
+"""
+Caché de lectura para las respuestas de la API (Producto y Proveedor).
+
+- Detalle: una clave por objeto, 'api:<recurso>:obj:<pk>', que se borra al
+  guardar o borrar el objeto (y, en Producto, al cambiar su proveedor).
+- Listados: una clave por URL completa que incluye un número de versión,
+  'api:<recurso>:list:<versión>:<hash>'. Cualquier cambio incrementa la
+  versión y deja inaccesibles de golpe todas las páginas anteriores.
+- Contadores de aciertos/fallos por recurso, consultables en
+  /api/cache/estadisticas/.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+PREFIJO = 'api'
+
+# Cabeceras de la respuesta original que se conservan junto a los datos
+CABECERAS_CACHEADAS = ('ETag', 'Last-Modified')
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def timeout():
+    return getattr(settings, 'API_CACHE_TIMEOUT', 300)
+
+
+def clave_objeto(recurso, pk):
+    return '%s:%s:obj:%s' % (PREFIJO, recurso, pk)
+
+
+def clave_version(recurso):
+    return '%s:%s:list_version' % (PREFIJO, recurso)
+
+
+def version_listado(recurso):
+    cache = get_cache()
+    version = cache.get(clave_version(recurso))
+    if version is None:
+        cache.add(clave_version(recurso), 1, timeout=None)
+        version = cache.get(clave_version(recurso), 1)
+    return version
+
+
+def clave_listado(recurso, request):
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return '%s:%s:list:%s:%s' % (PREFIJO, recurso, version_listado(recurso), url)
+
+
+# --- Contadores ----------------------------------------------------------------
+
+def _contar(recurso, tipo):
+    cache = get_cache()
+    clave = '%s:%s:stats:%s' % (PREFIJO, recurso, tipo)
+    cache.add(clave, 0, timeout=None)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        pass  # La clave expiró entre add() e incr(): se pierde una muestra
+
+
+def estadisticas(recursos):
+    cache = get_cache()
+    datos = {}
+    for recurso in recursos:
+        aciertos = cache.get('%s:%s:stats:hit' % (PREFIJO, recurso), 0)
+        fallos = cache.get('%s:%s:stats:miss' % (PREFIJO, recurso), 0)
+        total = aciertos + fallos
+        datos[recurso] = {
+            'hits': aciertos,
+            'misses': fallos,
+            'hit_ratio': round(aciertos / total, 4) if total else None,
+        }
+    return datos
+
+
+# --- Invalidación ----------------------------------------------------------------
+
+def invalidar(recurso, pks=()):
+    """Borra las claves de detalle indicadas e invalida todos los listados del recurso."""
+    def _invalidar():
+        cache = get_cache()
+        if pks:
+            cache.delete_many([clave_objeto(recurso, pk) for pk in pks])
+        try:
+            cache.incr(clave_version(recurso))
+        except ValueError:
+            cache.set(clave_version(recurso), 2, timeout=None)
+
+    _invalidar()
+    # Y otra vez al confirmar: una lectura concurrente pudo cachear el estado anterior
+    transaction.on_commit(_invalidar)
+
+
+# Mixin para ViewSets: sirve retrieve/list desde la caché
+class CachedResponseMixin:
+    """
+    Cachea response.data (antes del renderizado) de retrieve y list, junto con
+    sus validadores. 'cache_resource' identifica el recurso para las claves y
+    la invalidación. Debe ir antes que ConditionalRequestMixin en las bases.
+    """
+    cache_resource = None
+
+    def retrieve(self, request, *args, **kwargs):
+        # La clave del objeto guarda las variantes de la URL (parámetros) en un diccionario,
+        # de modo que un único delete() las invalida todas
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self._respuesta_cacheada(clave_objeto(self.cache_resource, pk), request.get_full_path(),
+                                        super().retrieve, request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(clave_listado(self.cache_resource, request), None,
+                                        super().list, request, *args, **kwargs)
+
+    def _respuesta_cacheada(self, clave, variante, vista, request, *args, **kwargs):
+        cache = get_cache()
+        guardado = cache.get(clave)
+        entrada = guardado.get(variante) if variante is not None and guardado else guardado
+        if entrada is not None:
+            _contar(self.cache_resource, 'hit')
+            datos, cabeceras = entrada
+            # Los validadores (ETag / Last-Modified) se guardan con la respuesta: un 304
+            # desde la caché no necesita ninguna consulta
+            no_modificado = get_conditional_response(
+                request, etag=cabeceras.get('ETag'),
+                last_modified=parse_http_date_safe(cabeceras.get('Last-Modified')))
+            respuesta = no_modificado if no_modificado is not None else Response(datos)
+            for nombre, valor in cabeceras.items():
+                respuesta[nombre] = valor
+            respuesta['X-Cache'] = 'HIT'
+            return respuesta
+
+        _contar(self.cache_resource, 'miss')
+        respuesta = vista(request, *args, **kwargs)
+        if respuesta.status_code == 200:
+            entrada = (respuesta.data, {nombre: respuesta[nombre] for nombre in CABECERAS_CACHEADAS
+                                        if respuesta.has_header(nombre)})
+            if variante is not None:
+                cache.set(clave, {**(guardado or {}), variante: entrada}, timeout())
+            else:
+                cache.set(clave, entrada, timeout())
+        respuesta['X-Cache'] = 'MISS'
+        return respuesta
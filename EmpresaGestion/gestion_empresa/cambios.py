@@ -0,0 +1,185 @@
+# gestion_empresa/cambios.py
+
+"""
+Registro de cambios para la sincronización incremental (/api/cambios/).
+
+Cada alta, modificación o baja de un objeto de la API añade una fila a
+Cambio, una tabla de solo inserción ordenada por número de secuencia:
+
+- save() y delete() la escriben desde signals.py, también en los borrados
+  en cascada (Proveedor -> Producto -> líneas), que envían post_delete por
+  cada objeto.
+- Las escrituras en bloque, que no envían señales (services.py,
+  importacion.py), llaman a registrar().
+- Las líneas de pedido se publican como modificación de su pedido, que las
+  incluye en su representación.
+- Si cambia un campo que otros recursos muestran (el nombre del cliente en
+  pedidos y facturas, por ejemplo), esos objetos se publican también como
+  modificados (DENORMALIZADOS).
+
+Uso por parte de un cliente: pide /api/cambios/ sin cursor para obtener la
+posición actual, descarga después los listados completos y, a partir de
+ahí, pide solo los cambios posteriores al último cursor recibido.
+
+Las transacciones concurrentes pueden confirmar sus filas en distinto orden
+que sus números de secuencia. Un hueco reciente en la secuencia puede ser
+una transacción aún abierta: el cursor no lo rebasa hasta que el hueco
+tiene más de CAMBIOS_MARGEN_SEGUNDOS (entonces se da por anulado).
+"""
+
+import base64
+import datetime
+import json
+
+from django.conf import settings
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from .models import Cambio, Cliente, Factura, FacturaDetalle, Pedido, PedidoLinea, Producto, Proveedor
+
+# Modelo -> recurso de la API (prefijo de la URL)
+RECURSOS = {
+    Cliente: 'clientes',
+    Proveedor: 'proveedores',
+    Producto: 'productos',
+    Pedido: 'pedidos',
+    Factura: 'facturas',
+    FacturaDetalle: 'facturas-detalle',
+}
+# Modelos que se publican como modificación de otro objeto: modelo -> (recurso, atributo con su clave)
+DEPENDIENTES = {PedidoLinea: ('pedidos', 'pedido_id')}
+# Campos que se muestran en la representación de otros recursos ('cliente_nombre', ...):
+# modelo -> (campos, [(recurso, modelo que los muestra, su relación con el modelo, atributo con su clave)])
+DENORMALIZADOS = {
+    Proveedor: (('razon_social',), [('productos', Producto, 'id_proveedor', 'pk')]),
+    Cliente: (('NombreCliente',), [('pedidos', Pedido, 'cliente', 'pk'), ('facturas', Factura, 'cliente', 'pk')]),
+    Producto: (('descripcion',), [('pedidos', PedidoLinea, 'producto', 'pedido_id'),
+                                  ('facturas-detalle', FacturaDetalle, 'producto', 'pk')]),
+}
+
+NOMBRES_OPERACION = {Cambio.ALTA: 'alta', Cambio.MODIFICACION: 'modificacion', Cambio.BAJA: 'baja'}
+
+
+def registrar(recurso, claves, operacion):
+    Cambio.objects.bulk_create(
+        [Cambio(recurso=recurso, clave=str(clave), operacion=operacion) for clave in claves], batch_size=1000)
+
+
+def registrar_dependientes(modelo, claves):
+    """Registra como modificados los objetos de otros recursos que muestran campos de estos."""
+    for recurso, dependiente, relacion, atributo in DENORMALIZADOS.get(modelo, ((), ()))[1]:
+        filas = dependiente.objects.filter(**{'%s__in' % relacion: claves})
+        registrar(recurso, filas.order_by().values_list(atributo, flat=True).distinct(), Cambio.MODIFICACION)
+
+
+def antes_de_guardar(instance, using, update_fields=None):
+    """Anota en la instancia si cambian sus campos de DENORMALIZADOS, comparando con la fila guardada."""
+    campos = DENORMALIZADOS[type(instance)][0]
+    instance._cambian_denormalizados = False
+    if instance.pk is None or (update_fields is not None and not set(campos) & set(update_fields)):
+        return
+    anteriores = type(instance)._base_manager.using(using).filter(pk=instance.pk).values(*campos).first()
+    instance._cambian_denormalizados = anteriores is not None and any(
+        anteriores[campo] != getattr(instance, campo) for campo in campos)
+
+
+def guardado(instance, created):
+    if type(instance) in DEPENDIENTES:
+        recurso, atributo = DEPENDIENTES[type(instance)]
+        registrar(recurso, [getattr(instance, atributo)], Cambio.MODIFICACION)
+    else:
+        registrar(RECURSOS[type(instance)], [instance.pk], Cambio.ALTA if created else Cambio.MODIFICACION)
+    if getattr(instance, '_cambian_denormalizados', False):
+        registrar_dependientes(type(instance), [instance.pk])
+
+
+def borrado(instance):
+    if type(instance) in DEPENDIENTES:
+        # En un borrado en cascada del pedido, su baja se registra después que sus líneas
+        recurso, atributo = DEPENDIENTES[type(instance)]
+        registrar(recurso, [getattr(instance, atributo)], Cambio.MODIFICACION)
+    else:
+        registrar(RECURSOS[type(instance)], [instance.pk], Cambio.BAJA)
+
+
+# --- Lectura -------------------------------------------------------------------
+
+def codificar_cursor(seq):
+    return base64.urlsafe_b64encode(json.dumps({'s': seq}).encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """Número de secuencia del cursor; ValueError si no es válido."""
+    try:
+        seq = json.loads(base64.urlsafe_b64decode(cursor.encode()))['s']
+    except (TypeError, KeyError, UnicodeError, json.JSONDecodeError, base64.binascii.Error):
+        raise ValueError(cursor)
+    if not isinstance(seq, int) or seq < 0:
+        raise ValueError(cursor)
+    return seq
+
+
+def posicion_estable():
+    """
+    Mayor número de secuencia hasta el que ya no pueden aparecer filas nuevas:
+    el anterior al primer hueco de la secuencia entre las filas recientes.
+    """
+    margen = datetime.timedelta(seconds=getattr(settings, 'CAMBIOS_MARGEN_SEGUNDOS', 60))
+    recientes = Cambio.objects.filter(fecha__gte=timezone.now() - margen)
+    resumen = recientes.aggregate(filas=Count('seq'), primera=Min('seq'), ultima=Max('seq'))
+    if not resumen['filas']:
+        return Cambio.objects.aggregate(ultima=Max('seq'))['ultima'] or 0
+    anterior = Cambio.objects.filter(seq__lt=resumen['primera']).aggregate(ultima=Max('seq'))['ultima']
+    esperado = resumen['primera'] if anterior is None else anterior + 1
+    if resumen['primera'] == esperado and resumen['ultima'] - resumen['primera'] + 1 == resumen['filas']:
+        # Caso habitual (p. ej. tras una importación): ningún hueco, sin recorrer las filas
+        return Cambio.objects.aggregate(ultima=Max('seq'))['ultima']
+    for seq in recientes.order_by('seq').values_list('seq', flat=True):
+        if seq != esperado:
+            return esperado - 1
+        esperado = seq + 1
+    return Cambio.objects.aggregate(ultima=Max('seq'))['ultima']
+
+
+def caducado(desde):
+    """El registro ya no contiene cambios inmediatamente posteriores a 'desde' (se purgaron)."""
+    primera = Cambio.objects.order_by('seq').values_list('seq', flat=True).first()
+    return primera is not None and desde < primera - 1
+
+
+def leer(desde, recursos=None, limite=500):
+    """
+    Devuelve (cambios, hasta, hay_mas): los cambios posteriores a 'desde',
+    como [(recurso, clave, operación)] ordenados por su último cambio, con
+    los cambios sucesivos de un mismo objeto reunidos en uno solo, y la
+    posición hasta la que se ha leído.
+    """
+    cota = posicion_estable()
+    filas = Cambio.objects.filter(seq__gt=desde, seq__lte=cota).order_by('seq')
+    if recursos:
+        filas = filas.filter(recurso__in=recursos)
+    filas = list(filas.values_list('seq', 'recurso', 'clave', 'operacion')[:limite + 1])
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    # Sin más filas el cursor avanza hasta la posición estable, aunque los recursos pedidos no cambiaran
+    hasta = filas[-1][0] if hay_mas else max(desde, cota)
+
+    ultimos = {}
+    for _, recurso, clave, operacion in filas:
+        previa = ultimos.pop((recurso, clave), None)
+        # Un objeto creado y modificado desde el cursor sigue siendo un alta para el cliente
+        if operacion == Cambio.MODIFICACION and previa == Cambio.ALTA:
+            operacion = Cambio.ALTA
+        ultimos[(recurso, clave)] = operacion
+    return [(recurso, clave, operacion) for (recurso, clave), operacion in ultimos.items()], hasta, hay_mas
+
+
+def purgar(antes_de, tamano_bloque=10000):
+    """Borra por bloques los cambios anteriores a la fecha; devuelve cuántos."""
+    total = 0
+    while True:
+        claves = list(Cambio.objects.filter(fecha__lt=antes_de).order_by('seq')
+                      .values_list('seq', flat=True)[:tamano_bloque])
+        if not claves:
+            return total
+        total += Cambio.objects.filter(seq__in=claves).delete()[0]
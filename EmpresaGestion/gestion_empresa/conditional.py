@@ -0,0 +1,126 @@
+# gestion_empresa/conditional.py
+
+import hashlib
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def _rutas_select(prefijo, arbol):
+    # Rutas de un select_related anidado ({'producto': {'id_proveedor': {}}})
+    for nombre, hijos in arbol.items():
+        yield prefijo + nombre
+        yield from _rutas_select(prefijo + nombre + '__', hijos)
+
+
+def _modelo_de_ruta(modelo, ruta):
+    for parte in ruta.split('__'):
+        modelo = modelo._meta.get_field(parte).related_model
+    return modelo
+
+
+# Mixin para ViewSets: peticiones condicionales (ETag / Last-Modified) en list y retrieve
+class ConditionalRequestMixin:
+    """
+    Calcula los validadores con una consulta ligera antes de serializar:
+
+    - 'updated_at' de las filas y de los objetos relacionados que el
+      serializador muestra, con JOIN o con prefetch (p. ej.
+      'producto__updated_at' en FacturaDetalle, 'lineas__updated_at' y
+      'lineas__producto__updated_at' en Pedido), y el número de filas de cada
+      relación con prefetch, que cambia al borrar una (p. ej. una línea).
+    - Detalle: esos valores para el objeto pedido.
+    - Listado: además COUNT(*) y la suma de claves sobre el queryset filtrado,
+      o solo sobre la página pedida si la paginación es por clave, más la URL
+      completa (página, cursor, filtros).
+
+    Si 'If-None-Match' coincide se responde 304 sin llegar a construir ni
+    serializar el queryset. 'If-Modified-Since' solo se atiende en el detalle:
+    la fecha de un listado no cambia cuando se borra una de sus filas.
+    """
+
+    def relaciones_validador(self):
+        """(rutas con JOIN, rutas con prefetch) que muestra el serializador."""
+        select, prefetch = self.get_relation_plan()
+        multiples = []
+        for relacion in prefetch:
+            ruta = getattr(relacion, 'prefetch_through', relacion)
+            multiples.append(ruta)
+            # Prefetch(ruta, queryset=....select_related(...)): sus JOIN también se muestran
+            anidadas = getattr(getattr(relacion, 'queryset', None), 'query', None)
+            if anidadas is not None and isinstance(anidadas.select_related, dict):
+                multiples.extend(_rutas_select(ruta + '__', anidadas.select_related))
+        return list(select), sorted(set(multiples))
+
+    def campos_validador(self):
+        # 'updated_at' propio y el de cada relación mostrada que lo tenga
+        modelo = self.get_queryset().model
+        select, multiples = self.relaciones_validador()
+        return ['updated_at'] + ['%s__updated_at' % ruta for ruta in select + multiples
+                                 if any(campo.name == 'updated_at'
+                                        for campo in _modelo_de_ruta(modelo, ruta)._meta.concrete_fields)]
+
+    def agregar_validadores(self, queryset):
+        """Un diccionario con total, suma de claves, número de filas por relación con prefetch y fechas."""
+        campos = self.campos_validador()
+        _, multiples = self.relaciones_validador()
+        agregados = {'max_%d' % i: Max(campo) for i, campo in enumerate(campos)}
+        # Con relaciones con prefetch el JOIN repite filas: se cuentan valores distintos
+        agregados.update({'filas_%d' % i: Count(ruta, distinct=True) for i, ruta in enumerate(multiples)})
+        if not queryset.query.is_sliced:
+            queryset = queryset.order_by()
+        valores = queryset.aggregate(total=Count('pk', distinct=True), claves=Sum('pk', distinct=True),
+                                                **agregados)
+        valores['fechas'] = [valores.pop('max_%d' % i) for i in range(len(campos))]
+        return valores
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        # Con paginación por clave basta con agregar las filas de la página (coste
+        # constante); la suma de claves detecta filas que entran o salen de ella
+        if hasattr(self.paginator, 'queryset_de_pagina'):
+            pagina = self.paginator.queryset_de_pagina(queryset, request, view=self)
+            if pagina is not None:
+                if self.relaciones_validador()[1]:
+                    # Los JOIN de las relaciones con prefetch no pueden ir dentro de la página (LIMIT
+                    # contaría sus filas): primero las claves de la página, después los agregados
+                    pagina = queryset.model._default_manager.filter(
+                        pk__in=list(pagina.values_list('pk', flat=True)))
+                queryset = pagina
+
+        valores = self.agregar_validadores(queryset)
+        return self._respuesta_condicional(
+            [request.get_full_path()] + sorted(valores.items(), key=str), valores['fechas'],
+            super().list, request, *args, fecha_valida=False, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        valor = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        valores = self.agregar_validadores(self.filter_queryset(self.get_queryset())
+                                           .filter(**{self.lookup_field: valor}))
+        if not valores['total']:
+            return super().retrieve(request, *args, **kwargs)  # 404 habitual
+        return self._respuesta_condicional(
+            [request.get_full_path()] + sorted(valores.items(), key=str), valores['fechas'],
+            super().retrieve, request, *args, **kwargs)
+
+    def _respuesta_condicional(self, partes, fechas, vista, request, *args, fecha_valida=True, **kwargs):
+        huella = hashlib.md5('|'.join(str(p) for p in partes).encode()).hexdigest()
+        # ETag débil: el cuerpo puede variar de formato (JSON, navegable) o de compresión
+        etag = 'W/' + quote_etag(huella)
+        fechas = [f for f in fechas if f is not None]
+        # Sin Last-Modified si la fecha sola no basta para validar la respuesta (listados)
+        ultima = int(max(fechas).timestamp()) if fechas and fecha_valida else None
+
+        no_modificado = get_conditional_response(request, etag=etag, last_modified=ultima)
+        if no_modificado is not None:
+            no_modificado['ETag'] = etag
+            return no_modificado
+
+        respuesta = vista(request, *args, **kwargs)
+        if respuesta.status_code == 200:
+            respuesta['ETag'] = etag
+            if ultima is not None:
+                respuesta['Last-Modified'] = http_date(ultima)
+        return respuesta
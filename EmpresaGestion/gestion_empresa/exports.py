@@ -0,0 +1,100 @@
+# gestion_empresa/exports.py
+
+import csv
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import serializers
+
+
+# Pseudo-búfer para csv.writer: devuelve la línea en lugar de guardarla
+class Echo:
+    def write(self, value):
+        return value
+
+
+def columnas_exportables(serializer):
+    """
+    Devuelve [(nombre, ruta_values, conversor)] con las columnas del
+    serializador que se pueden leer directamente con values_list: campos del
+    modelo y campos de solo lectura con 'source' con puntos (p. ej.
+    'producto.descripcion'). 'conversor' formatea el valor como la API
+    (fechas con hora en la zona horaria local) o es None si no hace falta.
+    Admite la clase del serializador o una instancia (p. ej. reducida con
+    '?fields=').
+    """
+    if isinstance(serializer, type):
+        serializer = serializer()
+    modelo = serializer.Meta.model
+    columnas = []
+    for nombre, campo in serializer.fields.items():
+        if getattr(campo, 'write_only', False) or campo.source == '*':
+            continue
+        partes = campo.source.split('.')
+        actual = modelo
+        try:
+            for parte in partes[:-1]:
+                actual = actual._meta.get_field(parte).related_model
+            destino = actual._meta.get_field(partes[-1])
+        except (FieldDoesNotExist, AttributeError):
+            continue  # Propiedades o métodos: no se pueden leer en SQL
+        if not destino.concrete or destino.many_to_many:
+            continue
+        conversor = campo.to_representation if isinstance(campo, serializers.DateTimeField) else None
+        columnas.append((nombre, '__'.join(partes), conversor))
+    return columnas
+
+
+def iterar_filas(queryset, rutas, chunk_size=2000):
+    """
+    Recorre el queryset por bloques de clave primaria con values_list.
+    Cada bloque es una consulta independiente 'pk > último ORDER BY pk LIMIT n',
+    así que la memoria no depende del tamaño de la tabla, también en MySQL,
+    donde el conector no transmite los resultados en streaming.
+    """
+    queryset = queryset.order_by('pk').values_list('pk', *rutas)
+    ultimo = None
+    while True:
+        bloque = queryset if ultimo is None else queryset.filter(pk__gt=ultimo)
+        filas = list(bloque[:chunk_size])
+        if not filas:
+            return
+        for fila in filas:
+            yield fila[1:]
+        ultimo = filas[-1][0]
+        if len(filas) < chunk_size:
+            return
+
+
+def convertir_filas(columnas, filas):
+    conversores = [(i, conversor) for i, (_, _, conversor) in enumerate(columnas) if conversor]
+    if not conversores:
+        return filas
+    return (_convertir(fila, conversores) for fila in filas)
+
+
+def _convertir(fila, conversores):
+    fila = list(fila)
+    for i, conversor in conversores:
+        if fila[i] is not None:
+            fila[i] = conversor(fila[i])
+    return fila
+
+
+def generar_ndjson(nombres, filas):
+    codificador = DjangoJSONEncoder(ensure_ascii=False)
+    for fila in filas:
+        yield codificador.encode(dict(zip(nombres, fila))) + '\n'
+
+
+def generar_csv(nombres, filas):
+    escritor = csv.writer(Echo())
+    yield escritor.writerow(nombres)
+    for fila in filas:
+        yield escritor.writerow(fila)
+
+
+FORMATOS = {
+    'ndjson': (generar_ndjson, 'application/x-ndjson'),
+    'csv': (generar_csv, 'text/csv; charset=utf-8'),
+}
@@ -0,0 +1,84 @@
+# gestion_empresa/filters.py
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models.functions import Lower
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+def _siguiente_prefijo(prefijo):
+    """Menor cadena mayor que todas las que empiezan por 'prefijo' ('abc' -> 'abd')."""
+    return prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+
+
+# LOWER() de SQLite solo pasa a minúsculas A-Z
+_MINUSCULAS_ASCII = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+
+def filtrar_prefijo(queryset, campo, valor):
+    # Rango sobre LOWER(campo): lo resuelve el índice funcional Lower(campo), también en
+    # SQLite, donde LIKE 'x%' sin distinguir mayúsculas no puede usar un índice normal.
+    # El istartswith final solo se evalúa sobre las filas del rango.
+    # El término se pasa a minúsculas como lo hace LOWER() en la BD: en MySQL también
+    # las letras no ASCII ('Ñ'), en SQLite solo A-Z, igual que su LIKE ('ñ' no encuentra 'Ñ').
+    if connections[queryset.db].vendor == 'sqlite':
+        valor = valor.translate(_MINUSCULAS_ASCII)
+    else:
+        valor = valor.lower()
+    alias = '_%s_lower' % campo
+    return (queryset.alias(**{alias: Lower(campo)})
+            .filter(**{alias + '__gte': valor, alias + '__lt': _siguiente_prefijo(valor),
+                       campo + '__istartswith': valor}))
+
+
+def filtrar_contiene(queryset, campo, valor):
+    # LIKE '%x%' no admite búsqueda por índice; al pedir solo la clave primaria se
+    # recorre el índice del campo (estrecho, "covering") en lugar de la tabla completa.
+    claves = queryset.model._base_manager.filter(**{campo + '__icontains': valor}).values('pk')
+    return queryset.filter(pk__in=claves)
+
+
+def _convertir(queryset, campo, valor):
+    # 'campo' puede recorrer relaciones ('lineas__producto')
+    *relaciones, nombre = campo.split('__')
+    modelo = queryset.model
+    for relacion in relaciones:
+        modelo = modelo._meta.get_field(relacion).related_model
+    try:
+        return modelo._meta.get_field(nombre).to_python(valor)
+    except DjangoValidationError:
+        raise ValueError(valor)
+
+
+TIPOS = {
+    'exacto': lambda qs, campo, valor: qs.filter(**{campo: _convertir(qs, campo, valor)}),
+    'prefijo': filtrar_prefijo,
+    'contiene': filtrar_contiene,
+    'desde': lambda qs, campo, valor: qs.filter(**{campo + '__gte': _convertir(qs, campo, valor)}),
+    'hasta': lambda qs, campo, valor: qs.filter(**{campo + '__lte': _convertir(qs, campo, valor)}),
+}
+
+
+# Backend de filtros por parámetros de consulta declarados en cada ViewSet
+class FiltrosPorParametroBackend(BaseFilterBackend):
+    """
+    Cada ViewSet declara sus filtros en 'filtros' como {parámetro: (campo, tipo)},
+    con tipo 'exacto', 'prefijo', 'contiene', 'desde' o 'hasta'. Todos están
+    respaldados por un índice (ver Meta.indexes de los modelos); los parámetros
+    no declarados se ignoran.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        errores = {}
+        for parametro, (campo, tipo) in getattr(view, 'filtros', {}).items():
+            valor = request.query_params.get(parametro)
+            if valor in (None, ''):
+                continue
+            try:
+                queryset = TIPOS[tipo](queryset, campo, valor)
+            except (ValueError, TypeError):
+                errores[parametro] = ['Valor no válido: %s.' % valor]
+        if errores:
+            raise ValidationError(errores)
+        return queryset
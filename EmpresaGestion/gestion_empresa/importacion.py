@@ -0,0 +1,212 @@
+# gestion_empresa/importacion.py
+
+"""
+Importación masiva de CSV (productos, proveedores y clientes) con upsert.
+
+El fichero se lee en streaming y se procesa por bloques: cada bloque se
+valida campo a campo, resuelve sus claves foráneas con una sola consulta
+y se escribe con bulk_create(update_conflicts=True), de modo que la
+memoria no depende del tamaño del fichero. Las filas no válidas se
+escriben, con el motivo, en un CSV de rechazos.
+"""
+
+import csv
+import itertools
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, models, transaction
+from django.db.models import Max
+
+from . import cache, cambios
+from .models import Cambio, Cliente, Producto, Proveedor
+
+
+class Especificacion:
+    """Columnas del CSV de un modelo y cómo se resuelven sus claves."""
+
+    def __init__(self, modelo, columnas, clave, foraneas=None, recurso_cache=None, cache_dependiente=None):
+        self.modelo = modelo
+        self.columnas = columnas  # Nombres de campo del modelo, tal cual en la cabecera
+        self.clave = clave
+        self.foraneas = foraneas or {}  # columna -> modelo relacionado
+        self.recurso_cache = recurso_cache
+        # Recurso de la caché -> (modelo, clave foránea) cuyas filas muestran datos de este (ver signals.py)
+        self.cache_dependiente = cache_dependiente or {}
+        self.campos = {nombre: modelo._meta.get_field(nombre) for nombre in columnas}
+        # Si la clave es autoincremental puede omitirse: la fila se da de alta con una nueva
+        self.clave_opcional = isinstance(modelo._meta.pk, models.AutoField)
+        # En la actualización se reescriben todas las columnas y la fecha de modificación
+        self.actualizar = [c for c in columnas if c != clave] + ['updated_at']
+
+
+ESPECIFICACIONES = {
+    'productos': Especificacion(Producto, ['codigo', 'descripcion', 'precio', 'id_proveedor'], 'codigo',
+                                foraneas={'id_proveedor': Proveedor}, recurso_cache='productos'),
+    'proveedores': Especificacion(Proveedor, ['rut', 'razon_social', 'telefono'], 'rut',
+                                  recurso_cache='proveedores',
+                                  cache_dependiente={'productos': (Producto, 'id_proveedor')}),
+    'clientes': Especificacion(Cliente, ['id', 'NombreCliente', 'celular'], 'id'),
+}
+
+
+class Resultado:
+    def __init__(self):
+        self.leidas = self.importadas = self.rechazadas = 0
+        self.inicio = time.perf_counter()
+
+    @property
+    def filas_por_segundo(self):
+        segundos = time.perf_counter() - self.inicio
+        return self.leidas / segundos if segundos else 0
+
+
+def _validar(spec, fila):
+    """Devuelve un diccionario {campo: valor} ya convertido o lanza ValidationError."""
+    valores = {}
+    errores = []
+    for nombre, campo in spec.campos.items():
+        valor = (fila.get(nombre) or '').strip()
+        if not valor and nombre == spec.clave and spec.clave_opcional:
+            valores[nombre] = None  # Sin clave: alta con clave autoincremental
+            continue
+        try:
+            if campo.is_relation:
+                valores[nombre] = campo.target_field.to_python(valor)
+                if valores[nombre] in (None, ''):
+                    raise ValidationError('obligatorio')
+            else:
+                valores[nombre] = campo.clean(valor, None)
+        except ValidationError as exc:
+            errores.append('%s: %s' % (nombre, ' '.join(exc.messages)))
+    if errores:
+        raise ValidationError('; '.join(errores))
+    return valores
+
+
+def _instancia(spec, valores):
+    datos = {}
+    for nombre, valor in valores.items():
+        campo = spec.campos[nombre]
+        datos[campo.attname if campo.is_relation else nombre] = valor
+    return spec.modelo(**datos)
+
+
+def _escribir(spec, objetos):
+    opciones = {'update_conflicts': True, 'update_fields': spec.actualizar}
+    # MySQL (ON DUPLICATE KEY UPDATE) no admite indicar las columnas del conflicto
+    if connection.features.supports_update_conflicts_with_target:
+        opciones['unique_fields'] = [spec.clave]
+    spec.modelo.objects.bulk_create(objetos, **opciones)
+
+
+def _procesar_bloque(spec, filas, rechazar):
+    """Valida y escribe un bloque; devuelve el número de filas importadas."""
+    validas = {}
+    sin_clave = []
+    for numero, fila in filas:
+        try:
+            valores = _validar(spec, fila)
+        except ValidationError as exc:
+            rechazar(numero, fila, ' '.join(exc.messages))
+            continue
+        if valores[spec.clave] is None:
+            sin_clave.append((numero, fila, valores))
+        else:
+            # Si la clave se repite en el bloque, gana la última fila
+            anterior = validas.pop(valores[spec.clave], None)
+            if anterior:
+                rechazar(anterior[0], anterior[1], '%s repetido: se usa la fila %d' % (spec.clave, numero))
+            validas[valores[spec.clave]] = (numero, fila, valores)
+
+    pendientes = list(validas.values()) + sin_clave
+
+    # Claves foráneas: una consulta por columna y bloque
+    for columna, relacionado in spec.foraneas.items():
+        buscadas = {valores[columna] for _, _, valores in pendientes}
+        existentes = set(relacionado.objects.filter(pk__in=buscadas).values_list('pk', flat=True))
+        correctas = []
+        for numero, fila, valores in pendientes:
+            if valores[columna] in existentes:
+                correctas.append((numero, fila, valores))
+            else:
+                rechazar(numero, fila, '%s: %s no existe' % (columna, valores[columna]))
+        pendientes = correctas
+
+    if not pendientes:
+        return 0
+    # Para el registro de cambios: qué claves ya existían y, si el backend no devuelve las
+    # claves generadas por bulk_create (MySQL), desde qué clave buscar las nuevas
+    claves = [valores[spec.clave] for _, _, valores in pendientes if valores[spec.clave] is not None]
+    existentes = set(spec.modelo.objects.filter(pk__in=claves).values_list('pk', flat=True))
+    ultima = None
+    if len(claves) < len(pendientes) and not connection.features.can_return_rows_from_bulk_insert:
+        ultima = spec.modelo.objects.aggregate(ultima=Max('pk'))['ultima'] or 0
+
+    objetos = [_instancia(spec, valores) for _, _, valores in pendientes]
+    try:
+        with transaction.atomic():
+            _escribir(spec, objetos)
+        escritos = objetos
+    except DatabaseError:
+        # Alguna fila incumple una restricción de la BD: se repite fila a fila para aislarla
+        escritos = []
+        for (numero, fila, _), objeto in zip(pendientes, objetos):
+            try:
+                with transaction.atomic():
+                    _escribir(spec, [objeto])
+                escritos.append(objeto)
+            except DatabaseError as exc:
+                rechazar(numero, fila, 'base de datos: %s' % exc)
+
+    # bulk_create no envía señales: registro de cambios e invalidación de la caché
+    altas = [objeto.pk for objeto in escritos if objeto.pk is not None and objeto.pk not in existentes]
+    if ultima is not None:
+        # Las claves generadas son posteriores a la última anterior al bloque; se pueden colar
+        # altas concurrentes de otro proceso, que el registro ya contiene y solo se repiten
+        altas += spec.modelo.objects.filter(pk__gt=ultima).exclude(pk__in=claves).values_list('pk', flat=True)
+    recurso = cambios.RECURSOS[spec.modelo]
+    cambios.registrar(recurso, altas, Cambio.ALTA)
+    cambios.registrar(recurso, [objeto.pk for objeto in escritos if objeto.pk in existentes], Cambio.MODIFICACION)
+    # Sin comparar con la fila anterior: los que muestran sus campos se publican como modificados
+    cambios.registrar_dependientes(spec.modelo, [objeto.pk for objeto in escritos if objeto.pk in existentes])
+    if spec.recurso_cache:
+        cache.invalidar(spec.recurso_cache, claves)
+    if escritos:
+        modificadas = [objeto.pk for objeto in escritos if objeto.pk in existentes]
+        for recurso_cache, (modelo, campo) in spec.cache_dependiente.items():
+            # Los listados siempre; el detalle, de las filas que apuntan a las modificadas
+            relacionadas = modelo.objects.filter(**{'%s__in' % campo: modificadas}).values_list('pk', flat=True)
+            cache.invalidar(recurso_cache, list(relacionadas) if modificadas else ())
+    return len(escritos)
+
+
+def importar(recurso, fichero, rechazos, tamano_bloque=5000, delimitador=',', progreso=None):
+    """
+    Importa el CSV abierto 'fichero' (texto) en el modelo de 'recurso'.
+    Las filas rechazadas se escriben en 'rechazos' (texto) con una columna
+    'error' añadida. 'progreso' se llama tras cada bloque con el Resultado.
+    """
+    spec = ESPECIFICACIONES[recurso]
+    lector = csv.DictReader(fichero, delimiter=delimitador)
+    obligatorias = set(spec.columnas) - ({spec.clave} if spec.clave_opcional else set())
+    faltan = obligatorias - set(lector.fieldnames or ())
+    if faltan:
+        raise ValueError('Faltan columnas en la cabecera: %s.' % ', '.join(sorted(faltan)))
+
+    escritor = csv.writer(rechazos)
+    escritor.writerow(['fila'] + lector.fieldnames + ['error'])
+    resultado = Resultado()
+
+    def rechazar(numero, fila, motivo):
+        resultado.rechazadas += 1
+        escritor.writerow([numero] + [fila.get(c, '') for c in lector.fieldnames] + [motivo])
+
+    # La fila 1 es la cabecera
+    numeradas = enumerate(lector, start=2)
+    while bloque := list(itertools.islice(numeradas, tamano_bloque)):
+        resultado.leidas += len(bloque)
+        resultado.importadas += _procesar_bloque(spec, bloque, rechazar)
+        if progreso:
+            progreso(resultado)
+    return resultado
@@ -0,0 +1,125 @@
+# gestion_empresa/informes.py
+
+"""
+Informes de ventas calculados en la base de datos (/api/informes/...).
+
+- Productos más vendidos y ranking de clientes: sobre los resúmenes
+  mensuales (VentaProductoMes, VentaClienteMes), que ya incluyen las ventas
+  archivadas. La posición se calcula con RANK() OVER (ORDER BY total DESC),
+  así que los empates comparten puesto. Los índices (mes, clave, importe,
+  cantidad) permiten leerlos sin ir a la tabla.
+- Serie de ventas: suma de Factura.importe, y de las facturas archivadas,
+  por día con los índices (fecha, importe). Las semanas (de lunes a
+  domingo) y los meses se componen a partir de los días, que son como
+  mucho unos cientos de filas, y los periodos sin ventas aparecen con cero.
+
+Los resultados se guardan en la caché de la API durante
+settings.INFORMES_CACHE_TIMEOUT segundos por combinación de parámetros: no
+se invalidan al facturar.
+"""
+
+import datetime
+import hashlib
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, F, Sum, Window
+from django.db.models.functions import Rank
+
+from . import cache
+from .models import Cliente, Factura, FacturaArchivo, Producto, VentaClienteMes, VentaProductoMes
+
+PERIODOS = ('dia', 'semana', 'mes')
+# Intervalo máximo de serie_ventas por periodo, en días: unos cientos de elementos como mucho
+MAXIMO_DIAS = {'dia': 366, 'semana': 5 * 366, 'mes': 20 * 366}
+CRITERIOS = ('importe', 'cantidad')
+
+
+def en_cache(nombre, parametros, calcular):
+    """Devuelve (datos, acierto): el informe guardado para estos parámetros o el recién calculado."""
+    huella = hashlib.md5(repr(sorted(parametros.items())).encode()).hexdigest()
+    clave = '%s:informes:%s:%s' % (cache.PREFIJO, nombre, huella)
+    almacen = cache.get_cache()
+    datos = almacen.get(clave)
+    if datos is not None:
+        cache._contar('informes', 'hit')
+        return datos, True
+    cache._contar('informes', 'miss')
+    datos = calcular()
+    almacen.set(clave, datos, getattr(settings, 'INFORMES_CACHE_TIMEOUT', 60))
+    return datos, False
+
+
+def _ranking(modelo, clave, desde, hasta, criterio, limite):
+    """[(clave, cantidad, importe, posición)] de los 'limite' primeros por 'criterio' entre dos meses."""
+    return list(modelo.objects.filter(mes__range=(desde, hasta))
+                .values(clave)
+                .annotate(total_cantidad=Sum('cantidad'), total_importe=Sum('importe'))
+                .annotate(posicion=Window(Rank(), order_by=F('total_' + criterio).desc()))
+                .order_by('posicion', clave)
+                .values_list(clave, 'total_cantidad', 'total_importe', 'posicion')[:limite])
+
+
+def _importe(valor):
+    # SQLite devuelve las sumas de decimales con más cifras de las del campo
+    return Decimal(valor or 0).quantize(Decimal('0.01'))
+
+
+def top_productos(desde, hasta, criterio='importe', limite=10):
+    """Productos con más ventas (por importe o por cantidad) entre los meses 'desde' y 'hasta'."""
+    filas = _ranking(VentaProductoMes, 'producto', desde, hasta, criterio, limite)
+    # Las descripciones, solo de las filas devueltas
+    descripciones = dict(Producto.objects.filter(pk__in=[fila[0] for fila in filas])
+                         .values_list('pk', 'descripcion'))
+    return [{'posicion': posicion, 'producto': producto, 'descripcion': descripciones.get(producto),
+             'cantidad': cantidad, 'importe': _importe(importe)}
+            for producto, cantidad, importe, posicion in filas]
+
+
+def ranking_clientes(desde, hasta, limite=10):
+    """Clientes con mayor importe de ventas entre los meses 'desde' y 'hasta'."""
+    filas = _ranking(VentaClienteMes, 'cliente', desde, hasta, 'importe', limite)
+    nombres = dict(Cliente.objects.filter(pk__in=[fila[0] for fila in filas])
+                   .values_list('pk', 'NombreCliente'))
+    return [{'posicion': posicion, 'cliente': cliente, 'nombre': nombres.get(cliente),
+             'cantidad': cantidad, 'importe': _importe(importe)}
+            for cliente, cantidad, importe, posicion in filas]
+
+
+def inicio_de_periodo(fecha, periodo):
+    if periodo == 'semana':
+        return fecha - datetime.timedelta(days=fecha.weekday())
+    if periodo == 'mes':
+        return fecha.replace(day=1)
+    return fecha
+
+
+def _siguiente_periodo(inicio, periodo):
+    """Inicio del periodo siguiente; None si ya no cabe en datetime.date (después de 9999-12-31)."""
+    try:
+        if periodo == 'mes':
+            return (inicio + datetime.timedelta(days=31)).replace(day=1)
+        return inicio + datetime.timedelta(days=7 if periodo == 'semana' else 1)
+    except OverflowError:
+        return None
+
+
+def serie_ventas(desde, hasta, periodo='dia'):
+    """Número de facturas e importe por día, semana o mes entre dos fechas (incluidas)."""
+    totales = {}
+    for modelo in (Factura, FacturaArchivo):
+        dias = (modelo.objects.filter(fecha__range=(desde, hasta))
+                .values('fecha')
+                .annotate(facturas=Count('num'), total_importe=Sum('importe'))
+                .values_list('fecha', 'facturas', 'total_importe')
+                .order_by())
+        for fecha, facturas, importe in dias:
+            acumulado = totales.setdefault(inicio_de_periodo(fecha, periodo), [0, Decimal('0')])
+            acumulado[0] += facturas
+            acumulado[1] += importe
+    serie, inicio = [], inicio_de_periodo(desde, periodo)
+    while inicio is not None and inicio <= hasta:
+        facturas, importe = totales.get(inicio, (0, Decimal('0')))
+        serie.append({'periodo': inicio, 'facturas': facturas, 'importe': _importe(importe)})
+        inicio = _siguiente_periodo(inicio, periodo)
+    return serie
@@ -0,0 +1,191 @@
+# gestion_empresa/lean.py
+
+"""
+Modo de lectura "ligero" para los listados de la API.
+
+En lugar de construir una instancia del modelo por fila y pasarla por
+ModelSerializer.to_representation campo a campo, se leen tuplas con
+values_list (incluidos los campos relacionados como
+'producto.descripcion') y cada fila se convierte con extractores
+precompilados a partir del serializador: la salida es la misma, clave a
+clave y valor a valor, que la del serializador original.
+
+Solo se aplica a serializadores cuyos campos se puedan leer todos en SQL
+(campos del modelo, 'source' con puntos y listas anidadas de una relación
+inversa, como las líneas de un pedido, que se leen con una consulta por
+bloque de filas); en otro caso el listado sigue el camino normal.
+"""
+
+import itertools
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.query import BaseIterable, ValuesListIterable
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .serializers import seleccion_de_campos
+
+# Campos cuyo to_representation devuelve el valor leído de la BD tal cual
+SIN_CONVERSION = (serializers.ReadOnlyField, serializers.CharField, serializers.IntegerField,
+                  serializers.PrimaryKeyRelatedField)
+
+
+def compilar(serializer_class, serializer=None):
+    """
+    Devuelve (rutas, iterable) para leer las filas del serializador con
+    values_list, o None si algún campo no se puede leer directamente en SQL
+    (métodos, propiedades, serializadores anidados salvo las listas de una
+    relación inversa...). 'iterable' es una subclase de LeanIterable con los
+    nombres de salida, los conversores de los campos que necesitan formato
+    (decimales, fechas...) y los planes de las listas anidadas. 'serializer'
+    es una instancia ya construida de la clase (p. ej. reducida con '?fields=').
+    """
+    if serializer is None:
+        serializer = serializer_class()
+    return _compilar(serializer, serializer_class.__name__, anidar=True)
+
+
+def _compilar(serializer, nombre_clase, anidar):
+    if not isinstance(serializer, serializers.ModelSerializer):
+        return None
+    modelo = serializer.Meta.model
+    nombres, rutas, conversores, anidados = [], [], [], []
+    for nombre, campo in serializer.fields.items():
+        if campo.write_only:
+            continue
+        if anidar and isinstance(campo, serializers.ListSerializer):
+            relacion = _relacion_inversa(modelo, campo)
+            plan = relacion and _compilar(campo.child, nombre_clase, anidar=False)
+            if not plan:
+                return None
+            # La columna lee la clave de la fila; al iterar se sustituye por la lista anidada
+            anidados.append((len(nombres), relacion, plan))
+            nombres.append(nombre)
+            rutas.append('pk')
+            continue
+        if campo.source == '*' or isinstance(campo, (serializers.BaseSerializer, serializers.ManyRelatedField)):
+            return None
+        partes = campo.source.split('.')
+        actual = modelo
+        try:
+            for parte in partes[:-1]:
+                actual = actual._meta.get_field(parte).related_model
+            destino = actual._meta.get_field(partes[-1])
+        except (FieldDoesNotExist, AttributeError):
+            return None
+        if not destino.concrete or destino.many_to_many:
+            return None
+        # Un PrimaryKeyRelatedField sobre una clave foránea muestra el id, que es lo que lee values_list
+        if isinstance(campo, serializers.PrimaryKeyRelatedField) and (
+                len(partes) > 1 or not destino.many_to_one or campo.pk_field is not None):
+            return None
+        if not isinstance(campo, SIN_CONVERSION):
+            conversores.append((len(nombres), campo.to_representation))
+        nombres.append(nombre)
+        rutas.append('__'.join(partes))
+    iterable = type('LeanIterable_%s' % nombre_clase, (LeanIterable,),
+                    {'nombres': tuple(nombres), 'conversores': tuple(conversores),
+                     'anidados': tuple(anidados)})
+    return rutas, iterable
+
+
+def _relacion_inversa(modelo, campo):
+    """Relación uno a muchos de 'modelo' de la que sale la lista anidada, o None."""
+    try:
+        relacion = modelo._meta.get_field(campo.source)
+    except FieldDoesNotExist:
+        return None
+    if not relacion.one_to_many or not relacion.auto_created or not relacion.field.target_field.primary_key:
+        return None
+    return relacion
+
+
+# Iterable de QuerySet: cada fila de values_list sale ya como el diccionario del serializador
+class LeanIterable(BaseIterable):
+    nombres = ()
+    conversores = ()
+    anidados = ()  # (posición, relación inversa, plan del serializador de la lista)
+
+    # Filas cuyas listas anidadas se leen con una misma consulta
+    bloque_anidados = 1000
+
+    @classmethod
+    def convertir(cls, fila):
+        # Las columnas sobrantes al final de la fila (claves de agrupación) se descartan en el zip
+        if cls.conversores:
+            fila = list(fila)
+            for i, conversor in cls.conversores:
+                if fila[i] is not None:
+                    fila[i] = conversor(fila[i])
+        return dict(zip(cls.nombres, fila))
+
+    def __iter__(self):
+        filas = ValuesListIterable(self.queryset, self.chunked_fetch, self.chunk_size)
+        if not self.anidados:
+            for fila in filas:
+                yield self.convertir(fila)
+            return
+        filas = iter(filas)
+        while bloque := list(itertools.islice(filas, self.bloque_anidados)):
+            datos = [self.convertir(fila) for fila in bloque]
+            for posicion, relacion, (rutas, iterable) in self.anidados:
+                nombre = self.nombres[posicion]
+                claves = [fila[posicion] for fila in bloque]
+                por_clave = {clave: [] for clave in claves}
+                # Mismo orden que el gestor de la relación (Meta.ordering del modelo anidado)
+                hijos = (relacion.related_model._default_manager.using(self.queryset.db)
+                         .filter(**{relacion.field.name + '__in': claves})
+                         .values_list(*rutas, relacion.field.attname))
+                for hijo in hijos:
+                    por_clave[hijo[-1]].append(iterable.convertir(hijo))
+                for dato, clave in zip(datos, claves):
+                    dato[nombre] = por_clave[clave]
+            yield from datos
+
+
+def queryset_ligero(queryset, plan):
+    """Convierte el queryset para que produzca directamente las filas ya serializadas."""
+    rutas, iterable = plan
+    queryset = queryset.values_list(*rutas)
+    # El iterable se conserva al encadenar filter(), order_by() o slicing (p. ej. en la paginación)
+    queryset._iterable_class = iterable
+    return queryset
+
+
+# Mixin para ViewSets: listados con el modo ligero (opcional, 'lean_list = True')
+class LeanListMixin:
+    """
+    Sustituye la serialización del listado por queryset_ligero cuando el
+    ViewSet lo activa y el serializador lo admite. La paginación (también la
+    de clave), los filtros, la caché y los validadores ETag no cambian.
+    """
+    lean_list = False
+
+    # Plan compilado, por clase de serializador y selección de campos (?fields= / ?expand=)
+    _planes_ligeros = {}
+
+    def get_lean_plan(self):
+        serializer_class = self.get_serializer_class()
+        seleccion = seleccion_de_campos(self.request)
+        clave = (serializer_class, seleccion)
+        if clave not in self._planes_ligeros:
+            serializer = self.get_serializer() if seleccion is not None else None
+            plan = compilar(serializer_class, serializer)
+            # La paginación por clave lee su posición de las filas: sin esos campos, camino normal
+            opts = serializer_class.Meta.model._meta
+            if plan and not {opts.pk.name if nombre == 'pk' else nombre
+                             for nombre in getattr(self, 'keyset_ordering', None) or ()} <= set(plan[1].nombres):
+                plan = None
+            self._planes_ligeros[clave] = plan
+        return self._planes_ligeros[clave]
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_lean_plan() if self.lean_list else None
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = queryset_ligero(self.filter_queryset(self.get_queryset()), plan)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(list(queryset))
@@ -0,0 +1,29 @@
+# gestion_empresa/management/commands/archivar.py
+
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from gestion_empresa import archivo
+from gestion_empresa.models import Factura, Pedido
+
+
+class Command(BaseCommand):
+    help = ("Traslada a las tablas de archivo (Pedidos_Archivo, Facturas_Archivo y sus líneas) los "
+            "pedidos y facturas con fecha anterior al corte, por bloques. Se puede interrumpir y "
+            "repetir; los resúmenes de ventas no cambian.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--antes-de', type=datetime.date.fromisoformat,
+                            help='Fecha de corte (AAAA-MM-DD). Por defecto, hoy menos --dias.')
+        parser.add_argument('--dias', type=int, default=730)
+        parser.add_argument('--tamano-bloque', type=int, default=1000,
+                            help='Cabeceras por transacción.')
+
+    def handle(self, *args, **options):
+        antes_de = options['antes_de'] or timezone.localdate() - datetime.timedelta(days=options['dias'])
+        for modelo in (Pedido, Factura):
+            cabeceras, lineas = archivo.archivar(modelo, antes_de, tamano_bloque=options['tamano_bloque'])
+            self.stdout.write('%s: %d archivados (%d líneas) anteriores a %s' % (
+                modelo._meta.verbose_name_plural, cabeceras, lineas, antes_de))
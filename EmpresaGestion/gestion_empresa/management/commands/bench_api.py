@@ -0,0 +1,186 @@
+# gestion_empresa/management/commands/bench_api.py
+
+import datetime
+import json
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from gestion_empresa.models import Cliente, Factura, Producto, Proveedor
+from gestion_empresa.urls import router
+
+# Escenario fijo: parámetros de filtro por recurso (ver 'filtros' en views.py)
+FILTROS = {
+    'clientes': {'nombre': 'ma'},
+    'proveedores': {},
+    'productos': {'descripcion': 'to', 'precio_max': '100'},
+    'pedidos': {'fecha_desde': '{hace_un_mes}'},
+    'facturas': {'fecha_desde': '{hace_un_mes}'},
+    'facturas-detalle': {'producto': '{producto}'},
+    'ventas-cliente-mes': {'desde': '{mes_hace_un_ano}'},
+    'ventas-producto-mes': {'desde': '{mes_hace_un_ano}'},
+}
+
+
+def recurso_de_datos(viewset):
+    # Los ViewSets con permisos propios (p. ej. trabajos, solo administradores) no son recursos de
+    # datos: el escenario, sin usuario, solo mediría respuestas 403
+    return list(viewset.permission_classes) == list(api_settings.DEFAULT_PERMISSION_CLASSES)
+
+
+def percentil(tiempos, p):
+    ordenados = sorted(tiempos)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+class Command(BaseCommand):
+    help = ("Ejecuta un escenario fijo (list, retrieve, filter y create) contra cada recurso de datos del "
+            "router de gestion_empresa y guarda peticiones/s, percentiles de latencia y número de "
+            "consultas en un fichero JSON. Con --comparar muestra la diferencia con una ejecución "
+            "anterior. Las altas se deshacen al terminar.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=50, help='Peticiones por operación.')
+        parser.add_argument('--salida', default='bench_api.json')
+        parser.add_argument('--comparar', help='JSON de una ejecución anterior.')
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--recursos', nargs='+', help='Limita el escenario a estos recursos.')
+
+    def handle(self, *args, **options):
+        if not Producto.objects.exists() or not Cliente.objects.exists():
+            raise CommandError('No hay datos: ejecute antes manage.py generar_datos.')
+        self.azar = random.Random(options['semilla'])
+        self.iteraciones = options['iteraciones']
+        self.cliente = APIClient()
+
+        resultados = {}
+        with override_settings(ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver']), \
+                transaction.atomic():
+            self.contexto = self.preparar_contexto()
+            for prefijo, viewset, _ in router.registry:
+                if options['recursos'] and prefijo not in options['recursos']:
+                    continue
+                if not recurso_de_datos(viewset):
+                    self.stderr.write('%s: omitido, no es un recurso de datos.' % prefijo)
+                    continue
+                for operacion, peticiones in self.escenario(prefijo, viewset):
+                    resultados['%s.%s' % (prefijo, operacion)] = self.medir(peticiones)
+            transaction.set_rollback(True)
+
+        informe = {
+            'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+            'base_de_datos': connection.vendor,
+            'iteraciones': self.iteraciones,
+            'resultados': resultados,
+        }
+        with open(options['salida'], 'w', encoding='utf-8') as fichero:
+            json.dump(informe, fichero, indent=2, ensure_ascii=False)
+
+        anterior = None
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as fichero:
+                anterior = json.load(fichero)['resultados']
+        self.mostrar(resultados, anterior)
+        self.stdout.write('Resultados guardados en %s' % options['salida'])
+
+    def preparar_contexto(self):
+        hoy = datetime.date.today()
+        productos = list(Producto.objects.order_by('pk').values_list('pk', flat=True)[:max(1000, self.iteraciones)])
+        factura = Factura.objects.create(num=(Factura.objects.aggregate(m=Max('num'))['m'] or 0) + 1,
+                                         fecha=hoy, importe=0, cliente=Cliente.objects.order_by('pk').first())
+        return {
+            'hoy': hoy.isoformat(),
+            'hace_un_mes': (hoy - datetime.timedelta(days=30)).isoformat(),
+            'mes_hace_un_ano': (hoy - datetime.timedelta(days=365)).strftime('%Y-%m'),
+            'producto': productos[0],
+            'productos': productos,
+            'cliente': Cliente.objects.order_by('pk').values_list('pk', flat=True).first(),
+            'proveedor': Proveedor.objects.order_by('pk').values_list('pk', flat=True).first(),
+            'factura': factura.num,
+            'siguiente_rut': (Proveedor.objects.aggregate(m=Max('rut'))['m'] or 0) + 1,
+            'siguiente_factura': factura.num + 1,
+        }
+
+    def escenario(self, prefijo, viewset):
+        """Genera (operación, [función que hace una petición]) para el recurso."""
+        url = '/api/%s/' % prefijo
+        n = self.iteraciones
+        yield 'list', [lambda: self.cliente.get(url)] * n
+
+        claves = list(viewset.queryset.order_by('pk').values_list('pk', flat=True)[:1000])
+        if claves:
+            elegidas = [self.azar.choice(claves) for _ in range(n)]
+            yield 'retrieve', [lambda pk=pk: self.cliente.get('%s%s/' % (url, pk)) for pk in elegidas]
+
+        filtro = {k: v.format(**self.contexto) for k, v in FILTROS.get(prefijo, {}).items()}
+        if filtro:
+            yield 'filter', [lambda: self.cliente.get(url, filtro)] * n
+
+        alta = self.altas().get(prefijo)
+        if alta and hasattr(viewset, 'create'):
+            yield 'create', [lambda i=i: self.cliente.post(url, alta(i), format='json') for i in range(n)]
+
+    def altas(self):
+        """Recurso -> función que devuelve el cuerpo de la alta i-ésima; sin entrada, no se mide 'create'."""
+        c = self.contexto
+        return {
+            'clientes': lambda i: {'NombreCliente': 'Bench %d' % i, 'celular': '0'},
+            'proveedores': lambda i: {'rut': c['siguiente_rut'] + i, 'razon_social': 'Bench %d' % i,
+                                      'telefono': '0'},
+            'productos': lambda i: {'descripcion': 'Bench %d' % i, 'precio': '1.00',
+                                    'id_proveedor': c['proveedor']},
+            'pedidos': lambda i: {'cliente': c['cliente'], 'fecha': c['hoy'],
+                                  'lineas': [{'producto': producto, 'cantidad': 1}
+                                             for producto in c['productos'][i % 100:i % 100 + 5]]},
+            'facturas': lambda i: {'num': c['siguiente_factura'] + i, 'fecha': c['hoy'], 'importe': '0.00',
+                                   'cliente': c['cliente']},
+            # Una línea por producto distinto: (factura, producto) es única
+            'facturas-detalle': lambda i: {'factura': c['factura'], 'producto': c['productos'][i],
+                                           'cantidad': 1, 'precio_unitario': '1.00'},
+        }
+
+    def medir(self, peticiones):
+        tiempos, consultas, errores = [], [], 0
+        inicio = time.perf_counter()
+        for peticion in peticiones:
+            with CaptureQueriesContext(connection) as capturadas:
+                t0 = time.perf_counter()
+                respuesta = peticion()
+                tiempos.append(time.perf_counter() - t0)
+            consultas.append(len(capturadas.captured_queries))
+            errores += respuesta.status_code >= 400
+        total = time.perf_counter() - inicio
+        return {
+            'peticiones': len(peticiones),
+            'errores': errores,
+            'peticiones_s': round(len(peticiones) / total, 1),
+            'p50_ms': round(percentil(tiempos, 50) * 1000, 2),
+            'p90_ms': round(percentil(tiempos, 90) * 1000, 2),
+            'p99_ms': round(percentil(tiempos, 99) * 1000, 2),
+            'media_ms': round(statistics.mean(tiempos) * 1000, 2),
+            'consultas_media': round(statistics.mean(consultas), 2),
+            'consultas_max': max(consultas),
+        }
+
+    def mostrar(self, resultados, anterior):
+        self.stdout.write('%-32s %10s %9s %9s %9s %9s %7s' % (
+            'operación', 'pet./s', 'p50 ms', 'p90 ms', 'p99 ms', 'consultas', 'errores'))
+        for nombre, r in resultados.items():
+            linea = '%-32s %10.1f %9.2f %9.2f %9.2f %9.1f %7d' % (
+                nombre, r['peticiones_s'], r['p50_ms'], r['p90_ms'], r['p99_ms'],
+                r['consultas_media'], r['errores'])
+            previo = (anterior or {}).get(nombre)
+            if previo:
+                linea += '   p50 %+.0f%%  pet./s %+.0f%%  consultas %+.1f' % (
+                    (r['p50_ms'] / previo['p50_ms'] - 1) * 100 if previo['p50_ms'] else 0,
+                    (r['peticiones_s'] / previo['peticiones_s'] - 1) * 100 if previo['peticiones_s'] else 0,
+                    r['consultas_media'] - previo['consultas_media'])
+            self.stdout.write(linea)
@@ -0,0 +1,95 @@
+# gestion_empresa/management/commands/bench_arranque.py
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Se ejecuta en un proceso nuevo por medición: importa EmpresaGestion.wsgi y atiende dos peticiones.
+# La petición se construye aquí, sin importar nada más, para no adelantar imports a la primera petición
+PROCESO_HIJO = '''
+import io, json, sys, time
+
+inicio = time.perf_counter()
+from EmpresaGestion.wsgi import application
+importado = time.perf_counter()
+
+from django.apps import apps
+from django.conf import settings
+
+settings.ALLOWED_HOSTS = ["bench.local"]
+
+
+def peticion(ruta):
+    environ = {
+        "REQUEST_METHOD": "GET", "PATH_INFO": ruta, "QUERY_STRING": "", "SCRIPT_NAME": "",
+        "SERVER_NAME": "bench.local", "SERVER_PORT": "80", "HTTP_HOST": "bench.local",
+        "SERVER_PROTOCOL": "HTTP/1.1", "wsgi.version": (1, 0), "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(), "wsgi.errors": io.StringIO(), "wsgi.multithread": True,
+        "wsgi.multiprocess": False, "wsgi.run_once": False,
+    }
+    estado = []
+    comienzo = time.perf_counter()
+    cuerpo = application(environ, lambda status, headers, exc_info=None: estado.append(status))
+    for _ in cuerpo:
+        pass
+    getattr(cuerpo, "close", lambda: None)()
+    return int(estado[0].split()[0]), time.perf_counter() - comienzo
+
+
+estado, primera = peticion(sys.argv[1])
+_, segunda = peticion(sys.argv[1])
+print(json.dumps({
+    "importacion_ms": (importado - inicio) * 1000, "primera_ms": primera * 1000, "segunda_ms": segunda * 1000,
+    "estado": estado, "debug": settings.DEBUG, "aplicaciones": len(apps.get_app_configs()),
+    "desarrollo": [app for app in ("tailwind", "django_browser_reload", "theme") if apps.is_installed(app)],
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = ("Mide el arranque en frío de un worker por perfil (DJANGO_PERFIL): importación de "
+            "EmpresaGestion.wsgi.application y primera petición, cada medición en un proceso nuevo. "
+            "Falla si la mediana de importación + primera petición supera --umbral-ms.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--perfiles', nargs='+', choices=['desarrollo', 'produccion'],
+                            default=['desarrollo', 'produccion'])
+        parser.add_argument('--repeticiones', type=int, default=5, help='Procesos por perfil.')
+        parser.add_argument('--ruta', default='/api/', help='Ruta de la primera petición.')
+        parser.add_argument('--umbral-ms', type=float, default=800,
+                            help='Máximo de la mediana de importación + primera petición; 0 no comprueba.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('%-11s %14s %12s %10s %10s %7s %6s  %s' % (
+            'perfil', 'importación ms', 'primera ms', 'total ms', 'segunda ms', 'estado', 'apps',
+            'apps de desarrollo'))
+        excedidos = []
+        for perfil in options['perfiles']:
+            mediciones = [self.medir(perfil, options['ruta']) for _ in range(options['repeticiones'])]
+            mediana = {clave: statistics.median(m[clave] for m in mediciones)
+                       for clave in ('importacion_ms', 'primera_ms', 'segunda_ms')}
+            total = mediana['importacion_ms'] + mediana['primera_ms']
+            ultima = mediciones[-1]
+            self.stdout.write('%-11s %14.1f %12.1f %10.1f %10.1f %7s %6d  %s' % (
+                perfil, mediana['importacion_ms'], mediana['primera_ms'], total, mediana['segunda_ms'],
+                ultima['estado'], ultima['aplicaciones'], ', '.join(ultima['desarrollo']) or '-'))
+            if options['umbral_ms'] and total > options['umbral_ms']:
+                excedidos.append('%s: %.1f ms' % (perfil, total))
+        if excedidos:
+            raise CommandError('Arranque por encima de %.0f ms: %s.' % (options['umbral_ms'], '; '.join(excedidos)))
+
+    def medir(self, perfil, ruta):
+        entorno = dict(os.environ, DJANGO_PERFIL=perfil)
+        # En producción la configuración solo se lee del entorno (settings.py): sin .env, la clave
+        # obligatoria se toma de la configuración actual
+        entorno.setdefault('SECRET_KEY', settings.SECRET_KEY)
+        proceso = subprocess.run([sys.executable, '-c', PROCESO_HIJO, ruta], cwd=settings.BASE_DIR, env=entorno,
+                                 capture_output=True, text=True)
+        if proceso.returncode:
+            raise CommandError('El proceso de medición (%s) falló:\n%s' % (perfil, proceso.stderr[-2000:]))
+        return json.loads(proceso.stdout.strip().splitlines()[-1])
@@ -0,0 +1,128 @@
+# gestion_empresa/management/commands/bench_asgi.py
+
+import asyncio
+import io
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+RECURSOS = ['clientes', 'proveedores', 'productos', 'pedidos', 'facturas', 'facturas-detalle']
+HOST = 'bench.local'
+
+
+def percentil(tiempos, p):
+    ordenados = sorted(tiempos)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def peticion_wsgi(aplicacion, ruta):
+    """Llama al callable WSGI directamente y devuelve (estado, segundos)."""
+    ruta, _, query = ruta.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': ruta, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'HTTP_HOST': HOST, 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(), 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    estado = []
+    inicio = time.perf_counter()
+    cuerpo = aplicacion(environ, lambda status, headers, exc_info=None: estado.append(status))
+    for _ in cuerpo:
+        pass
+    getattr(cuerpo, 'close', lambda: None)()
+    return int(estado[0].split()[0]), time.perf_counter() - inicio
+
+
+async def peticion_asgi(aplicacion, ruta):
+    """Llama al callable ASGI directamente y devuelve (estado, segundos)."""
+    ruta, _, query = ruta.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': ruta, 'raw_path': ruta.encode(), 'query_string': query.encode(),
+        'root_path': '', 'headers': [(b'host', HOST.encode())], 'server': (HOST, 80),
+        'client': ('127.0.0.1', 0),
+    }
+    terminado = asyncio.Event()
+    mensajes = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    estado = []
+
+    async def receive():
+        if mensajes:
+            return mensajes.pop()
+        await terminado.wait()  # El cliente no se desconecta hasta tener la respuesta
+        return {'type': 'http.disconnect'}
+
+    async def send(mensaje):
+        if mensaje['type'] == 'http.response.start':
+            estado.append(mensaje['status'])
+        elif not mensaje.get('more_body'):
+            terminado.set()
+
+    inicio = time.perf_counter()
+    await aplicacion(scope, receive, send)
+    return estado[0], time.perf_counter() - inicio
+
+
+class Command(BaseCommand):
+    help = ("Compara peticiones por segundo y latencia p99 de la ruta síncrona (WSGI, /api/<recurso>/) "
+            "y la asíncrona (ASGI, /api/async/<recurso>/) con la misma concurrencia, llamando "
+            "directamente a los callables de wsgi.py y asgi.py. Mide sobre los datos existentes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=500, help='Peticiones por recurso y ruta.')
+        parser.add_argument('--concurrencia', type=int, default=8,
+                            help='Hilos WSGI y, con el mismo valor, peticiones ASGI simultáneas.')
+        parser.add_argument('--recursos', nargs='+', choices=RECURSOS, default=RECURSOS)
+        parser.add_argument('--detalle', action='store_true',
+                            help='Mide el detalle del primer objeto en lugar del listado.')
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+        from EmpresaGestion.asgi import application as asgi
+        from EmpresaGestion.wsgi import application as wsgi
+
+        self.stdout.write('%-18s %5s %12s %10s %10s %8s' % ('recurso', 'ruta', 'peticiones/s', 'p50 ms',
+                                                             'p99 ms', 'errores'))
+        with override_settings(ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + [HOST]):
+            for recurso in options['recursos']:
+                sufijo = self.sufijo(recurso) if options['detalle'] else ''
+                for nombre, medir in (('wsgi', self.medir_wsgi), ('asgi', self.medir_asgi)):
+                    ruta = ('/api/%s/%s' if nombre == 'wsgi' else '/api/async/%s/%s') % (recurso, sufijo)
+                    resultados, segundos = medir(wsgi if nombre == 'wsgi' else asgi, ruta,
+                                                 options['peticiones'], options['concurrencia'])
+                    tiempos = [t for _, t in resultados]
+                    errores = sum(1 for estado, _ in resultados if estado != 200)
+                    self.stdout.write('%-18s %5s %12.0f %10.2f %10.2f %8d' % (
+                        recurso, nombre, len(resultados) / segundos,
+                        statistics.median(tiempos) * 1000, percentil(tiempos, 99) * 1000, errores))
+
+    def sufijo(self, recurso):
+        from gestion_empresa.urls import RECURSOS_ASYNC
+        pk = RECURSOS_ASYNC[recurso].queryset.values_list('pk', flat=True).first()
+        return '%s/' % pk if pk is not None else ''
+
+    def medir_wsgi(self, aplicacion, ruta, peticiones, concurrencia):
+        # Como un servidor con 'concurrencia' hilos: cada hilo atiende peticiones de una en una
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(concurrencia) as pool:
+            resultados = list(pool.map(lambda _: peticion_wsgi(aplicacion, ruta), range(peticiones)))
+        return resultados, time.perf_counter() - inicio
+
+    def medir_asgi(self, aplicacion, ruta, peticiones, concurrencia):
+        # Un bucle de eventos con 'concurrencia' peticiones en curso a la vez
+        async def trabajador(cola, resultados):
+            while cola:
+                cola.pop()
+                resultados.append(await peticion_asgi(aplicacion, ruta))
+
+        async def principal():
+            cola, resultados = list(range(peticiones)), []
+            inicio = time.perf_counter()
+            await asyncio.gather(*(trabajador(cola, resultados) for _ in range(concurrencia)))
+            return resultados, time.perf_counter() - inicio
+
+        return asyncio.run(principal())
@@ -0,0 +1,56 @@
+# gestion_empresa/management/commands/bench_export.py
+
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from gestion_empresa.models import Producto, Proveedor
+from gestion_empresa.views import ProductoViewSet
+
+
+class Command(BaseCommand):
+    help = ("Mide filas por segundo y memoria máxima de /api/productos/export/ "
+            "con catálogos sintéticos de distintos tamaños (los datos se descartan al terminar).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, nargs='+', default=[10000, 100000],
+                            help='Tamaños de catálogo a medir.')
+        parser.add_argument('--formato', choices=['ndjson', 'csv'], nargs='+',
+                            default=['ndjson', 'csv'])
+
+    def handle(self, *args, **options):
+        vista = ProductoViewSet.as_view({'get': 'export'})
+        factory = APIRequestFactory()
+
+        self.stdout.write('%10s %8s %10s %12s %14s' % ('filas', 'formato', 'segundos', 'filas/s', 'memoria máx.'))
+        for filas in options['filas']:
+            with transaction.atomic():
+                self.generar_catalogo(filas)
+                for formato in options['formato']:
+                    tracemalloc.start()
+                    inicio = time.perf_counter()
+                    respuesta = vista(factory.get('/api/productos/export/', {'formato': formato}))
+                    # Un trozo por fila (más la cabecera en CSV)
+                    trozos = tamano = 0
+                    for trozo in respuesta.streaming_content:
+                        trozos += 1
+                        tamano += len(trozo)
+                    segundos = time.perf_counter() - inicio
+                    _, pico = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    exportadas = trozos - (formato == 'csv')
+                    self.stdout.write('%10d %8s %10.2f %12.0f %11.1f KB   (%d bytes)' % (
+                        exportadas, formato, segundos, exportadas / segundos, pico / 1024, tamano))
+                transaction.set_rollback(True)
+
+    def generar_catalogo(self, filas):
+        proveedor = Proveedor.objects.create(rut=999999999, razon_social='Benchmark', telefono='0')
+        Producto.objects.bulk_create(
+            (Producto(descripcion='Producto %d' % i, precio=Decimal('9.99'), id_proveedor=proveedor)
+             for i in range(filas)),
+            batch_size=5000,
+        )
@@ -0,0 +1,76 @@
+# gestion_empresa/management/commands/bench_renderizado.py
+
+import datetime
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+
+from gestion_empresa.models import Cliente, Factura, FacturaDetalle, Producto, Proveedor
+from gestion_empresa.renderers import JSONRapidoRenderer, orjson
+from gestion_empresa.serializers import FacturaDetalleSerializer
+
+
+class Command(BaseCommand):
+    help = ("Compara el renderer JSON de DRF con el de la API (renderers.py) y la compresión gzip "
+            "sobre un listado de líneas de factura con datos sintéticos (se descartan al terminar). "
+            "Mide bytes y tiempo de CPU; comprueba que ambos renderers producen el mismo JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=10000)
+        parser.add_argument('--repeticiones', type=int, default=5,
+                            help='Se toma el mejor tiempo de N repeticiones.')
+
+    def handle(self, *args, **options):
+        filas, repeticiones = options['filas'], options['repeticiones']
+        with transaction.atomic():
+            factura = self.generar_datos(filas)
+            queryset = (FacturaDetalle.objects.filter(factura=factura).select_related('producto', 'factura')
+                        .order_by('pk'))
+            datos = FacturaDetalleSerializer(queryset, many=True).data
+            transaction.set_rollback(True)
+
+        drf, rapido = JSONRenderer(), JSONRapidoRenderer()
+        contenido = drf.render(datos)
+        if rapido.render(datos) != contenido:
+            raise CommandError('La salida del renderer rápido difiere de la de JSONRenderer.')
+        comprimido = compress_string(contenido)
+
+        self.stdout.write('%d filas; orjson %s' % (len(datos), 'instalado' if orjson else 'NO instalado'))
+        self.stdout.write('%-28s %12s %10s' % ('paso', 'bytes', 'cpu ms'))
+        resultados = [
+            ('JSONRenderer (DRF)', len(contenido), self.mejor_tiempo(lambda: drf.render(datos), repeticiones)),
+            ('JSONRapidoRenderer', len(contenido), self.mejor_tiempo(lambda: rapido.render(datos), repeticiones)),
+            ('gzip (GZipMiddleware)', len(comprimido),
+             self.mejor_tiempo(lambda: compress_string(contenido), repeticiones)),
+        ]
+        for nombre, tamano, tiempo in resultados:
+            self.stdout.write('%-28s %12d %10.1f' % (nombre, tamano, tiempo * 1000))
+        self.stdout.write('Renderizado %.1fx más rápido; gzip reduce la respuesta al %.1f%% (%.1fx)' % (
+            resultados[0][2] / resultados[1][2], 100 * len(comprimido) / len(contenido),
+            len(contenido) / len(comprimido)))
+
+    def mejor_tiempo(self, funcion, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.process_time()
+            funcion()
+            tiempos.append(time.process_time() - inicio)
+        return min(tiempos)
+
+    def generar_datos(self, filas):
+        proveedor = Proveedor.objects.create(rut=999999997, razon_social='Benchmark', telefono='0')
+        cliente = Cliente.objects.create(NombreCliente='Benchmark', celular='0')
+        productos = Producto.objects.bulk_create(
+            [Producto(descripcion='Producto %d' % i, precio=Decimal('9.99'), id_proveedor=proveedor)
+             for i in range(filas)], batch_size=5000)
+        factura = Factura.objects.create(num=999999997, fecha=datetime.date(2025, 1, 1), importe=Decimal('0'),
+                                         cliente=cliente)
+        # bulk_create no envía señales: los resúmenes de ventas no se tocan
+        FacturaDetalle.objects.bulk_create(
+            (FacturaDetalle(factura=factura, producto=producto, cantidad=1, precio_unitario=producto.precio)
+             for producto in productos), batch_size=5000)
+        return factura
@@ -0,0 +1,87 @@
+# gestion_empresa/management/commands/bench_serializacion.py
+
+import datetime
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from rest_framework.renderers import JSONRenderer
+
+from gestion_empresa.lean import compilar, queryset_ligero
+from gestion_empresa.models import Cliente, Factura, FacturaDetalle, Pedido, PedidoLinea, Producto, Proveedor
+from gestion_empresa.views import FacturaDetalleViewSet, PedidoViewSet
+
+
+class Command(BaseCommand):
+    help = ("Compara el serializador DRF y el modo ligero (lean.py) en listados de pedidos y líneas "
+            "de factura con datos sintéticos (se descartan al terminar). Comprueba que la salida "
+            "JSON es idéntica byte a byte.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=10000)
+        parser.add_argument('--repeticiones', type=int, default=3,
+                            help='Se toma el mejor tiempo de N repeticiones.')
+
+    def handle(self, *args, **options):
+        filas, repeticiones = options['filas'], options['repeticiones']
+        renderer = JSONRenderer()
+        self.stdout.write('%-26s %8s %10s %10s %9s' % ('serializador', 'filas', 'drf ms', 'ligero ms', 'mejora'))
+        with transaction.atomic():
+            self.generar_datos(filas)
+            for vista in (PedidoViewSet, FacturaDetalleViewSet):
+                serializer_class = vista.serializer_class
+                modelo = serializer_class.Meta.model
+                # Mismo plan de relaciones que el listado de la API
+                select, prefetch = vista().get_relation_plan()
+                # Solo las filas generadas: la prefetch de las líneas lee las de todos los pedidos del listado
+                queryset = (modelo.objects.filter(pk__gte=self.desde[modelo]).select_related(*select)
+                            .prefetch_related(*prefetch).order_by('pk'))
+                plan = compilar(serializer_class)
+
+                def drf():
+                    return renderer.render(serializer_class(queryset.all(), many=True).data)
+
+                def ligero():
+                    return renderer.render(list(queryset_ligero(queryset.all(), plan)))
+
+                if drf() != ligero():
+                    raise CommandError('La salida de %s difiere en modo ligero.' % serializer_class.__name__)
+                t_drf = self.mejor_tiempo(drf, repeticiones)
+                t_ligero = self.mejor_tiempo(ligero, repeticiones)
+                self.stdout.write('%-26s %8d %10.1f %10.1f %8.1fx' % (
+                    serializer_class.__name__, queryset.count(), t_drf * 1000, t_ligero * 1000,
+                    t_drf / t_ligero))
+            transaction.set_rollback(True)
+
+    def mejor_tiempo(self, funcion, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        return min(tiempos)
+
+    def generar_datos(self, filas):
+        proveedor = Proveedor.objects.create(rut=999999998, razon_social='Benchmark', telefono='0')
+        cliente = Cliente.objects.create(NombreCliente='Benchmark', celular='0')
+        productos = Producto.objects.bulk_create(
+            [Producto(descripcion='Producto %d' % i, precio=Decimal('9.99'), id_proveedor=proveedor)
+             for i in range(filas)], batch_size=5000)
+        fecha = datetime.date(2025, 1, 1)
+        factura = Factura.objects.create(num=999999998, fecha=fecha, importe=Decimal('0'), cliente=cliente)
+        self.desde = {modelo: (modelo.objects.aggregate(maximo=Max('pk'))['maximo'] or 0) + 1
+                      for modelo in (Pedido, FacturaDetalle)}
+        # Un pedido de tres líneas por cada tres productos (claves explícitas para las líneas)
+        primero = self.desde[Pedido]
+        Pedido.objects.bulk_create(
+            (Pedido(id_pedido=primero + i, cliente=cliente, fecha=fecha) for i in range(0, (filas + 2) // 3)),
+            batch_size=5000)
+        PedidoLinea.objects.bulk_create(
+            (PedidoLinea(pedido_id=primero + i // 3, producto=producto, cantidad=1)
+             for i, producto in enumerate(productos)), batch_size=5000)
+        # bulk_create no envía señales: los resúmenes de ventas no se tocan
+        FacturaDetalle.objects.bulk_create(
+            (FacturaDetalle(factura=factura, producto=producto, cantidad=1, precio_unitario=producto.precio)
+             for producto in productos), batch_size=5000)
@@ -0,0 +1,163 @@
+# gestion_empresa/management/commands/generar_datos.py
+
+import datetime
+import itertools
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from gestion_empresa import rollups
+from gestion_empresa.models import Cliente, Factura, FacturaDetalle, Pedido, PedidoLinea, Producto, Proveedor
+
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Carmen', 'Jorge', 'Lucía', 'Pedro', 'Elena', 'Pablo',
+           'Sofía', 'Diego', 'Laura', 'Andrés', 'Valentina', 'Martín', 'Paula', 'Tomás']
+APELLIDOS = ['García', 'Rodríguez', 'González', 'Fernández', 'López', 'Martínez', 'Sánchez',
+             'Pérez', 'Gómez', 'Díaz', 'Mendoza', 'Silva', 'Castro', 'Rojas', 'Vargas']
+EMPRESAS = ['Distribuidora', 'Comercial', 'Importadora', 'Suministros', 'Industrias', 'Almacenes']
+ARTICULOS = ['Tornillo', 'Cable', 'Bombilla', 'Cinta', 'Pintura', 'Tubo', 'Llave', 'Martillo',
+             'Guante', 'Brocha', 'Enchufe', 'Bisagra', 'Tuerca', 'Arandela', 'Sierra', 'Taladro']
+VARIANTES = ['pequeño', 'mediano', 'grande', 'reforzado', 'galvanizado', 'blanco', 'negro', 'industrial']
+
+
+def siguiente_pk(modelo):
+    return (modelo.objects.aggregate(maximo=Max('pk'))['maximo'] or 0) + 1
+
+
+def por_lotes(objetos, tamano):
+    objetos = iter(objetos)
+    while lote := list(itertools.islice(objetos, tamano)):
+        yield lote
+
+
+class Command(BaseCommand):
+    help = ("Genera datos sintéticos (clientes, proveedores, productos, pedidos, facturas y sus "
+            "líneas) con bulk_create por lotes y claves explícitas, y reconstruye los resúmenes "
+            "de ventas. Los datos se añaden a los existentes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=10000)
+        parser.add_argument('--proveedores', type=int, default=200)
+        parser.add_argument('--productos', type=int, default=5000)
+        parser.add_argument('--pedidos', type=int, default=100000)
+        parser.add_argument('--facturas', type=int, default=100000)
+        parser.add_argument('--lineas', type=int, default=10,
+                            help='Líneas medias por factura (entre 1 y el doble).')
+        parser.add_argument('--lineas-pedido', type=int, default=3,
+                            help='Líneas medias por pedido (entre 1 y el doble).')
+        parser.add_argument('--dias', type=int, default=730,
+                            help='Las fechas se reparten en los N días anteriores a hoy.')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por bulk_create.')
+        parser.add_argument('--semilla', type=int, default=1, help='Semilla para datos reproducibles.')
+        parser.add_argument('--sin-resumenes', action='store_true',
+                            help='No reconstruir VentaClienteMes / VentaProductoMes al terminar.')
+
+    def handle(self, *args, **options):
+        self.azar = random.Random(options['semilla'])
+        self.lote = options['lote']
+        self.hoy = datetime.date.today()
+        self.dias = options['dias']
+        self.precios = {}
+
+        clientes = self.crear(Cliente, options['clientes'], self.cliente)
+        proveedores = self.crear(Proveedor, options['proveedores'], self.proveedor)
+        productos = self.crear(Producto, options['productos'], lambda pk: self.producto(pk, proveedores))
+        self.crear_pedidos(options['pedidos'], options['lineas_pedido'], clientes, productos)
+        self.crear_facturas(options['facturas'], options['lineas'], clientes, productos)
+
+        if not options['sin_resumenes']:
+            inicio = time.perf_counter()
+            por_cliente, por_producto = rollups.reconstruir()
+            self.stdout.write('Resúmenes de ventas: %d por cliente, %d por producto (%.1f s)'
+                              % (por_cliente, por_producto, time.perf_counter() - inicio))
+
+    def crear(self, modelo, cantidad, fabrica):
+        """Inserta 'cantidad' filas con claves consecutivas y devuelve la lista de claves."""
+        inicio = time.perf_counter()
+        primera = siguiente_pk(modelo)
+        claves = list(range(primera, primera + cantidad))
+        for lote in por_lotes((fabrica(pk) for pk in claves), self.lote):
+            with transaction.atomic():
+                modelo.objects.bulk_create(lote)
+        self.informar(modelo, cantidad, inicio)
+        return claves
+
+    def crear_pedidos(self, cantidad, lineas_medias, clientes, productos):
+        inicio = time.perf_counter()
+        primero = siguiente_pk(Pedido)
+        siguiente_linea = siguiente_pk(PedidoLinea)
+        total_lineas = 0
+        for claves in por_lotes(range(primero, primero + cantidad), max(1, self.lote // lineas_medias)):
+            pedidos, lineas = [], []
+            for pk in claves:
+                elegidos = self.azar.sample(productos, min(len(productos),
+                                                           self.azar.randint(1, 2 * lineas_medias - 1)))
+                for producto_id in elegidos:
+                    lineas.append(PedidoLinea(id=siguiente_linea, pedido_id=pk, producto_id=producto_id,
+                                              cantidad=self.azar.randint(1, 10)))
+                    siguiente_linea += 1
+                pedidos.append(Pedido(id_pedido=pk, cliente_id=self.azar.choice(clientes), fecha=self.fecha()))
+            with transaction.atomic():
+                Pedido.objects.bulk_create(pedidos)
+                PedidoLinea.objects.bulk_create(lineas, batch_size=self.lote)
+            total_lineas += len(lineas)
+        self.informar(Pedido, cantidad, inicio)
+        self.informar(PedidoLinea, total_lineas, inicio)
+
+    def crear_facturas(self, cantidad, lineas_medias, clientes, productos):
+        inicio = time.perf_counter()
+        primera = siguiente_pk(Factura)
+        siguiente_linea = siguiente_pk(FacturaDetalle)
+        total_lineas = 0
+        for numeros in por_lotes(range(primera, primera + cantidad), max(1, self.lote // lineas_medias)):
+            facturas, lineas = [], []
+            for num in numeros:
+                elegidos = self.azar.sample(productos, min(len(productos),
+                                                           self.azar.randint(1, 2 * lineas_medias - 1)))
+                importe = Decimal('0')
+                for producto_id in elegidos:
+                    cantidad_linea = self.azar.randint(1, 20)
+                    precio = self.precios[producto_id]
+                    importe += cantidad_linea * precio
+                    lineas.append(FacturaDetalle(id=siguiente_linea, factura_id=num, producto_id=producto_id,
+                                                 cantidad=cantidad_linea, precio_unitario=precio))
+                    siguiente_linea += 1
+                facturas.append(Factura(num=num, fecha=self.fecha(), importe=importe,
+                                        cliente_id=self.azar.choice(clientes)))
+            with transaction.atomic():
+                Factura.objects.bulk_create(facturas)
+                # bulk_create no envía señales: los resúmenes se reconstruyen al final
+                FacturaDetalle.objects.bulk_create(lineas, batch_size=self.lote)
+            total_lineas += len(lineas)
+        self.informar(Factura, cantidad, inicio)
+        self.informar(FacturaDetalle, total_lineas, inicio)
+
+    def informar(self, modelo, cantidad, inicio):
+        segundos = time.perf_counter() - inicio
+        self.stdout.write('%-16s %10d filas %8.1f s %10.0f filas/s' % (
+            modelo._meta.verbose_name_plural, cantidad, segundos, cantidad / segundos if segundos else 0))
+
+    # --- Fábricas de filas ---------------------------------------------------------
+
+    def fecha(self):
+        return self.hoy - datetime.timedelta(days=self.azar.randrange(self.dias))
+
+    def cliente(self, pk):
+        return Cliente(id=pk, NombreCliente='%s %s %s' % (
+            self.azar.choice(NOMBRES), self.azar.choice(APELLIDOS), self.azar.choice(APELLIDOS)),
+            celular='09%07d' % self.azar.randrange(10 ** 7))
+
+    def proveedor(self, rut):
+        return Proveedor(rut=rut, razon_social='%s %s %d' % (
+            self.azar.choice(EMPRESAS), self.azar.choice(APELLIDOS), rut),
+            telefono='2%07d' % self.azar.randrange(10 ** 7))
+
+    def producto(self, pk, proveedores):
+        # El precio se guarda para copiarlo en las líneas de factura sin volver a leerlo
+        self.precios[pk] = Decimal(self.azar.randrange(50, 99999)) / 100
+        return Producto(codigo=pk, descripcion='%s %s %d' % (
+            self.azar.choice(ARTICULOS), self.azar.choice(VARIANTES), pk),
+            precio=self.precios[pk], id_proveedor_id=self.azar.choice(proveedores))
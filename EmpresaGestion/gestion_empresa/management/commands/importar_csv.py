@@ -0,0 +1,45 @@
+# gestion_empresa/management/commands/importar_csv.py
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion_empresa.importacion import ESPECIFICACIONES, importar
+
+
+class Command(BaseCommand):
+    help = ("Importa (alta o actualización por clave) un CSV de productos, proveedores o clientes. "
+            "La cabecera usa los nombres de campo del modelo: productos 'codigo,descripcion,precio,"
+            "id_proveedor', proveedores 'rut,razon_social,telefono', clientes 'id,NombreCliente,celular'. "
+            "Sin 'codigo' / 'id' la fila se da de alta. Las filas rechazadas se guardan con el motivo.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('recurso', choices=sorted(ESPECIFICACIONES))
+        parser.add_argument('fichero')
+        parser.add_argument('--rechazos', help='CSV de filas rechazadas (por defecto <fichero>.rechazos.csv).')
+        parser.add_argument('--bloque', type=int, default=5000, help='Filas por bloque de validación y escritura.')
+        parser.add_argument('--delimitador', default=',')
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['fichero']):
+            raise CommandError('No existe el fichero %s.' % options['fichero'])
+        ruta_rechazos = options['rechazos'] or options['fichero'] + '.rechazos.csv'
+
+        def progreso(resultado):
+            self.stdout.write('%10d leídas %10d importadas %8d rechazadas %10.0f filas/s' % (
+                resultado.leidas, resultado.importadas, resultado.rechazadas, resultado.filas_por_segundo))
+
+        with open(options['fichero'], newline='', encoding=options['encoding']) as fichero, \
+                open(ruta_rechazos, 'w', newline='', encoding='utf-8') as rechazos:
+            try:
+                resultado = importar(options['recurso'], fichero, rechazos, tamano_bloque=options['bloque'],
+                                     delimitador=options['delimitador'], progreso=progreso)
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS('%d filas importadas de %d.' % (resultado.importadas, resultado.leidas)))
+        if resultado.rechazadas:
+            self.stdout.write(self.style.WARNING('%d filas rechazadas: %s' % (resultado.rechazadas, ruta_rechazos)))
+        else:
+            os.remove(ruta_rechazos)
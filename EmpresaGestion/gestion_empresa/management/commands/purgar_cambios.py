@@ -0,0 +1,21 @@
+# gestion_empresa/management/commands/purgar_cambios.py
+
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from gestion_empresa import cambios
+
+
+class Command(BaseCommand):
+    help = ("Borra del registro de cambios (API de sincronización) las filas más antiguas que "
+            "--dias. Los clientes con un cursor anterior reciben 410 y deben descargar de nuevo "
+            "los listados.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=90)
+
+    def handle(self, *args, **options):
+        borrados = cambios.purgar(timezone.now() - datetime.timedelta(days=options['dias']))
+        self.stdout.write('%d cambios borrados' % borrados)
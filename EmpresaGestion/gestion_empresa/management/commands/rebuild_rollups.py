@@ -0,0 +1,19 @@
+# gestion_empresa/management/commands/rebuild_rollups.py
+
+from django.core.management.base import BaseCommand
+
+from gestion_empresa import rollups
+
+
+class Command(BaseCommand):
+    help = ("Recalcula desde cero los resúmenes mensuales de ventas por cliente y por producto "
+            "a partir de Facturas_Detalle y de las líneas archivadas (Facturas_Detalle_Archivo).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Filas por INSERT al reconstruir.')
+
+    def handle(self, *args, **options):
+        clientes, productos = rollups.reconstruir(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Resúmenes reconstruidos: %d filas cliente/mes, %d filas producto/mes.' % (clientes, productos)))
@@ -0,0 +1,115 @@
+# gestion_empresa/management/commands/trabajos.py
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections
+
+from gestion_empresa import trabajos
+
+
+class Command(BaseCommand):
+    help = ("Worker de los trabajos en segundo plano (/api/trabajos/): toma los pendientes de la tabla "
+            "Trabajos y los ejecuta en un pool de procesos. Se pueden arrancar varios, también en "
+            "otras máquinas: cada trabajo lo ejecuta uno solo.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=None,
+                            help='Trabajos simultáneos. Por defecto settings.TRABAJOS_PROCESOS o uno por CPU.')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos entre consultas a la tabla cuando no hay trabajos.')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Ejecuta los trabajos pendientes y termina.')
+        parser.add_argument('--sin-pool', action='store_true',
+                            help='Ejecuta los trabajos de uno en uno en este proceso.')
+
+    def handle(self, *args, **options):
+        interrumpidos = trabajos.marcar_interrumpidos()
+        if interrumpidos:
+            self.stderr.write('%d trabajos interrumpidos marcados como fallidos.' % interrumpidos)
+        ejecutor = trabajos.identificador_worker()
+        if options['sin_pool']:
+            self.sin_pool(ejecutor, options)
+        else:
+            procesos = options['procesos'] or getattr(settings, 'TRABAJOS_PROCESOS', 0) or os.cpu_count()
+            self.con_pool(ejecutor, procesos, options)
+
+    def informar(self, pk, estado):
+        estilo = self.style.SUCCESS if estado == trabajos.Trabajo.TERMINADO else self.style.ERROR
+        self.stdout.write(estilo('Trabajo %s: %s' % (pk, dict(trabajos.Trabajo.ESTADOS)[estado])))
+
+    def sin_pool(self, ejecutor, options):
+        while True:
+            trabajos.cerrar_conexiones_viejas()
+            tomados = trabajos.tomar(ejecutor, 1)
+            if tomados:
+                self.informar(tomados[0], trabajos.ejecutar(tomados[0]))
+            elif options['una_vez']:
+                return
+            else:
+                time.sleep(options['intervalo'])
+
+    def con_pool(self, ejecutor, procesos, options):
+        while True:
+            # Trabajos tomados cuyo resultado aún no se ha recibido del pool
+            tomados = set()
+            try:
+                with ProcessPoolExecutor(max_workers=procesos) as pool:
+                    return self.atender_pool(pool, tomados, ejecutor, procesos, options)
+            except BrokenProcessPool:
+                self.recuperar_pool(ejecutor, tomados)
+
+    def atender_pool(self, pool, tomados, ejecutor, procesos, options):
+        en_curso = {}
+        while True:
+            # Entre consultas pueden pasar horas: una conexión caída no debe parar el worker
+            trabajos.cerrar_conexiones_viejas()
+            nuevos = trabajos.tomar(ejecutor, procesos - len(en_curso)) if len(en_curso) < procesos else []
+            tomados.update(nuevos)
+            if nuevos:
+                # El pool crea los procesos (fork) al recibir trabajos: no deben heredar la conexión
+                # abierta de este proceso, que la cerrarían o usarían a la vez que él
+                connections.close_all()
+                for pk in nuevos:
+                    en_curso[pool.submit(trabajos.ejecutar, pk)] = pk
+            if not en_curso:
+                if options['una_vez']:
+                    return
+                time.sleep(options['intervalo'])
+                continue
+            hechos, _ = wait(en_curso, timeout=options['intervalo'], return_when=FIRST_COMPLETED)
+            roto = None
+            for futuro in hechos:
+                pk = en_curso.pop(futuro)
+                try:
+                    self.informar(pk, futuro.result())
+                except BrokenProcessPool as error:
+                    # Un proceso del pool murió: se informa del resto de los hechos y se recupera después
+                    roto = error
+                    continue
+                except Exception as error:
+                    # El proceso no pudo guardar el error; si tampoco se puede aquí, queda en ejecución
+                    # hasta el próximo arranque del worker, que lo marca como interrumpido
+                    self.stderr.write('Trabajo %s: %r' % (pk, error))
+                    try:
+                        trabajos.marcar_fallido(pk, repr(error))
+                    except DatabaseError:
+                        pass
+                tomados.discard(pk)
+            if roto is not None:
+                raise roto
+
+    def recuperar_pool(self, ejecutor, tomados):
+        # Un proceso del pool murió (sin memoria, una señal) y el pool ya no acepta trabajos: los demás
+        # procesos también se terminan. Los tomados que ninguno llegó a empezar siguen a nombre de este
+        # worker y vuelven a pendientes; los empezados se dan por fallidos, como en marcar_interrumpidos()
+        trabajos.cerrar_conexiones_viejas()
+        devueltos = trabajos.devolver_pendientes(ejecutor, tomados)
+        fallidos = sum(trabajos.marcar_fallido(pk, 'Interrumpido: el proceso del pool terminó sin completarlo.')
+                       for pk in tomados)
+        self.stderr.write('Pool de procesos roto: %d trabajos devueltos a pendientes y %d fallidos; '
+                          'se crea otro pool.' % (devueltos, fallidos))
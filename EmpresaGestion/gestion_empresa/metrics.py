@@ -0,0 +1,142 @@
+# gestion_empresa/metrics.py
+
+"""
+Métricas de rendimiento por endpoint ('ClaseViewSet.acción'), agregadas
+en histogramas en memoria del proceso. Las alimenta MetricasMiddleware
+(middleware.py) y se consultan en /api/metricas/.
+
+Cada proceso (worker) tiene sus propios histogramas: para una visión
+global hay que sumar los de todos los workers.
+"""
+
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+from rest_framework import serializers
+
+# Límites superiores de los intervalos de cada tipo de histograma
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+BUCKETS_BYTES = (1 << 10, 10 << 10, 100 << 10, 1 << 20, 10 << 20, 100 << 20)
+
+METRICAS = {
+    'wall_ms': BUCKETS_MS,
+    'db_ms': BUCKETS_MS,
+    'serializer_ms': BUCKETS_MS,
+    'queries': BUCKETS_CONSULTAS,
+    'duplicate_queries': BUCKETS_CONSULTAS,
+    'response_bytes': BUCKETS_BYTES,
+}
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1)  # El último intervalo es +inf
+        self.total = 0
+        self.suma = 0
+        self.maximo = 0
+
+    def observar(self, valor):
+        self.cuentas[bisect_left(self.limites, valor)] += 1
+        self.total += 1
+        self.suma += valor
+        self.maximo = max(self.maximo, valor)
+
+    def percentil(self, p):
+        """Estimación: límite superior del intervalo que contiene el percentil."""
+        objetivo = self.total * p / 100
+        acumulado = 0
+        for limite, cuenta in zip(self.limites + (self.maximo,), self.cuentas):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+    def resumen(self):
+        acumulado, buckets = 0, {}
+        for limite, cuenta in zip(self.limites, self.cuentas):
+            acumulado += cuenta
+            buckets[str(limite)] = acumulado
+        buckets['+Inf'] = self.total
+        return {
+            'count': self.total,
+            'sum': round(self.suma, 3),
+            'max': round(self.maximo, 3),
+            'mean': round(self.suma / self.total, 3) if self.total else None,
+            'p50': self.percentil(50) if self.total else None,
+            'p95': self.percentil(95) if self.total else None,
+            'p99': self.percentil(99) if self.total else None,
+            'buckets': buckets,
+        }
+
+
+_lock = threading.Lock()
+_endpoints = {}
+
+
+def registrar(endpoint, valores):
+    """Añade una observación de cada métrica de 'valores' (las ausentes se omiten)."""
+    with _lock:
+        histogramas = _endpoints.get(endpoint)
+        if histogramas is None:
+            histogramas = _endpoints[endpoint] = {nombre: Histograma(limites)
+                                                  for nombre, limites in METRICAS.items()}
+        for nombre, valor in valores.items():
+            if valor is not None:
+                histogramas[nombre].observar(valor)
+
+
+def resumen():
+    with _lock:
+        return {endpoint: {nombre: histograma.resumen() for nombre, histograma in histogramas.items()}
+                for endpoint, histogramas in sorted(_endpoints.items())}
+
+
+def reiniciar():
+    with _lock:
+        _endpoints.clear()
+
+
+# --- Tiempo de serialización ---------------------------------------------------
+
+# Medición de la petición en curso (la crea el middleware)
+medicion_actual = contextvars.ContextVar('medicion_actual', default=None)
+
+
+def medir_serializacion(serializar):
+    """Llama a serializar() y suma su duración al tiempo de serialización de la petición en curso."""
+    medicion = medicion_actual.get()
+    if medicion is None or medicion.serializando:
+        return serializar()
+    # Solo se mide el serializador más externo (los anidados ya están incluidos)
+    medicion.serializando = True
+    inicio = time.perf_counter()
+    try:
+        return serializar()
+    finally:
+        medicion.serializer_ms += (time.perf_counter() - inicio) * 1000
+        medicion.serializando = False
+
+
+class ListSerializerMedido(serializers.ListSerializer):
+    @property
+    def data(self):
+        return medir_serializacion(lambda: serializers.ListSerializer.data.fget(self))
+
+
+# Mixin para serializadores: tiempo de '.data' en la métrica serializer_ms (MetricasMiddleware)
+class SerializacionMedidaMixin:
+    @property
+    def data(self):
+        return medir_serializacion(lambda: super(SerializacionMedidaMixin, self).data)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        lista = super().many_init(*args, **kwargs)
+        # many=True sin list_serializer_class propio en Meta: también se mide la lista
+        if type(lista) is serializers.ListSerializer:
+            lista.__class__ = ListSerializerMedido
+        return lista
@@ -0,0 +1,230 @@
+# gestion_empresa/middleware.py
+
+import logging
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, routers
+
+logger = logging.getLogger('gestion_empresa.lento')
+
+# Consultas que se guardan por petición para el registro de peticiones lentas
+MAX_CONSULTAS_REGISTRO = 200
+# Consultas SELECT (las más lentas) de las que se obtiene el EXPLAIN
+MAX_EXPLAIN = 5
+
+
+def nombre_endpoint(view_func, request):
+    """'ClaseViewSet.acción' para los ViewSets de DRF; 'módulo.vista' para el resto."""
+    cls = getattr(view_func, 'cls', None)
+    acciones = getattr(view_func, 'actions', None)
+    if cls is not None and acciones:
+        return '%s.%s' % (cls.__name__, acciones.get(request.method.lower(), request.method.lower()))
+    funcion = getattr(view_func, 'view_class', None) or view_func
+    return '%s.%s' % (funcion.__module__, funcion.__name__)
+
+
+class Medicion:
+    """Datos de una petición: se rellenan desde medir_consulta en cada conexión."""
+
+    def __init__(self, guardar_sql):
+        self.consultas = 0
+        self.db_ms = 0.0
+        self.serializer_ms = 0.0
+        self.serializando = False
+        self.plantillas = Counter()
+        self.guardar_sql = guardar_sql
+        self.sql = []  # (alias, sql, params, ms) si hay registro de peticiones lentas
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            self.consultas += 1
+            self.db_ms += ms
+            self.plantillas[sql] += 1
+            if self.guardar_sql and len(self.sql) < MAX_CONSULTAS_REGISTRO:
+                self.sql.append((context['connection'].alias, sql, params, ms))
+
+    @property
+    def duplicadas(self):
+        # Mismo SQL (con independencia de los parámetros) que otra consulta anterior: síntoma de N+1
+        return sum(veces - 1 for veces in self.plantillas.values())
+
+
+def medir_consulta(execute, sql, params, many, context):
+    """execute_wrapper permanente de cada conexión: suma la consulta a la Medicion de la petición en curso."""
+    medicion = metrics.medicion_actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    return medicion(execute, sql, params, many, context)
+
+
+# Middleware de métricas por endpoint (ver metrics.py)
+class MetricasMiddleware:
+    """
+    Para cada petición resuelta a una vista registra: tiempo total, tiempo en
+    BD, número de consultas y de consultas duplicadas, tiempo en serializadores
+    (SerializacionMedidaMixin) y tamaño de la respuesta sin comprimir: va
+    después de GZipMiddleware en settings.MIDDLEWARE. Si METRICAS_UMBRAL_LENTO_MS
+    es mayor que 0, las peticiones que lo superan se escriben en el logger
+    'gestion_empresa.lento' con su SQL y el EXPLAIN de las SELECT más lentas.
+
+    Las consultas se cuentan con medir_consulta, instalado en cada conexión
+    (signals.py), sobre la Medicion de la variable de contexto de la petición:
+    así se cuentan también las del ORM asíncrono y las de las vistas síncronas
+    con ASGI, que se ejecutan en otro hilo y con otra conexión.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Con ASGI la cadena sigue siendo asíncrona: sin adaptar las vistas a un hilo (async_views.py)
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        if not getattr(settings, 'METRICAS_ACTIVAS', True):
+            return self.get_response(request)
+
+        medicion, token = self.empezar()
+        inicio = time.perf_counter()
+        try:
+            respuesta = self.get_response(request)
+        finally:
+            metrics.medicion_actual.reset(token)
+        wall_ms = (time.perf_counter() - inicio) * 1000
+        if self.registrar(request, respuesta, medicion, wall_ms):
+            self.registrar_lenta(request, request._metricas_endpoint, wall_ms, medicion)
+        return respuesta
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'METRICAS_ACTIVAS', True):
+            return await self.get_response(request)
+
+        # La variable de contexto se fija y se restaura dentro de la corrutina de la petición
+        medicion, token = self.empezar()
+        inicio = time.perf_counter()
+        try:
+            respuesta = await self.get_response(request)
+        finally:
+            metrics.medicion_actual.reset(token)
+        wall_ms = (time.perf_counter() - inicio) * 1000
+        if self.registrar(request, respuesta, medicion, wall_ms):
+            # El EXPLAIN consulta la BD: fuera del bucle de eventos
+            await sync_to_async(self.registrar_lenta)(request, request._metricas_endpoint, wall_ms, medicion)
+        return respuesta
+
+    def empezar(self):
+        medicion = Medicion(guardar_sql=bool(getattr(settings, 'METRICAS_UMBRAL_LENTO_MS', 0)))
+        return medicion, metrics.medicion_actual.set(medicion)
+
+    def registrar(self, request, respuesta, medicion, wall_ms):
+        """Añade la petición a los histogramas; devuelve True si hay que registrarla como lenta."""
+        endpoint = getattr(request, '_metricas_endpoint', None)
+        if endpoint is None:
+            return False  # URL sin vista (404 de la resolución)
+        metrics.registrar(endpoint, {
+            'wall_ms': wall_ms,
+            'db_ms': medicion.db_ms,
+            'serializer_ms': medicion.serializer_ms,
+            'queries': medicion.consultas,
+            'duplicate_queries': medicion.duplicadas,
+            # En las respuestas en streaming el tamaño no se conoce sin consumirlas
+            'response_bytes': None if respuesta.streaming else len(respuesta.content),
+        })
+        umbral = getattr(settings, 'METRICAS_UMBRAL_LENTO_MS', 0)
+        return bool(umbral) and wall_ms >= umbral
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metricas_endpoint = nombre_endpoint(view_func, request)
+
+    def registrar_lenta(self, request, endpoint, wall_ms, medicion):
+        lineas = ['%s %s (%s): %.1f ms, BD %.1f ms en %d consultas (%d duplicadas), serialización %.1f ms' % (
+            request.method, request.get_full_path(), endpoint, wall_ms, medicion.db_ms,
+            medicion.consultas, medicion.duplicadas, medicion.serializer_ms)]
+        for alias, sql, params, ms in medicion.sql:
+            lineas.append('  [%s %.2f ms] %s %r' % (alias, ms, sql, params))
+        selects = [c for c in medicion.sql if c[1].lstrip().upper().startswith('SELECT')]
+        for alias, sql, params, ms in sorted(selects, key=lambda c: -c[3])[:MAX_EXPLAIN]:
+            lineas.append('  EXPLAIN (%.2f ms) %s' % (ms, sql))
+            lineas.extend('    %s' % fila for fila in self.explain(alias, sql, params))
+        logger.warning('\n'.join(lineas))
+
+    def explain(self, alias, sql, params):
+        conexion = connections[alias]
+        try:
+            with conexion.cursor() as cursor:
+                cursor.execute(conexion.ops.explain_query_prefix() + ' ' + sql, params)
+                return [' '.join(str(columna) for columna in fila) for fila in cursor.fetchall()]
+        except Exception as exc:  # El EXPLAIN es informativo: nunca debe romper la respuesta
+            return ['(EXPLAIN no disponible: %s)' % exc]
+
+
+# Middleware de lecturas en réplica con lectura de lo escrito (ver routers.py)
+class ReplicaMiddleware:
+    METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+            # El handler asíncrono ejecutaría un process_view síncrono en otro hilo, sobre una copia
+            # del contexto: la marca de lectura en réplica no llegaría a la vista
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        token = routers.lectura_en_replica.set(False)
+        try:
+            respuesta = self.get_response(request)
+        finally:
+            routers.lectura_en_replica.reset(token)
+        return self.recordar_escritura(request, respuesta)
+
+    async def __acall__(self, request):
+        # La variable de contexto se fija y se restaura dentro de la corrutina de la petición
+        token = routers.lectura_en_replica.set(False)
+        try:
+            respuesta = await self.get_response(request)
+        finally:
+            routers.lectura_en_replica.reset(token)
+        return self.recordar_escritura(request, respuesta)
+
+    def recordar_escritura(self, request, respuesta):
+        cookie = getattr(settings, 'REPLICA_STICKY_COOKIE', 'db_primario')
+        if request.method not in self.METODOS_LECTURA and getattr(request, '_vista_gestion_empresa', False):
+            # Tras escribir, el cliente lee del primario hasta que la réplica se haya puesto al día
+            respuesta.set_cookie(cookie, '1', max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 5),
+                                 httponly=True, samesite='Lax')
+        return respuesta
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.marcar_lectura(request, view_func)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        # En el contexto de la petición, sin consultas: no hace falta salir del bucle de eventos
+        self.marcar_lectura(request, view_func)
+
+    def marcar_lectura(self, request, view_func):
+        cls = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        request._vista_gestion_empresa = cls is not None and cls.__module__.startswith('gestion_empresa.')
+        cookie = getattr(settings, 'REPLICA_STICKY_COOKIE', 'db_primario')
+        if (request._vista_gestion_empresa and request.method in self.METODOS_LECTURA
+                and cookie not in request.COOKIES):
+            routers.lectura_en_replica.set(True)
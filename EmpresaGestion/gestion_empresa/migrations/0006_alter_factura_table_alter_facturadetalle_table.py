@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:46
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_empresa", "0005_remove_pedido_id_pedido_id_pedido"),
+    ]
+
+    operations = [
+        migrations.AlterModelTable(
+            name="factura",
+            table="Facturas",
+        ),
+        migrations.AlterModelTable(
+            name="facturadetalle",
+            table="Facturas_Detalle",
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_empresa", "0006_alter_factura_table_alter_facturadetalle_table"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="factura",
+            index=models.Index(fields=["fecha", "num"], name="facturas_fecha_pk_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="facturadetalle",
+            index=models.Index(
+                fields=["factura", "id"], name="facturas_det_factura_pk_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pedido",
+            index=models.Index(
+                fields=["fecha", "id_pedido"], name="pedidos_fecha_pk_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_empresa", "0007_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VentaClienteMes",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("mes", models.DateField(verbose_name="Mes")),
+                (
+                    "cantidad",
+                    models.BigIntegerField(default=0, verbose_name="Unidades Vendidas"),
+                ),
+                (
+                    "importe",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Importe Vendido",
+                    ),
+                ),
+                (
+                    "cliente",
+                    models.ForeignKey(
+                        db_column="ID_Cliente",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="gestion_empresa.cliente",
+                        verbose_name="Cliente",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Venta Mensual por Cliente",
+                "verbose_name_plural": "Ventas Mensuales por Cliente",
+                "db_table": "Ventas_Cliente_Mes",
+                "indexes": [
+                    models.Index(fields=["mes"], name="ventas_cliente_mes_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("cliente", "mes"), name="ventas_cliente_mes_uniq"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="VentaProductoMes",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("mes", models.DateField(verbose_name="Mes")),
+                (
+                    "cantidad",
+                    models.BigIntegerField(default=0, verbose_name="Unidades Vendidas"),
+                ),
+                (
+                    "importe",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Importe Vendido",
+                    ),
+                ),
+                (
+                    "producto",
+                    models.ForeignKey(
+                        db_column="Codigo_Producto",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="gestion_empresa.producto",
+                        verbose_name="Producto",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Venta Mensual por Producto",
+                "verbose_name_plural": "Ventas Mensuales por Producto",
+                "db_table": "Ventas_Producto_Mes",
+                "indexes": [
+                    models.Index(fields=["mes"], name="ventas_producto_mes_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("producto", "mes"), name="ventas_producto_mes_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_empresa", "0008_ventas_mensuales"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cliente",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, db_index=True, verbose_name="Última Modificación"
+            ),
+        ),
+        migrations.AddField(
+            model_name="factura",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, db_index=True, verbose_name="Última Modificación"
+            ),
+        ),
+        migrations.AddField(
+            model_name="facturadetalle",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, db_index=True, verbose_name="Última Modificación"
+            ),
+        ),
+        migrations.AddField(
+            model_name="pedido",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, db_index=True, verbose_name="Última Modificación"
+            ),
+        ),
+        migrations.AddField(
+            model_name="producto",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, db_index=True, verbose_name="Última Modificación"
+            ),
+        ),
+        migrations.AddField(
+            model_name="proveedor",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, db_index=True, verbose_name="Última Modificación"
+            ),
+        ),
+    ]
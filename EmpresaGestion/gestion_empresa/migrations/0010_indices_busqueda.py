@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:58
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_empresa", "0009_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="cliente",
+            index=models.Index(fields=["NombreCliente"], name="clientes_nombre_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="cliente",
+            index=models.Index(
+                django.db.models.functions.text.Lower("NombreCliente"),
+                name="clientes_nombre_lower_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="producto",
+            index=models.Index(fields=["descripcion"], name="productos_desc_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="producto",
+            index=models.Index(
+                django.db.models.functions.text.Lower("descripcion"),
+                name="productos_desc_lower_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="producto",
+            index=models.Index(fields=["precio"], name="productos_precio_idx"),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:17
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_empresa", "0010_indices_busqueda"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PedidoLinea",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "cantidad",
+                    models.PositiveIntegerField(
+                        default=1,
+                        validators=[django.core.validators.MinValueValidator(1)],
+                        verbose_name="Cantidad",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, db_index=True, verbose_name="Última Modificación"
+                    ),
+                ),
+                (
+                    "pedido",
+                    models.ForeignKey(
+                        db_column="ID_Pedido",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lineas",
+                        to="gestion_empresa.pedido",
+                        verbose_name="Pedido",
+                    ),
+                ),
+                (
+                    "producto",
+                    models.ForeignKey(
+                        db_column="Codigo_Producto",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="gestion_empresa.producto",
+                        verbose_name="Producto",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Línea de Pedido",
+                "verbose_name_plural": "Líneas de Pedido",
+                "db_table": "Pedidos_Linea",
+                "ordering": ["id"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("pedido", "producto"), name="pedidos_linea_uniq"
+                    )
+                ],
+            },
+        ),
+        # Opcional mientras se copian los datos a las líneas (0012) y hasta que se elimina (0013)
+        migrations.AlterField(
+            model_name="pedido",
+            name="producto",
+            field=models.ForeignKey(
+                db_column="Codigo",
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="gestion_empresa.producto",
+                verbose_name="Producto",
+            ),
+        ),
+    ]
@@ -0,0 +1,80 @@
+"""
+Paso de un producto por fila de Pedidos a cabecera + líneas (Pedidos_Linea).
+
+Cada fila de Pedidos pasa a ser la cabecera de un pedido con una sola
+línea: su producto, cantidad 1. Se conservan todas las filas y sus
+id_pedido (otras tablas y los clientes de la API pueden referirse a
+ellos). Se procesa por bloques de id_pedido con bulk_create, sin cargar
+la tabla en memoria.
+
+La vuelta atrás devuelve a cada pedido el producto de su primera línea.
+Las demás líneas y las cantidades (pedidos dados de alta después de la
+migración) no caben en el esquema anterior y se pierden; los pedidos sin
+líneas se quedan sin producto.
+"""
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+LOTE = 5000
+
+
+def _bloques_de_pedidos(Pedido, alias):
+    # Rangos [primero, ultimo] de hasta LOTE id_pedido, por clave
+    ultimo = 0
+    while True:
+        bloque = list(
+            Pedido.objects.using(alias)
+            .filter(id_pedido__gt=ultimo)
+            .order_by("id_pedido")
+            .values_list("id_pedido", flat=True)[:LOTE]
+        )
+        if not bloque:
+            return
+        ultimo = bloque[-1]
+        yield bloque[0], ultimo
+
+
+def pedidos_a_lineas(apps, schema_editor):
+    Pedido = apps.get_model("gestion_empresa", "Pedido")
+    PedidoLinea = apps.get_model("gestion_empresa", "PedidoLinea")
+    alias = schema_editor.connection.alias
+
+    for primero, ultimo in _bloques_de_pedidos(Pedido, alias):
+        filas = (
+            Pedido.objects.using(alias)
+            .filter(id_pedido__range=(primero, ultimo), producto__isnull=False)
+            .values_list("id_pedido", "producto_id")
+        )
+        PedidoLinea.objects.using(alias).bulk_create(
+            PedidoLinea(pedido_id=id_pedido, producto_id=producto_id, cantidad=1)
+            for id_pedido, producto_id in filas
+        )
+
+
+def lineas_a_pedidos(apps, schema_editor):
+    Pedido = apps.get_model("gestion_empresa", "Pedido")
+    PedidoLinea = apps.get_model("gestion_empresa", "PedidoLinea")
+    alias = schema_editor.connection.alias
+
+    primera_linea = (
+        PedidoLinea.objects.using(alias)
+        .filter(pedido_id=OuterRef("pk"))
+        .order_by("id")
+        .values("producto_id")[:1]
+    )
+    for primero, ultimo in _bloques_de_pedidos(Pedido, alias):
+        Pedido.objects.using(alias).filter(id_pedido__range=(primero, ultimo)).update(
+            producto_id=Subquery(primera_linea)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_empresa", "0011_pedido_lineas"),
+    ]
+
+    operations = [
+        migrations.RunPython(pedidos_a_lineas, lineas_a_pedidos),
+    ]
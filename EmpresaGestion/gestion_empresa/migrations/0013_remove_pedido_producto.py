@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_empresa", "0012_pedidos_a_lineas"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="pedido",
+            name="producto",
+        ),
+    ]
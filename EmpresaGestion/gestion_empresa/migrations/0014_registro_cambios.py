@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_empresa", "0013_remove_pedido_producto"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Cambio",
+            fields=[
+                (
+                    "seq",
+                    models.BigAutoField(
+                        primary_key=True, serialize=False, verbose_name="Secuencia"
+                    ),
+                ),
+                ("recurso", models.CharField(max_length=30, verbose_name="Recurso")),
+                ("clave", models.CharField(max_length=40, verbose_name="Clave")),
+                (
+                    "operacion",
+                    models.CharField(
+                        choices=[("A", "Alta"), ("M", "Modificación"), ("B", "Baja")],
+                        max_length=1,
+                        verbose_name="Operación",
+                    ),
+                ),
+                (
+                    "fecha",
+                    models.DateTimeField(
+                        auto_now_add=True, db_index=True, verbose_name="Fecha"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Cambio",
+                "verbose_name_plural": "Cambios",
+                "db_table": "Cambios",
+                "indexes": [
+                    models.Index(
+                        fields=["recurso", "seq"], name="cambios_recurso_seq_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,191 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_empresa", "0014_registro_cambios"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FacturaArchivo",
+            fields=[
+                (
+                    "num",
+                    models.IntegerField(
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Número de Factura",
+                    ),
+                ),
+                ("fecha", models.DateField(verbose_name="Fecha de Factura")),
+                (
+                    "importe",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=9, verbose_name="Importe Total"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(verbose_name="Última Modificación"),
+                ),
+                (
+                    "archivado",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Fecha de Archivo"
+                    ),
+                ),
+                (
+                    "cliente",
+                    models.ForeignKey(
+                        db_column="ID_Cliente",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="gestion_empresa.cliente",
+                        verbose_name="Cliente",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Factura Archivada",
+                "verbose_name_plural": "Facturas Archivadas",
+                "db_table": "Facturas_Archivo",
+            },
+        ),
+        migrations.CreateModel(
+            name="FacturaDetalleArchivo",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("cantidad", models.IntegerField(verbose_name="Cantidad")),
+                (
+                    "precio_unitario",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=6, verbose_name="Precio Unitario"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(verbose_name="Última Modificación"),
+                ),
+                (
+                    "factura",
+                    models.ForeignKey(
+                        db_column="Num_Factura",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="detalles",
+                        to="gestion_empresa.facturaarchivo",
+                        verbose_name="Número de Factura",
+                    ),
+                ),
+                (
+                    "producto",
+                    models.ForeignKey(
+                        db_column="Codigo_Producto",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="gestion_empresa.producto",
+                        verbose_name="Productos",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Detalle de Factura Archivado",
+                "verbose_name_plural": "Detalles de Factura Archivados",
+                "db_table": "Facturas_Detalle_Archivo",
+            },
+        ),
+        migrations.CreateModel(
+            name="PedidoArchivo",
+            fields=[
+                (
+                    "id_pedido",
+                    models.IntegerField(
+                        primary_key=True, serialize=False, verbose_name="ID del Pedido"
+                    ),
+                ),
+                ("fecha", models.DateField(verbose_name="Fecha del Pedido")),
+                (
+                    "updated_at",
+                    models.DateTimeField(verbose_name="Última Modificación"),
+                ),
+                (
+                    "archivado",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Fecha de Archivo"
+                    ),
+                ),
+                (
+                    "cliente",
+                    models.ForeignKey(
+                        db_column="ID_Cliente",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="gestion_empresa.cliente",
+                        verbose_name="Cliente",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Pedido Archivado",
+                "verbose_name_plural": "Pedidos Archivados",
+                "db_table": "Pedidos_Archivo",
+            },
+        ),
+        migrations.CreateModel(
+            name="PedidoLineaArchivo",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("cantidad", models.PositiveIntegerField(verbose_name="Cantidad")),
+                (
+                    "updated_at",
+                    models.DateTimeField(verbose_name="Última Modificación"),
+                ),
+                (
+                    "pedido",
+                    models.ForeignKey(
+                        db_column="ID_Pedido",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lineas",
+                        to="gestion_empresa.pedidoarchivo",
+                        verbose_name="Pedido",
+                    ),
+                ),
+                (
+                    "producto",
+                    models.ForeignKey(
+                        db_column="Codigo_Producto",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="gestion_empresa.producto",
+                        verbose_name="Producto",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Línea de Pedido Archivada",
+                "verbose_name_plural": "Líneas de Pedido Archivadas",
+                "db_table": "Pedidos_Linea_Archivo",
+                "ordering": ["id"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="facturaarchivo",
+            index=models.Index(
+                fields=["fecha", "num"], name="facturas_arch_fecha_pk_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pedidoarchivo",
+            index=models.Index(
+                fields=["fecha", "id_pedido"], name="pedidos_arch_fecha_pk_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:44
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def crear_serie_inicial(apps, schema_editor):
+    # Serie por defecto (settings.FACTURAS_SERIE), a continuación de las facturas existentes,
+    # también las archivadas
+    alias = schema_editor.connection.alias
+    ultimo = 0
+    for modelo in ("Factura", "FacturaArchivo"):
+        filas = apps.get_model("gestion_empresa", modelo).objects.using(alias)
+        ultimo = max(ultimo, filas.aggregate(ultimo=Max("num"))["ultimo"] or 0)
+    SerieFactura = apps.get_model("gestion_empresa", "SerieFactura")
+    SerieFactura.objects.using(alias).create(codigo="A", siguiente=ultimo + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_empresa", "0015_archivo_historico"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SerieFactura",
+            fields=[
+                (
+                    "codigo",
+                    models.CharField(
+                        max_length=10,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Serie",
+                    ),
+                ),
+                (
+                    "siguiente",
+                    models.IntegerField(default=1, verbose_name="Siguiente Número"),
+                ),
+                (
+                    "hasta",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="Último Número"
+                    ),
+                ),
+                (
+                    "sin_huecos",
+                    models.BooleanField(default=False, verbose_name="Sin Huecos"),
+                ),
+                (
+                    "tamano_bloque",
+                    models.PositiveIntegerField(
+                        default=100,
+                        validators=[django.core.validators.MinValueValidator(1)],
+                        verbose_name="Números Reservados por Proceso",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Serie de Facturas",
+                "verbose_name_plural": "Series de Facturas",
+                "db_table": "Series_Factura",
+            },
+        ),
+        migrations.RunPython(crear_serie_inicial, migrations.RunPython.noop),
+    ]
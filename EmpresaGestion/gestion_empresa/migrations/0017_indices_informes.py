@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_empresa", "0016_series_factura"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="factura",
+            index=models.Index(
+                fields=["fecha", "importe"], name="facturas_fecha_importe_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="facturaarchivo",
+            index=models.Index(
+                fields=["fecha", "importe"], name="facturas_arch_fecha_imp_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ventaclientemes",
+            index=models.Index(
+                fields=["mes", "cliente", "importe", "cantidad"],
+                name="ventas_cli_mes_informe_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ventaproductomes",
+            index=models.Index(
+                fields=["mes", "producto", "importe", "cantidad"],
+                name="ventas_prod_mes_informe_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_empresa", "0017_indices_informes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Trabajo",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tipo", models.CharField(max_length=30, verbose_name="Tipo")),
+                (
+                    "parametros",
+                    models.JSONField(
+                        blank=True, default=dict, verbose_name="Parámetros"
+                    ),
+                ),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("P", "Pendiente"),
+                            ("E", "En Ejecución"),
+                            ("T", "Terminado"),
+                            ("F", "Fallido"),
+                        ],
+                        default="P",
+                        max_length=1,
+                        verbose_name="Estado",
+                    ),
+                ),
+                (
+                    "creado",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Creado"),
+                ),
+                (
+                    "iniciado",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Iniciado"
+                    ),
+                ),
+                (
+                    "terminado",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Terminado"
+                    ),
+                ),
+                (
+                    "ejecutor",
+                    models.CharField(blank=True, max_length=100, verbose_name="Worker"),
+                ),
+                (
+                    "resultado",
+                    models.JSONField(blank=True, null=True, verbose_name="Resultado"),
+                ),
+                (
+                    "fichero",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="Fichero"
+                    ),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Error")),
+            ],
+            options={
+                "verbose_name": "Trabajo",
+                "verbose_name_plural": "Trabajos",
+                "db_table": "Trabajos",
+                "indexes": [
+                    models.Index(fields=["estado", "id"], name="trabajos_estado_id_idx")
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,274 @@
+# gestion_empresa/mixins.py
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from . import exports
+from .serializers import seleccion_de_campos
+
+
+def _plan_desde_source(modelo, source):
+    """
+    Recorre una ruta 'a.b.c' sobre los metadatos del modelo y devuelve
+    (ruta_select, ruta_prefetch): la parte que se puede resolver con un JOIN
+    (claves foráneas / uno a uno) y, si aparece una relación múltiple,
+    la ruta que debe cargarse con prefetch_related.
+    """
+    select, recorrido = [], []
+    for parte in source.split('.'):
+        try:
+            campo = modelo._meta.get_field(parte)
+        except FieldDoesNotExist:
+            break  # Atributo, propiedad o método: fin de la ruta relacional
+        if not campo.is_relation or campo.related_model is None:
+            break
+        recorrido.append(parte)
+        if campo.many_to_many or campo.one_to_many:
+            return '__'.join(select), '__'.join(recorrido)
+        select.append(parte)
+        modelo = campo.related_model
+    return '__'.join(select), None
+
+
+def plan_de_relaciones(serializer_class):
+    """
+    Calcula el plan (select_related, prefetch_related) que necesita un
+    serializador a partir de los 'source' con puntos de sus campos y de
+    los serializadores anidados que declare.
+    """
+    serializer = serializer_class()
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if not isinstance(serializer, serializers.ModelSerializer):
+        return set(), set()
+    return _plan_de_serializer(serializer, serializer.Meta.model, prefijo='')
+
+
+def _plan_de_serializer(serializer, modelo, prefijo):
+    select, prefetch = set(), set()
+    for campo in serializer.fields.values():
+        if campo.source == '*':
+            continue
+        hijo = campo.child if isinstance(campo, serializers.ListSerializer) else campo
+        anidado = isinstance(hijo, serializers.ModelSerializer)
+        # Un FK simple sin punto solo expone la clave, que ya está en la fila
+        if '.' not in campo.source and not anidado \
+                and not isinstance(campo, serializers.ManyRelatedField):
+            continue
+        ruta_select, ruta_prefetch = _plan_desde_source(modelo, campo.source)
+
+        if ruta_prefetch:
+            prefetch.add(prefijo + ruta_prefetch)
+        elif ruta_select:
+            select.add(prefijo + ruta_select)
+
+        # Serializadores anidados: su plan cuelga de la relación que los alimenta
+        if anidado and (ruta_select or ruta_prefetch):
+            ruta = ruta_prefetch or ruta_select
+            sub_select, sub_prefetch = _plan_de_serializer(
+                hijo, hijo.Meta.model, prefijo=prefijo + ruta + '__'
+            )
+            if ruta_prefetch:
+                prefetch.update(sub_select | sub_prefetch)
+            else:
+                select.update(sub_select)
+                prefetch.update(sub_prefetch)
+    return select, prefetch
+
+
+def columnas_de_serializer(serializer, modelo, prefijo=''):
+    """
+    Rutas para only() con las columnas que lee el serializador (incluidas las
+    de las relaciones con JOIN y las de los serializadores anidados sobre una
+    clave foránea), o None si algún campo no se puede relacionar con una
+    columna (métodos, propiedades, source='*').
+    """
+    columnas = set()
+    for campo in serializer.fields.values():
+        if campo.write_only:
+            continue
+        if campo.source == '*':
+            return None
+        actual, ruta, destino = modelo, [], None
+        for parte in campo.source.split('.'):
+            try:
+                destino = actual._meta.get_field(parte)
+            except FieldDoesNotExist:
+                return None
+            if destino.one_to_many or destino.many_to_many:
+                break  # Se carga con prefetch_related: basta la clave primaria de la fila
+            ruta.append(parte)
+            columnas.add(prefijo + '__'.join(ruta))
+            if not destino.is_relation:
+                break
+            actual = destino.related_model
+        if isinstance(campo, serializers.ModelSerializer) and destino is not None and destino.many_to_one:
+            anidadas = columnas_de_serializer(campo, actual, prefijo + '__'.join(ruta) + '__')
+            if anidadas is None:
+                return None
+            columnas.update(anidadas)
+    return columnas
+
+
+# Mixin para ViewSets: aplica select_related/prefetch_related según el serializador
+class PrefetchPlanMixin:
+    """
+    Evita el problema N+1 en los listados. El plan se deduce de los campos
+    'source' con puntos del serializador (p. ej. 'producto.descripcion')
+    y se puede sustituir por ViewSet declarando 'select_related_fields'
+    y/o 'prefetch_related_fields'.
+
+    Con '?fields=' / '?expand=' (ver CamposDinamicosMixin) el plan se deduce
+    de los campos pedidos y la consulta se limita con only() a sus columnas:
+    no se leen columnas ni se hacen JOIN que la respuesta no muestra.
+    """
+    select_related_fields = None
+    prefetch_related_fields = None
+
+    # Caché del plan deducido, por clase de serializador y selección de campos
+    _planes_deducidos = {}
+
+    def _plan_deducido(self):
+        """(select, prefetch, columnas de only() o None, raíces de los campos pedidos o None)."""
+        serializer_class = self.get_serializer_class()
+        seleccion = seleccion_de_campos(getattr(self, 'request', None))
+        clave = (serializer_class, seleccion)
+        if clave not in self._planes_deducidos:
+            if seleccion is None:
+                plan = plan_de_relaciones(serializer_class) + (None, None)
+            else:
+                # Serializador ya reducido a los campos pedidos; ValidationError si no son válidos
+                serializer = self.get_serializer()
+                modelo = serializer.Meta.model
+                plan = _plan_de_serializer(serializer, modelo, prefijo='') + (
+                    columnas_de_serializer(serializer, modelo),
+                    {campo.source.split('.')[0] for campo in serializer.fields.values()})
+            self._planes_deducidos[clave] = plan
+        return self._planes_deducidos[clave]
+
+    def get_relation_plan(self):
+        select, prefetch, _, raices = self._plan_deducido()
+
+        # Del plan explícito se descartan las relaciones de campos que no se han pedido
+        def pedida(ruta):
+            ruta = getattr(ruta, 'prefetch_through', ruta)
+            return raices is None or '*' in raices or ruta.split('__')[0] in raices
+
+        if self.select_related_fields is not None:
+            select = [ruta for ruta in self.select_related_fields if pedida(ruta)]
+        if self.prefetch_related_fields is not None:
+            prefetch = [ruta for ruta in self.prefetch_related_fields if pedida(ruta)]
+        return sorted(select), sorted(prefetch, key=lambda ruta: getattr(ruta, 'prefetch_through', ruta))
+
+    def get_only_fields(self):
+        """Columnas para only() cuando se piden campos concretos, o None para leer todas."""
+        columnas = self._plan_deducido()[2]
+        if columnas is None:
+            return None
+        columnas = set(columnas)
+        # Cada relación del JOIN necesita su clave foránea, y la paginación por clave sus campos
+        for ruta in self.get_relation_plan()[0]:
+            partes = ruta.split('__')
+            columnas.update('__'.join(partes[:i]) for i in range(1, len(partes) + 1))
+        columnas.update(nombre for nombre in getattr(self, 'keyset_ordering', None) or () if nombre != 'pk')
+        return sorted(columnas)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        select, prefetch = self.get_relation_plan()
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        columnas = self.get_only_fields()
+        if columnas:
+            queryset = queryset.only(*columnas)
+        return queryset
+
+
+# Mixin para ViewSets: acción 'export' que descarga la tabla completa en streaming
+class ExportMixin:
+    """
+    GET <recurso>/export/?formato=ndjson|csv devuelve todas las filas (con
+    los filtros del ViewSet) sin paginar, generadas por bloques para que la
+    memoria del worker no crezca con el tamaño de la tabla.
+    """
+    export_chunk_size = 2000
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        formato = request.query_params.get('formato', 'ndjson')
+        if formato not in exports.FORMATOS:
+            raise ValidationError({'formato': 'Formatos admitidos: %s.' % ', '.join(exports.FORMATOS)})
+        generador, content_type = exports.FORMATOS[formato]
+
+        # Con '?fields=' solo se exportan los campos pedidos
+        columnas = exports.columnas_exportables(self.get_serializer())
+        nombres = [nombre for nombre, _, _ in columnas]
+        rutas = [ruta for _, ruta, _ in columnas]
+        # Se fija ya la base de datos (p. ej. una réplica): el contenido se genera después,
+        # cuando la petición ha terminado de pasar por los middleware
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.using(queryset.db)
+        filas = exports.convertir_filas(
+            columnas, exports.iterar_filas(queryset, rutas, chunk_size=self.export_chunk_size))
+
+        respuesta = StreamingHttpResponse(generador(nombres, filas), content_type=content_type)
+        nombre_fichero = '%s.%s' % (queryset.model._meta.db_table.lower(), formato)
+        respuesta['Content-Disposition'] = 'attachment; filename="%s"' % nombre_fichero
+        return respuesta
+
+    def perform_content_negotiation(self, request, force=False):
+        # La exportación no pasa por los renderers: se acepta cualquier cabecera Accept
+        return super().perform_content_negotiation(request, force=force or self.action == 'export')
+
+
+# Mixin para ViewSets: acción 'batch' que devuelve varios objetos por clave primaria
+class BatchRetrieveMixin:
+    """
+    GET <recurso>/batch/?ids=1,2,3 o POST <recurso>/batch/ con {"ids": [1, 2, 3]}
+    (para listas que no caben en la URL) responde, en una sola petición,
+    {"resultados": [...], "no_encontrados": [...]}: los objetos en el orden
+    pedido, sin repetir claves, y las claves que no existen.
+
+    Los objetos se leen con una consulta IN sobre get_queryset(), con el plan
+    de relaciones del ViewSet y los filtros de la petición, como retrieve.
+    Como máximo 'batch_max_size' claves (por defecto settings.API_BATCH_MAXIMO).
+    """
+    batch_max_size = None
+
+    @action(detail=False, methods=['get', 'post'])
+    def batch(self, request):
+        claves = self.get_batch_keys(request)
+        queryset = self.filter_queryset(self.get_queryset()).filter(pk__in=claves).order_by()
+        por_clave = {objeto.pk: objeto for objeto in queryset}
+        objetos = [por_clave[clave] for clave in claves if clave in por_clave]
+        return Response({
+            'resultados': self.get_serializer(objetos, many=True).data,
+            'no_encontrados': [clave for clave in claves if clave not in por_clave],
+        })
+
+    def get_batch_keys(self, request):
+        """Claves de la petición convertidas al tipo de la clave primaria, sin repetir y en orden."""
+        if request.method == 'POST':
+            ids = request.data.get('ids') if isinstance(request.data, dict) else None
+            if not isinstance(ids, list):
+                raise ValidationError({'ids': ['Se espera una lista de claves.']})
+        else:
+            ids = [valor.strip() for valor in request.query_params.get('ids', '').split(',') if valor.strip()]
+        if not ids:
+            raise ValidationError({'ids': ['Indique al menos una clave.']})
+        maximo = self.batch_max_size or getattr(settings, 'API_BATCH_MAXIMO', 100)
+        if len(ids) > maximo:
+            raise ValidationError({'ids': ['Como máximo %d claves por petición.' % maximo]})
+        campo = self.queryset.model._meta.pk
+        try:
+            claves = [campo.to_python(valor) for valor in ids]
+        except (DjangoValidationError, TypeError):
+            raise ValidationError({'ids': ['Claves no válidas para %s.' % campo.name]})
+        return list(dict.fromkeys(claves))
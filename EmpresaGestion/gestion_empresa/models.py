@@ -1,17 +1,27 @@
 # gestion_empresa/models.py
 
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models.functions import Lower
 
 # Modelo para Clientes
 class Cliente(models.Model):
     # ID se crea automáticamente como clave primaria autoincremental por defecto.
     NombreCliente = models.CharField(max_length=50, verbose_name="Nombre Cliente")
     celular = models.CharField(max_length=80, verbose_name="Número Celular")
+    # Fecha de la última modificación: validador para ETag / Last-Modified en la API
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Última Modificación")
 
     class Meta:
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
         db_table = 'Clientes' # Asegura que el nombre de la tabla en la BD sea 'Clientes'
+        # Búsqueda por nombre (ver filters.py): prefijo sin distinguir mayúsculas sobre
+        # LOWER(NombreCliente) y "contiene" recorriendo el índice del campo
+        indexes = [
+            models.Index(fields=['NombreCliente'], name='clientes_nombre_idx'),
+            models.Index(Lower('NombreCliente'), name='clientes_nombre_lower_idx'),
+        ]
 
     def __str__(self):
         return self.NombreCliente
@@ -21,6 +31,7 @@ class Proveedor(models.Model):
     rut = models.IntegerField(primary_key=True, verbose_name="RUT del Proveedor")
     razon_social = models.CharField(max_length=50, verbose_name="Razón Social")
     telefono = models.CharField(max_length=80, verbose_name="Teléfono")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Última Modificación")
 
     class Meta:
         verbose_name = "Proveedor"
@@ -39,11 +50,18 @@ class Producto(models.Model):
     # Relación uno a muchos con Proveedor
     id_proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE,
                                      db_column='ID_Proveedor', verbose_name="Proveedor")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Última Modificación")
 
     class Meta:
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
         db_table = 'Productos' # Asegura que el nombre de la tabla en la BD sea 'Productos'
+        # Búsqueda por descripción y rango de precios (ver filters.py)
+        indexes = [
+            models.Index(fields=['descripcion'], name='productos_desc_idx'),
+            models.Index(Lower('descripcion'), name='productos_desc_lower_idx'),
+            models.Index(fields=['precio'], name='productos_precio_idx'),
+        ]
 
     def __str__(self):
         return f"Producto :{self.codigo} - {self.descripcion}"
@@ -52,21 +70,47 @@ class Producto(models.Model):
 class Pedido(models.Model):
     # id_pedido se crea automáticamente como clave primaria autoincremental por defecto.
     id_pedido = models.AutoField(primary_key=True, verbose_name="ID del Pedido")
-    # Relación uno a muchos con Producto
-    producto = models.ForeignKey(Producto, on_delete=models.CASCADE,
-                                  db_column='Codigo', verbose_name="Producto")
+    # Los productos pedidos están en PedidoLinea (pedido.lineas)
     # Relación uno a muchos con Cliente
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE,
                                 db_column='ID_Cliente', verbose_name="Cliente")
     fecha = models.DateField(verbose_name="Fecha del Pedido")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Última Modificación")
 
     class Meta:
         verbose_name = "Pedido"
         verbose_name_plural = "Pedidos"
         db_table = 'Pedidos' # Asegura que el nombre de la tabla en la BD sea 'Pedidos'
+        # Índice compuesto para la paginación por clave (fecha, pk)
+        indexes = [models.Index(fields=['fecha', 'id_pedido'], name='pedidos_fecha_pk_idx')]
+
+    def __str__(self):
+        return f"Pedido {self.id_pedido} - {self.cliente.NombreCliente}"
+
+# Modelo para las líneas de un Pedido
+class PedidoLinea(models.Model):
+    # ID se crea automáticamente como clave primaria autoincremental por defecto.
+    # Relación uno a muchos con Pedido
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='lineas',
+                               db_column='ID_Pedido', verbose_name="Pedido")
+    # Relación uno a muchos con Producto
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE,
+                                 db_column='Codigo_Producto', verbose_name="Producto")
+    cantidad = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)],
+                                           verbose_name="Cantidad")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Última Modificación")
+
+    class Meta:
+        verbose_name = "Línea de Pedido"
+        verbose_name_plural = "Líneas de Pedido"
+        db_table = 'Pedidos_Linea'
+        # Orden estable de las líneas en la API (también en el modo ligero)
+        ordering = ['id']
+        # Un producto aparece una sola vez por pedido; el índice sirve además para leer las líneas de un pedido
+        constraints = [models.UniqueConstraint(fields=['pedido', 'producto'], name='pedidos_linea_uniq')]
 
     def __str__(self):
-        return f"Pedido {self.id} - {self.cliente.NombreCliente}"
+        return f"Línea {self.id} del Pedido {self.pedido_id} - {self.cantidad}x {self.producto_id}"
 
 # Modelo para Factura
 class Factura(models.Model):
@@ -76,11 +120,18 @@ class Factura(models.Model):
     # Relación uno a muchos con Cliente
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE,
                                 db_column='ID_Cliente', verbose_name="Cliente")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Última Modificación")
 
     class Meta:
         verbose_name = "Factura"
         verbose_name_plural = "Facturas"
         db_table = 'Facturas' # Asegura que el nombre de la tabla en la BD sea 'Factura'
+        # Índice compuesto para la paginación por clave (fecha, pk); (fecha, importe) cubre la
+        # serie de ventas de informes.py sin leer la tabla
+        indexes = [
+            models.Index(fields=['fecha', 'num'], name='facturas_fecha_pk_idx'),
+            models.Index(fields=['fecha', 'importe'], name='facturas_fecha_importe_idx'),
+        ]
 
     def __str__(self):
         return f"Factura {self.num}"
@@ -96,6 +147,7 @@ class FacturaDetalle(models.Model):
                                  db_column='Codigo_Producto', verbose_name="Productos")
     cantidad = models.IntegerField(verbose_name="Cantidad")
     precio_unitario = models.DecimalField(max_digits=6, decimal_places=2, verbose_name="Precio Unitario")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Última Modificación")
 
     class Meta:
         verbose_name = "Detalle de Factura"
@@ -103,7 +155,210 @@ class FacturaDetalle(models.Model):
         db_table = 'Facturas_Detalle' # Asegura que el nombre de la tabla en la BD sea 'Factura_Detalle'
         # Añade una restricción de unicidad para evitar duplicados en el detalle de una factura
         unique_together = ('factura', 'producto')
+        # Índice compuesto para la paginación por clave (factura, pk)
+        indexes = [models.Index(fields=['factura', 'id'], name='facturas_det_factura_pk_idx')]
 
     def __str__(self):
         return f"Detalle {self.id} de Factura {self.factura.num} - {self.cantidad}x {self.producto.descripcion}"
 
+
+# Modelo para el resumen mensual de ventas por cliente (mantenido por gestion_empresa.rollups)
+class VentaClienteMes(models.Model):
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE,
+                                db_column='ID_Cliente', verbose_name="Cliente")
+    mes = models.DateField(verbose_name="Mes") # Primer día del mes de la factura
+    cantidad = models.BigIntegerField(default=0, verbose_name="Unidades Vendidas")
+    importe = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Importe Vendido")
+
+    class Meta:
+        verbose_name = "Venta Mensual por Cliente"
+        verbose_name_plural = "Ventas Mensuales por Cliente"
+        db_table = 'Ventas_Cliente_Mes'
+        # Cada cuadro de mando lee un cliente y un rango de meses: (cliente, mes) es único e indexado
+        constraints = [models.UniqueConstraint(fields=['cliente', 'mes'], name='ventas_cliente_mes_uniq')]
+        # (mes, cliente, importe, cantidad) cubre los informes por rango de meses (informes.py)
+        indexes = [
+            models.Index(fields=['mes'], name='ventas_cliente_mes_idx'),
+            models.Index(fields=['mes', 'cliente', 'importe', 'cantidad'], name='ventas_cli_mes_informe_idx'),
+        ]
+
+    def __str__(self):
+        return f"Ventas {self.cliente_id} {self.mes:%Y-%m}: {self.importe}"
+
+# Modelo para el resumen mensual de ventas por producto (mantenido por gestion_empresa.rollups)
+class VentaProductoMes(models.Model):
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE,
+                                 db_column='Codigo_Producto', verbose_name="Producto")
+    mes = models.DateField(verbose_name="Mes") # Primer día del mes de la factura
+    cantidad = models.BigIntegerField(default=0, verbose_name="Unidades Vendidas")
+    importe = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Importe Vendido")
+
+    class Meta:
+        verbose_name = "Venta Mensual por Producto"
+        verbose_name_plural = "Ventas Mensuales por Producto"
+        db_table = 'Ventas_Producto_Mes'
+        constraints = [models.UniqueConstraint(fields=['producto', 'mes'], name='ventas_producto_mes_uniq')]
+        # (mes, producto, importe, cantidad) cubre los informes por rango de meses (informes.py)
+        indexes = [
+            models.Index(fields=['mes'], name='ventas_producto_mes_idx'),
+            models.Index(fields=['mes', 'producto', 'importe', 'cantidad'], name='ventas_prod_mes_informe_idx'),
+        ]
+
+    def __str__(self):
+        return f"Ventas {self.producto_id} {self.mes:%Y-%m}: {self.importe}"
+
+
+# Modelo para el registro de cambios de la API de sincronización (mantenido por gestion_empresa.cambios)
+class Cambio(models.Model):
+    ALTA, MODIFICACION, BAJA = 'A', 'M', 'B'
+    OPERACIONES = [(ALTA, 'Alta'), (MODIFICACION, 'Modificación'), (BAJA, 'Baja')]
+
+    # Número de secuencia: la posición del cambio en el registro (solo se insertan filas)
+    seq = models.BigAutoField(primary_key=True, verbose_name="Secuencia")
+    recurso = models.CharField(max_length=30, verbose_name="Recurso") # Prefijo de la URL: 'productos'
+    clave = models.CharField(max_length=40, verbose_name="Clave")
+    operacion = models.CharField(max_length=1, choices=OPERACIONES, verbose_name="Operación")
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Fecha")
+
+    class Meta:
+        verbose_name = "Cambio"
+        verbose_name_plural = "Cambios"
+        db_table = 'Cambios'
+        # Lectura de los cambios de un recurso a partir de una posición
+        indexes = [models.Index(fields=['recurso', 'seq'], name='cambios_recurso_seq_idx')]
+
+    def __str__(self):
+        return f"Cambio {self.seq}: {self.get_operacion_display()} {self.recurso} {self.clave}"
+
+
+# Series de numeración de las facturas que se dan de alta sin número (ver numeracion.py)
+class SerieFactura(models.Model):
+    codigo = models.CharField(max_length=10, primary_key=True, verbose_name="Serie")
+    # Primer número aún no reservado; las series deben usar rangos de números disjuntos
+    siguiente = models.IntegerField(default=1, verbose_name="Siguiente Número")
+    hasta = models.IntegerField(null=True, blank=True, verbose_name="Último Número")
+    sin_huecos = models.BooleanField(default=False, verbose_name="Sin Huecos")
+    tamano_bloque = models.PositiveIntegerField(default=100, validators=[MinValueValidator(1)],
+                                                verbose_name="Números Reservados por Proceso")
+
+    class Meta:
+        verbose_name = "Serie de Facturas"
+        verbose_name_plural = "Series de Facturas"
+        db_table = 'Series_Factura'
+
+    def __str__(self):
+        return f"Serie {self.codigo}"
+
+
+# Trabajos en segundo plano: la cola es esta tabla (ver trabajos.py y 'manage.py trabajos')
+class Trabajo(models.Model):
+    PENDIENTE, EJECUTANDO, TERMINADO, FALLIDO = 'P', 'E', 'T', 'F'
+    ESTADOS = [(PENDIENTE, 'Pendiente'), (EJECUTANDO, 'En Ejecución'), (TERMINADO, 'Terminado'),
+               (FALLIDO, 'Fallido')]
+
+    tipo = models.CharField(max_length=30, verbose_name="Tipo")
+    parametros = models.JSONField(default=dict, blank=True, verbose_name="Parámetros")
+    estado = models.CharField(max_length=1, choices=ESTADOS, default=PENDIENTE, verbose_name="Estado")
+    creado = models.DateTimeField(auto_now_add=True, verbose_name="Creado")
+    iniciado = models.DateTimeField(null=True, blank=True, verbose_name="Iniciado")
+    terminado = models.DateTimeField(null=True, blank=True, verbose_name="Terminado")
+    # 'máquina:pid' del worker que lo ejecuta
+    ejecutor = models.CharField(max_length=100, blank=True, verbose_name="Worker")
+    resultado = models.JSONField(null=True, blank=True, verbose_name="Resultado")
+    # Nombre del fichero generado, dentro de settings.TRABAJOS_DIR
+    fichero = models.CharField(max_length=255, blank=True, verbose_name="Fichero")
+    error = models.TextField(blank=True, verbose_name="Error")
+
+    class Meta:
+        verbose_name = "Trabajo"
+        verbose_name_plural = "Trabajos"
+        db_table = 'Trabajos'
+        # Los workers toman los pendientes por orden de llegada
+        indexes = [models.Index(fields=['estado', 'id'], name='trabajos_estado_id_idx')]
+
+    def __str__(self):
+        return f"Trabajo {self.pk}: {self.tipo} ({self.get_estado_display()})"
+
+
+# --- Archivo histórico (mantenido por gestion_empresa.archivo: 'manage.py archivar') ---
+# Copias de los pedidos y facturas anteriores a una fecha de corte, con las mismas claves.
+# Las referencias a clientes y productos no tienen restricción en la BD ni se borran en
+# cascada: el archivo conserva la historia aunque el cliente o el producto desaparezcan.
+
+# Pedido archivado
+class PedidoArchivo(models.Model):
+    id_pedido = models.IntegerField(primary_key=True, verbose_name="ID del Pedido")
+    cliente = models.ForeignKey(Cliente, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+                                db_column='ID_Cliente', verbose_name="Cliente")
+    fecha = models.DateField(verbose_name="Fecha del Pedido")
+    updated_at = models.DateTimeField(verbose_name="Última Modificación")
+    archivado = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Archivo")
+
+    class Meta:
+        verbose_name = "Pedido Archivado"
+        verbose_name_plural = "Pedidos Archivados"
+        db_table = 'Pedidos_Archivo'
+        indexes = [models.Index(fields=['fecha', 'id_pedido'], name='pedidos_arch_fecha_pk_idx')]
+
+    def __str__(self):
+        return f"Pedido archivado {self.id_pedido}"
+
+# Línea de un pedido archivado
+class PedidoLineaArchivo(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    pedido = models.ForeignKey(PedidoArchivo, on_delete=models.CASCADE, related_name='lineas',
+                               db_column='ID_Pedido', verbose_name="Pedido")
+    producto = models.ForeignKey(Producto, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+                                 db_column='Codigo_Producto', verbose_name="Producto")
+    cantidad = models.PositiveIntegerField(verbose_name="Cantidad")
+    updated_at = models.DateTimeField(verbose_name="Última Modificación")
+
+    class Meta:
+        verbose_name = "Línea de Pedido Archivada"
+        verbose_name_plural = "Líneas de Pedido Archivadas"
+        db_table = 'Pedidos_Linea_Archivo'
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Línea archivada {self.id} del Pedido {self.pedido_id}"
+
+# Factura archivada
+class FacturaArchivo(models.Model):
+    num = models.IntegerField(primary_key=True, verbose_name="Número de Factura")
+    fecha = models.DateField(verbose_name="Fecha de Factura")
+    importe = models.DecimalField(max_digits=9, decimal_places=2, verbose_name="Importe Total")
+    cliente = models.ForeignKey(Cliente, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+                                db_column='ID_Cliente', verbose_name="Cliente")
+    updated_at = models.DateTimeField(verbose_name="Última Modificación")
+    archivado = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Archivo")
+
+    class Meta:
+        verbose_name = "Factura Archivada"
+        verbose_name_plural = "Facturas Archivadas"
+        db_table = 'Facturas_Archivo'
+        indexes = [
+            models.Index(fields=['fecha', 'num'], name='facturas_arch_fecha_pk_idx'),
+            models.Index(fields=['fecha', 'importe'], name='facturas_arch_fecha_imp_idx'),
+        ]
+
+    def __str__(self):
+        return f"Factura archivada {self.num}"
+
+# Línea de una factura archivada
+class FacturaDetalleArchivo(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    factura = models.ForeignKey(FacturaArchivo, on_delete=models.CASCADE, related_name='detalles',
+                                db_column='Num_Factura', verbose_name="Número de Factura")
+    producto = models.ForeignKey(Producto, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+                                 db_column='Codigo_Producto', verbose_name="Productos")
+    cantidad = models.IntegerField(verbose_name="Cantidad")
+    precio_unitario = models.DecimalField(max_digits=6, decimal_places=2, verbose_name="Precio Unitario")
+    updated_at = models.DateTimeField(verbose_name="Última Modificación")
+
+    class Meta:
+        verbose_name = "Detalle de Factura Archivado"
+        verbose_name_plural = "Detalles de Factura Archivados"
+        db_table = 'Facturas_Detalle_Archivo'
+
+    def __str__(self):
+        return f"Detalle archivado {self.id} de Factura {self.factura_id}"
@@ -0,0 +1,87 @@
+# gestion_empresa/numeracion.py
+
+"""
+Numeración en el servidor de las facturas que se dan de alta sin 'num',
+por series (SerieFactura):
+
+- Serie con huecos (sin_huecos=False): cada proceso reserva bloques de
+  'tamano_bloque' números con una UPDATE y los reparte entre sus hilos sin
+  volver a la base de datos. La reserva va en la transacción del alta y el
+  bloque solo se reparte después de su commit: si el alta falla, la UPDATE
+  se deshace y el proceso no se queda con números que la serie vuelve a
+  dar. Los números que no se llegan a usar (el proceso termina) se pierden,
+  y entre procesos el orden de los números no sigue el orden de las altas.
+- Serie sin huecos (sin_huecos=True): el número se toma dentro de la
+  transacción del alta; si el alta falla, el número vuelve a quedar libre.
+  La fila de la serie queda bloqueada hasta el commit: las altas de una
+  serie sin huecos se hacen de una en una.
+
+Los bloques reservados solo se conocen en el proceso: cambiar 'siguiente'
+o el modo de una serie no afecta a los bloques ya reservados.
+"""
+
+import threading
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, When
+
+from .models import SerieFactura
+
+# Serie -> [siguiente, fin) : números reservados por este proceso y aún sin usar
+_bloques = {}
+_cerrojo = threading.Lock()
+
+
+class NumeracionError(Exception):
+    """La serie no existe o no le quedan números."""
+
+
+def siguiente_numero(serie):
+    """
+    Devuelve un número de factura de la serie no usado por ningún otro
+    proceso o hilo. En una serie sin huecos hay que llamarla dentro de la
+    transacción (transaction.atomic) que da de alta la factura.
+    """
+    with _cerrojo:
+        bloque = _bloques.get(serie)
+        if bloque is not None and bloque[0] < bloque[1]:
+            bloque[0] += 1
+            return bloque[0] - 1
+    # Fuera del cerrojo del proceso: en una serie sin huecos la fila queda bloqueada hasta
+    # el commit del alta y los demás hilos no deben esperar por ella con el cerrojo tomado
+    en_transaccion = not transaction.get_autocommit()
+    with transaction.atomic():
+        # La UPDATE va primero: bloquea la fila hasta el final de la transacción,
+        # así que la lectura siguiente ve el valor que ha dejado esta reserva
+        reservadas = Case(When(sin_huecos=True, then=1), default=F('tamano_bloque'), output_field=IntegerField())
+        if not SerieFactura.objects.filter(pk=serie).update(siguiente=F('siguiente') + reservadas):
+            raise NumeracionError('La serie %s no existe.' % serie)
+        fin, cantidad, hasta, sin_huecos = (SerieFactura.objects.filter(pk=serie)
+                                            .values_list('siguiente', 'tamano_bloque', 'hasta', 'sin_huecos')
+                                            .get())
+        if sin_huecos and not en_transaccion:
+            raise transaction.TransactionManagementError(
+                'La serie %s es sin huecos: el número se toma en la transacción del alta.' % serie)
+        primero = fin - (1 if sin_huecos else cantidad)
+        if hasta is not None:
+            if primero > hasta:
+                raise NumeracionError('La serie %s no tiene más números.' % serie)
+            fin = min(fin, hasta + 1)
+        if not sin_huecos:
+            # Dentro de una transacción del llamante la reserva solo es firme en su commit; si se
+            # deshace, la serie vuelve a dar estos números y el bloque no debe quedar en el proceso
+            transaction.on_commit(partial(_guardar_bloque, serie, primero + 1, fin))
+    return primero
+
+
+def _guardar_bloque(serie, siguiente, fin):
+    # Si otro hilo ha reservado a la vez, su bloque sin usar se pierde (huecos)
+    with _cerrojo:
+        _bloques[serie] = [siguiente, fin]
+
+
+def descartar_bloques():
+    """Olvida los números reservados por este proceso (quedan como huecos)."""
+    with _cerrojo:
+        _bloques.clear()
@@ -0,0 +1,168 @@
+# gestion_empresa/pagination.py
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# Paginación por clave (keyset) sobre una ordenación compuesta, p. ej. (fecha, pk)
+class KeysetPagination(BasePagination):
+    """
+    Pagina con 'WHERE (a, b) > (x, y) ORDER BY a, b LIMIT n' en lugar de
+    COUNT(*) + OFFSET, de modo que cualquier página cuesta lo mismo.
+
+    La ordenación se toma de 'ordering' o del atributo 'keyset_ordering'
+    del ViewSet; el último campo debe ser único (normalmente 'pk').
+    Si la petición incluye '?page=N' se usa la paginación por número de
+    página de siempre, para no romper a los clientes existentes.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    page_query_param = 'page'
+    ordering = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.campos = self.get_campos(queryset, view)
+        queryset = queryset.order_by(*[campo.attname for campo in self.campos])
+
+        # Modo compatible: paginación por número de página
+        if self.page_query_param in request.query_params:
+            self.paginas = PageNumberPagination()
+            self.paginas.page_query_param = self.page_query_param
+            self.paginas.page_size = self.page_size
+            return self.paginas.paginate_queryset(queryset, request, view)
+        self.paginas = None
+
+        posicion, hacia_atras = self.decode_cursor(request)
+        return self._pagina(list(self._ventana(queryset, posicion, hacia_atras)), posicion, hacia_atras)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Variante para vistas asíncronas: lee la ventana con el ORM asíncrono.
+        Solo admite el modo por cursor ('?page=N' necesita un COUNT síncrono).
+        """
+        self.request = request
+        self.campos = self.get_campos(queryset, view)
+        self.paginas = None
+        queryset = queryset.order_by(*[campo.attname for campo in self.campos])
+        posicion, hacia_atras = self.decode_cursor(request)
+        ventana = self._ventana(queryset, posicion, hacia_atras)
+        filas = [fila async for fila in ventana.aiterator(chunk_size=self.page_size + 1)]
+        return self._pagina(filas, posicion, hacia_atras)
+
+    def _pagina(self, filas, posicion, hacia_atras):
+        hay_mas = len(filas) > self.page_size
+        filas = filas[:self.page_size]
+        if hacia_atras:
+            filas.reverse()
+
+        # Con cursor hacia delante siempre existe página anterior (y viceversa)
+        self.hay_siguiente = hay_mas if not hacia_atras else posicion is not None
+        self.hay_anterior = hay_mas if hacia_atras else posicion is not None
+        self.primera = self.posicion_de(filas[0]) if filas else None
+        self.ultima = self.posicion_de(filas[-1]) if filas else None
+        return filas
+
+    def _ventana(self, queryset, posicion, hacia_atras):
+        # Filas de la página pedida más una, para saber si hay más (sin evaluar)
+        if hacia_atras:
+            queryset = queryset.reverse()
+        if posicion is not None:
+            queryset = queryset.filter(self.filtro_posterior(posicion, hacia_atras))
+        return queryset[:self.page_size + 1]
+
+    def queryset_de_pagina(self, queryset, request, view=None):
+        """
+        Devuelve, sin evaluarlo, el queryset acotado a las filas de la página que
+        pide 'request' (o None en el modo por número de página). Permite calcular
+        validadores (ETag) de la página con una consulta de coste constante.
+        """
+        if self.page_query_param in request.query_params:
+            return None
+        self.campos = self.get_campos(queryset, view)
+        queryset = queryset.order_by(*[campo.attname for campo in self.campos])
+        posicion, hacia_atras = self.decode_cursor(request)
+        return self._ventana(queryset, posicion, hacia_atras)
+
+    def get_campos(self, queryset, view):
+        ordering = self.ordering or getattr(view, 'keyset_ordering', None) or ('pk',)
+        opts = queryset.model._meta
+        return [opts.pk if nombre == 'pk' else opts.get_field(nombre) for nombre in ordering]
+
+    def filtro_posterior(self, posicion, hacia_atras):
+        """Construye (a > x) OR (a = x AND b > y) ... para la posición dada."""
+        operador = 'lt' if hacia_atras else 'gt'
+        filtro = Q()
+        iguales = {}
+        for campo, valor in zip(self.campos, posicion):
+            filtro |= Q(**iguales, **{'%s__%s' % (campo.attname, operador): valor})
+            iguales[campo.attname] = valor
+        # Cota redundante sobre el primer campo para que el índice acote el rango
+        primero = self.campos[0].attname
+        return Q(**{'%s__%se' % (primero, operador): posicion[0]}) & filtro
+
+    def posicion_de(self, instancia):
+        # Las filas del modo ligero (lean.py) son diccionarios con los nombres de los campos
+        if isinstance(instancia, dict):
+            return [instancia[campo.name] for campo in self.campos]
+        return [getattr(instancia, campo.attname) for campo in self.campos]
+
+    def encode_cursor(self, posicion, hacia_atras):
+        datos = {'p': [str(valor) for valor in posicion]}
+        if hacia_atras:
+            datos['r'] = 1
+        cursor = base64.urlsafe_b64encode(json.dumps(datos).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            datos = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(datos['p']) != len(self.campos):
+                raise ValueError
+            posicion = [campo.to_python(valor) for campo, valor in zip(self.campos, datos['p'])]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound('Cursor no válido.')
+        return posicion, bool(datos.get('r'))
+
+    def get_next_link(self):
+        if not self.hay_siguiente or self.ultima is None:
+            return None
+        return self.encode_cursor(self.ultima, hacia_atras=False)
+
+    def get_previous_link(self):
+        if not self.hay_anterior:
+            return None
+        if self.primera is None:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.primera, hacia_atras=True)
+
+    def get_paginated_response(self, data):
+        if self.paginas is not None:
+            return self.paginas.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
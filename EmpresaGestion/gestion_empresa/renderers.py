@@ -0,0 +1,50 @@
+# gestion_empresa/renderers.py
+
+"""
+Renderer JSON de la API con orjson, si está instalado.
+
+La salida es la misma, byte a byte, que la de JSONRenderer de DRF con su
+configuración por defecto (compacta y sin escapar el texto no ASCII), salvo
+el exponente de los float muy grandes o muy pequeños ('1e16' por '1e+16'):
+
+- Las fechas y decimales que llegan sin pasar por un campo del serializador
+  se convierten con el codificador de DRF, salvo Decimal, que se escribe
+  como cadena para no perder precisión (DRF lo convertiría a float).
+- Con 'indent' en la cabecera Accept, o sin orjson, se usa JSONRenderer.
+- Enteros de más de 64 bits, que orjson no admite, también.
+"""
+
+import decimal
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_codificador = JSONEncoder()
+
+
+def _por_defecto(valor):
+    if isinstance(valor, decimal.Decimal):
+        return str(valor)
+    return _codificador.default(valor)
+
+
+# Renderer JSON rápido (orjson) con la salida de JSONRenderer
+class JSONRapidoRenderer(JSONRenderer):
+    opciones = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            contenido = orjson.dumps(data, default=_por_defecto, option=self.opciones)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Como DRF: U+2028 y U+2029 son válidos en JSON pero no en JavaScript
+        if b'\xe2\x80\xa8' in contenido or b'\xe2\x80\xa9' in contenido:
+            contenido = contenido.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return contenido
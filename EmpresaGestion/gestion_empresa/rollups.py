@@ -0,0 +1,300 @@
+# gestion_empresa/rollups.py
+
+"""
+Mantenimiento incremental de los resúmenes mensuales de ventas
+(VentaClienteMes y VentaProductoMes).
+
+Cada cambio en Factura / FacturaDetalle se traduce en diferencias
+(cantidad, importe) por (cliente, mes) y (producto, mes), que se suman
+con UPDATE ... SET importe = importe + x. Las escrituras que no envían
+señales (QuerySet.update, SQL directo) no se reflejan: en ese caso hay que
+ejecutar 'manage.py rebuild_rollups'. Las líneas archivadas (archivo.py)
+siguen contando mientras existan su cliente y su producto.
+"""
+
+import itertools
+import threading
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, Exists, ExpressionWrapper, F, OuterRef, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Cliente, FacturaDetalle, FacturaDetalleArchivo, Producto, VentaClienteMes, VentaProductoMes
+
+# Importe de una línea de factura calculado en la BD
+IMPORTE_LINEA = ExpressionWrapper(F('cantidad') * F('precio_unitario'),
+                                  output_field=DecimalField(max_digits=14, decimal_places=2))
+
+# Facturas y productos que se están borrando en la operación de borrado en
+# curso ('origin' de las señales): sus líneas ya se descontaron en bloque y
+# no deben descontarse otra vez una a una al borrarse en cascada.
+_borrando = threading.local()
+
+
+def _marcas(origin):
+    if getattr(_borrando, 'origin', None) is not origin:
+        _borrando.origin = origin
+        _borrando.facturas, _borrando.productos = set(), set()
+    return _borrando
+
+
+def mes_de(fecha):
+    return fecha.replace(day=1)
+
+
+class Deltas:
+    """Acumula diferencias por (cliente, mes) y (producto, mes) y las aplica juntas."""
+
+    def __init__(self):
+        self.clientes = defaultdict(lambda: [0, Decimal('0')])
+        self.productos = defaultdict(lambda: [0, Decimal('0')])
+
+    def sumar(self, cliente_id, producto_id, fecha, cantidad, importe, signo=1):
+        mes = mes_de(fecha)
+        for acumulado in (self.clientes[(cliente_id, mes)], self.productos[(producto_id, mes)]):
+            acumulado[0] += signo * cantidad
+            acumulado[1] += signo * importe
+
+    def aplicar(self):
+        _aplicar(VentaClienteMes, 'cliente_id', self.clientes)
+        _aplicar(VentaProductoMes, 'producto_id', self.productos)
+
+
+def _aplicar(modelo, clave, deltas):
+    deltas = {k: v for k, v in deltas.items() if v[0] or v[1]}
+    if len(deltas) <= 1:
+        for (valor_clave, mes), valores in deltas.items():
+            _sumar(modelo, {clave: valor_clave, 'mes': mes}, *valores)
+        return
+
+    # Varias claves (p. ej. una factura de cientos de líneas): se bloquean y leen las
+    # filas existentes con una consulta y se escriben con un UPDATE y un INSERT en bloque
+    with transaction.atomic():
+        existentes = modelo.objects.select_for_update().filter(**{
+            clave + '__in': {k[0] for k in deltas}, 'mes__in': {k[1] for k in deltas}})
+        modificadas = []
+        for fila in existentes:
+            valores = deltas.pop((getattr(fila, clave), fila.mes), None)
+            if valores is not None:
+                fila.cantidad += valores[0]
+                fila.importe += valores[1]
+                modificadas.append(fila)
+        modelo.objects.bulk_update(modificadas, ['cantidad', 'importe'])
+        if not deltas:
+            return
+        try:
+            with transaction.atomic():
+                modelo.objects.bulk_create([
+                    modelo(**{clave: valor_clave}, mes=mes, cantidad=valores[0], importe=valores[1])
+                    for (valor_clave, mes), valores in deltas.items()])
+        except IntegrityError:
+            # Otra transacción creó alguna de las filas: se repite clave a clave
+            for (valor_clave, mes), valores in deltas.items():
+                _sumar(modelo, {clave: valor_clave, 'mes': mes}, *valores)
+
+
+def _sumar(modelo, claves, cantidad, importe):
+    if not cantidad and not importe:
+        return
+    actualizadas = modelo.objects.filter(**claves).update(
+        cantidad=F('cantidad') + cantidad, importe=F('importe') + importe)
+    if actualizadas:
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(cantidad=cantidad, importe=importe, **claves)
+    except IntegrityError:
+        # Otra transacción creó la fila entre el UPDATE y el INSERT
+        modelo.objects.filter(**claves).update(
+            cantidad=F('cantidad') + cantidad, importe=F('importe') + importe)
+
+
+def _estado_linea(pk):
+    return (FacturaDetalle.objects.filter(pk=pk)
+            .values_list('factura__cliente_id', 'producto_id', 'factura__fecha',
+                         'cantidad', 'precio_unitario')
+            .first())
+
+
+# --- Líneas de factura -------------------------------------------------------
+
+def antes_de_guardar_linea(detalle):
+    detalle._rollup_anterior = None if detalle._state.adding else _estado_linea(detalle.pk)
+
+
+def despues_de_guardar_linea(detalle):
+    deltas = Deltas()
+    anterior = getattr(detalle, '_rollup_anterior', None)
+    if anterior:
+        cliente_id, producto_id, fecha, cantidad, precio = anterior
+        deltas.sumar(cliente_id, producto_id, fecha, cantidad, cantidad * precio, signo=-1)
+    factura = detalle.factura
+    deltas.sumar(factura.cliente_id, detalle.producto_id, factura.fecha,
+                 detalle.cantidad, detalle.cantidad * Decimal(detalle.precio_unitario))
+    deltas.aplicar()
+
+
+def despues_de_borrar_linea(detalle, origin=None):
+    marcas = _marcas(origin)
+    if detalle.factura_id in marcas.facturas or detalle.producto_id in marcas.productos:
+        return
+    factura = detalle.factura
+    deltas = Deltas()
+    deltas.sumar(factura.cliente_id, detalle.producto_id, factura.fecha,
+                 detalle.cantidad, detalle.cantidad * Decimal(detalle.precio_unitario), signo=-1)
+    deltas.aplicar()
+
+
+def lineas_guardadas_en_bloque(factura, anteriores, nuevas):
+    """
+    Para escrituras con bulk_create/bulk_update, que no envían señales.
+    'anteriores' son tuplas (producto_id, cantidad, precio) previas a la
+    modificación y 'nuevas' las líneas resultantes (instancias).
+    """
+    deltas = Deltas()
+    for producto_id, cantidad, precio in anteriores:
+        deltas.sumar(factura.cliente_id, producto_id, factura.fecha, cantidad, cantidad * precio, signo=-1)
+    for detalle in nuevas:
+        deltas.sumar(factura.cliente_id, detalle.producto_id, factura.fecha,
+                     detalle.cantidad, detalle.cantidad * Decimal(detalle.precio_unitario))
+    deltas.aplicar()
+
+
+# --- Facturas ----------------------------------------------------------------
+
+def _totales_por_producto(factura_pk):
+    return (FacturaDetalle.objects.filter(factura_id=factura_pk)
+            .values('producto_id')
+            .annotate(total_cantidad=Sum('cantidad'), total_importe=Sum(IMPORTE_LINEA))
+            .values_list('producto_id', 'total_cantidad', 'total_importe')
+            .order_by())
+
+
+def antes_de_guardar_factura(factura, update_fields=None):
+    factura._rollup_anterior = None
+    if factura._state.adding:
+        return
+    if update_fields is not None and not {'cliente', 'fecha'} & set(update_fields):
+        return  # p. ej. recalcular el importe: no cambia el resumen
+    factura._rollup_anterior = (type(factura).objects.filter(pk=factura.pk)
+                                .values_list('cliente_id', 'fecha').first())
+
+
+def despues_de_guardar_factura(factura):
+    anterior = getattr(factura, '_rollup_anterior', None)
+    if not anterior or (anterior[0], mes_de(anterior[1])) == (factura.cliente_id, mes_de(factura.fecha)):
+        return
+    # La factura cambia de cliente o de mes: sus líneas se trasladan de resumen
+    deltas = Deltas()
+    for producto_id, cantidad, importe in _totales_por_producto(factura.pk):
+        deltas.sumar(anterior[0], producto_id, anterior[1], cantidad, importe, signo=-1)
+        deltas.sumar(factura.cliente_id, producto_id, factura.fecha, cantidad, importe)
+    deltas.aplicar()
+
+
+def antes_de_borrar_factura(factura, origin=None):
+    deltas = Deltas()
+    for producto_id, cantidad, importe in _totales_por_producto(factura.pk):
+        deltas.sumar(factura.cliente_id, producto_id, factura.fecha, cantidad, importe, signo=-1)
+    deltas.aplicar()
+    _marcas(origin).facturas.add(factura.pk)
+
+
+# --- Productos (borrado en cascada de sus líneas) ----------------------------
+
+def antes_de_borrar_producto(producto, origin=None):
+    marcas = _marcas(origin)
+    deltas = Deltas()
+    lineas = (FacturaDetalle.objects.filter(producto_id=producto.pk)
+              .exclude(factura_id__in=marcas.facturas)
+              .annotate(mes=TruncMonth('factura__fecha'))
+              .values('factura__cliente', 'mes')
+              .annotate(total_cantidad=Sum('cantidad'), total_importe=Sum(IMPORTE_LINEA))
+              .values_list('factura__cliente', 'mes', 'total_cantidad', 'total_importe')
+              .order_by())
+    for cliente_id, mes, cantidad, importe in lineas:
+        deltas.sumar(cliente_id, producto.pk, mes, cantidad, importe, signo=-1)
+    for cliente_id, producto_id, mes, cantidad, importe in ventas_archivadas(producto_id=producto.pk):
+        deltas.sumar(cliente_id, producto_id, mes, cantidad, importe, signo=-1)
+    deltas.aplicar()
+    marcas.productos.add(producto.pk)
+
+
+# --- Borrados en bloque sin señales (services.borrar_proveedor_por_bloques) -----
+
+def antes_de_borrar_lineas(lineas):
+    """Descuenta las líneas de factura del queryset, que se van a borrar sin señales."""
+    deltas = Deltas()
+    totales = (lineas.annotate(mes=TruncMonth('factura__fecha'))
+               .values('factura__cliente', 'producto', 'mes')
+               .annotate(total_cantidad=Sum('cantidad'), total_importe=Sum(IMPORTE_LINEA))
+               .values_list('factura__cliente', 'producto', 'mes', 'total_cantidad', 'total_importe')
+               .order_by())
+    for cliente_id, producto_id, mes, cantidad, importe in totales:
+        deltas.sumar(cliente_id, producto_id, mes, cantidad, importe, signo=-1)
+    deltas.aplicar()
+
+
+def antes_de_borrar_productos(claves):
+    """Descuenta las ventas archivadas de los productos, que se van a borrar sin señales."""
+    deltas = Deltas()
+    for cliente_id, producto_id, mes, cantidad, importe in ventas_archivadas(producto__in=claves):
+        deltas.sumar(cliente_id, producto_id, mes, cantidad, importe, signo=-1)
+    deltas.aplicar()
+
+
+# --- Ventas archivadas (archivo.py) ------------------------------------------
+
+def ventas_archivadas(**filtros):
+    """
+    Totales (cliente, producto, mes, cantidad, importe) de las líneas
+    archivadas. Las de clientes o productos ya borrados no cuentan (el
+    archivo las conserva, pero los resúmenes los descartan al borrarlos).
+    """
+    return (FacturaDetalleArchivo.objects.filter(**filtros)
+            .filter(Exists(Cliente.objects.filter(pk=OuterRef('factura__cliente'))),
+                    Exists(Producto.objects.filter(pk=OuterRef('producto'))))
+            .annotate(mes=TruncMonth('factura__fecha'))
+            .values('factura__cliente', 'producto', 'mes')
+            .annotate(total_cantidad=Sum('cantidad'), total_importe=Sum(IMPORTE_LINEA))
+            .values_list('factura__cliente', 'producto', 'mes', 'total_cantidad', 'total_importe')
+            .order_by())
+
+
+def antes_de_borrar_cliente(cliente):
+    # Sus facturas vivas se descuentan al borrarse en cascada (antes_de_borrar_factura)
+    deltas = Deltas()
+    for cliente_id, producto_id, mes, cantidad, importe in ventas_archivadas(factura__cliente=cliente.pk):
+        deltas.sumar(cliente_id, producto_id, mes, cantidad, importe, signo=-1)
+    deltas.aplicar()
+
+
+# --- Reconstrucción completa -------------------------------------------------
+
+@transaction.atomic
+def reconstruir(batch_size=1000):
+    """Vacía y recalcula ambos resúmenes a partir de Facturas_Detalle y Facturas_Detalle_Archivo."""
+    VentaClienteMes.objects.all().delete()
+    VentaProductoMes.objects.all().delete()
+    base = FacturaDetalle.objects.annotate(mes=TruncMonth('factura__fecha'))
+    totales = {'total_cantidad': Sum('cantidad'), 'total_importe': Sum(IMPORTE_LINEA)}
+
+    for modelo, clave, campo in ((VentaClienteMes, 'cliente_id', 'factura__cliente'),
+                                 (VentaProductoMes, 'producto_id', 'producto')):
+        filas = base.values(campo, 'mes').annotate(**totales).order_by().iterator(chunk_size=batch_size)
+        # Inserción por lotes sin materializar todos los grupos en memoria
+        while lote := [modelo(**{clave: fila[campo]}, mes=fila['mes'], cantidad=fila['total_cantidad'],
+                              importe=fila['total_importe'])
+                       for fila in itertools.islice(filas, batch_size)]:
+            modelo.objects.bulk_create(lote)
+
+    # Las ventas archivadas (archivo.py) también cuentan: se suman a las filas ya creadas
+    archivadas = ventas_archivadas().iterator(chunk_size=batch_size)
+    while lote := list(itertools.islice(archivadas, batch_size)):
+        deltas = Deltas()
+        for cliente_id, producto_id, mes, cantidad, importe in lote:
+            deltas.sumar(cliente_id, producto_id, mes, cantidad, importe)
+        deltas.aplicar()
+    return VentaClienteMes.objects.count(), VentaProductoMes.objects.count()
@@ -0,0 +1,47 @@
+# gestion_empresa/routers.py
+
+"""
+Enrutado de lecturas a réplicas.
+
+ReplicaMiddleware (middleware.py) marca como 'leer de réplica' las
+peticiones GET/HEAD a los ViewSets de gestion_empresa; durante esas
+peticiones las lecturas de los modelos de la aplicación van a una de las
+bases de datos de REPLICA_DATABASES. Todo lo demás (escrituras, otras
+aplicaciones, comandos, señales) usa 'default'.
+
+Lectura de lo escrito: tras una petición de escritura se envía la cookie
+REPLICA_STICKY_COOKIE durante REPLICA_STICKY_SECONDS; mientras exista, las
+lecturas de ese cliente van al primario y no ven el retraso de la réplica.
+"""
+
+import contextvars
+import random
+
+from django.conf import settings
+
+# ¿La petición en curso puede leer de una réplica?
+lectura_en_replica = contextvars.ContextVar('lectura_en_replica', default=False)
+
+
+def replicas():
+    return list(getattr(settings, 'REPLICA_DATABASES', []))
+
+
+class ReplicaRouter:
+    app_label = 'gestion_empresa'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label or not lectura_en_replica.get():
+            return None
+        disponibles = replicas()
+        return random.choice(disponibles) if disponibles else None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas y primario contienen los mismos datos
+        bases = {'default', *replicas()}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
@@ -1,53 +1,228 @@
 # gestion_empresa/serializers.py
 
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
-from .models import Cliente, Proveedor, Producto, Pedido, Factura, FacturaDetalle
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.reverse import reverse
+from .models import (
+    Cliente, Proveedor, Producto, Pedido, PedidoLinea, Factura, FacturaDetalle, Trabajo, VentaClienteMes,
+    VentaProductoMes
+)
+from .metrics import SerializacionMedidaMixin
+from .numeracion import NumeracionError, siguiente_numero
+from .services import guardar_detalles_factura, guardar_lineas_pedido
+
+def _lista_de_parametro(request, nombre):
+    return tuple(sorted({valor.strip() for valor in request.query_params.get(nombre, '').split(',')
+                         if valor.strip()}))
+
+def seleccion_de_campos(request):
+    """(fields, expand) pedidos en la URL como tuplas ordenadas, o None si no hay ninguno o no es una lectura."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    fields, expand = _lista_de_parametro(request, 'fields'), _lista_de_parametro(request, 'expand')
+    if not fields and not expand:
+        return None
+    return fields, expand
+
+# Mixin para serializadores: campos a elección del cliente (?fields=) y relaciones embebidas (?expand=)
+class CamposDinamicosMixin:
+    """
+    '?fields=num,fecha' limita la respuesta a esos campos y '?expand=cliente'
+    sustituye la clave de la relación por el objeto completo, con el
+    serializador declarado en Meta.expandibles. Solo en lecturas y en el
+    serializador principal de la petición (no en los anidados). El ViewSet
+    ajusta su consulta a los campos resultantes (ver PrefetchPlanMixin).
+    """
+
+    def get_fields(self):
+        campos = super().get_fields()
+        seleccion = seleccion_de_campos(self.context.get('request')) if self._es_principal() else None
+        if seleccion is None:
+            return campos
+        fields, expand = seleccion
+        expandibles = getattr(self.Meta, 'expandibles', {})
+        errores = {}
+        if set(expand) - set(expandibles):
+            errores['expand'] = ['Relaciones expandibles: %s.' % (', '.join(expandibles) or 'ninguna')]
+        if set(fields) - set(campos):
+            errores['fields'] = ['Campos no válidos: %s. Disponibles: %s.' % (
+                ', '.join(sorted(set(fields) - set(campos))), ', '.join(campos))]
+        if errores:
+            raise serializers.ValidationError(errores)
+        for nombre in expand:
+            campos[nombre] = expandibles[nombre](read_only=True)
+        if fields:
+            # Se conserva el orden del serializador, no el de la URL
+            campos = {nombre: campo for nombre, campo in campos.items() if nombre in fields}
+        return campos
+
+    def _es_principal(self):
+        padre = self.parent
+        if isinstance(padre, serializers.ListSerializer):
+            padre = padre.parent
+        return padre is None
 
 # Serializador para el modelo Cliente
-class ClienteSerializer(serializers.ModelSerializer):
+class ClienteSerializer(SerializacionMedidaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Cliente
         fields = '__all__' # Incluye todos los campos del modelo
 
 # Serializador para el modelo Proveedor
-class ProveedorSerializer(serializers.ModelSerializer):
+class ProveedorSerializer(SerializacionMedidaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Proveedor
         fields = '__all__'
 
 # Serializador para el modelo Producto
-class ProductoSerializer(serializers.ModelSerializer):
+class ProductoSerializer(SerializacionMedidaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
     # Para mostrar el nombre del proveedor en lugar de solo su ID
     id_proveedor_razon_social = serializers.ReadOnlyField(source='id_proveedor.razon_social')
 
     class Meta:
         model = Producto
         fields = '__all__'
+        expandibles = {'id_proveedor': ProveedorSerializer} # ?expand=id_proveedor
         # fields = ['Codigo', 'descripcion', 'precio', 'id_proveedor', 'id_proveedor_razon_social'] # Ejemplo de campos específicos
 
-# Serializador para el modelo Pedido
-class PedidoSerializer(serializers.ModelSerializer):
-    # Para mostrar el nombre del producto y el cliente
+# Códigos de producto de una lista de líneas sin validar (los erróneos se informan al validar la línea)
+def codigos_de_producto(data):
+    codigos = set()
+    for linea in data if isinstance(data, list) else []:
+        try:
+            codigos.add(int(linea.get('producto')))
+        except (AttributeError, TypeError, ValueError):
+            pass
+    return codigos
+
+# Lista de líneas de pedido: comprueba todos los productos con una única consulta
+class PedidoLineaListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        self.child.productos = set(
+            Producto.objects.filter(pk__in=codigos_de_producto(data)).values_list('pk', flat=True))
+        self.child.vistos = set()
+        return super().to_internal_value(data)
+
+# Serializador para las líneas de un pedido (anidado en PedidoSerializer)
+class PedidoLineaSerializer(serializers.ModelSerializer):
+    # Se lee y se escribe la clave: el producto no se instancia al validar
+    producto = serializers.IntegerField(source='producto_id')
     producto_descripcion = serializers.ReadOnlyField(source='producto.descripcion')
-    cliente_nombre = serializers.ReadOnlyField(source='cliente.nombre_cliente')
+
+    class Meta:
+        model = PedidoLinea
+        fields = ['id', 'producto', 'producto_descripcion', 'cantidad']
+        list_serializer_class = PedidoLineaListSerializer
+
+    def validate_producto(self, codigo):
+        productos = getattr(self, 'productos', None)
+        if productos is None:
+            productos = set(Producto.objects.filter(pk=codigo).values_list('pk', flat=True))
+        if codigo not in productos:
+            raise serializers.ValidationError('Producto %s no existe.' % codigo)
+        vistos = getattr(self, 'vistos', set())
+        if codigo in vistos:
+            raise serializers.ValidationError('Producto %s repetido en el pedido.' % codigo)
+        vistos.add(codigo)
+        return codigo
+
+# Serializador para el modelo Pedido: cabecera con sus líneas anidadas
+class PedidoSerializer(SerializacionMedidaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
+    # Para mostrar el nombre del cliente
+    cliente_nombre = serializers.ReadOnlyField(source='cliente.NombreCliente')
+    # Las líneas se leen y se escriben en la misma petición que la cabecera
+    lineas = PedidoLineaSerializer(many=True, allow_empty=False)
 
     class Meta:
         model = Pedido
         fields = '__all__'
-        # fields = ['id_pedido', 'producto', 'producto_descripcion', 'cliente', 'cliente_nombre', 'fecha'] # Ejemplo de campos específicos
+        expandibles = {'cliente': ClienteSerializer} # ?expand=cliente
+        # fields = ['id_pedido', 'cliente', 'cliente_nombre', 'fecha', 'lineas'] # Ejemplo de campos específicos
+
+    @transaction.atomic
+    def create(self, validated_data):
+        lineas = validated_data.pop('lineas')
+        pedido = super().create(validated_data)
+        guardar_lineas_pedido(pedido, lineas)
+        return self._con_lineas(pedido)
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        # PUT sustituye las líneas; un PATCH sin 'lineas' las deja como están
+        lineas = validated_data.pop('lineas', None)
+        pedido = super().update(instance, validated_data)
+        if lineas is not None:
+            guardar_lineas_pedido(pedido, lineas, reemplazar=True)
+        return self._con_lineas(pedido)
+
+    def _con_lineas(self, pedido):
+        # La respuesta lee las líneas guardadas con sus productos en una sola consulta
+        prefetch_related_objects([pedido], Prefetch(
+            'lineas', queryset=PedidoLinea.objects.select_related('producto')))
+        return pedido
 
 # Serializador para el modelo Factura
-class FacturaSerializer(serializers.ModelSerializer):
+class FacturaSerializer(SerializacionMedidaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
     # Para mostrar el nombre del cliente
-    cliente_nombre = serializers.ReadOnlyField(source='cliente.nombre_cliente')
+    cliente_nombre = serializers.ReadOnlyField(source='cliente.NombreCliente')
+    # Sin 'num', el alta toma el siguiente número de la serie (por defecto settings.FACTURAS_SERIE)
+    serie = serializers.CharField(write_only=True, required=False)
 
     class Meta:
         model = Factura
         fields = '__all__'
+        extra_kwargs = {'num': {'required': False}}
+        expandibles = {'cliente': ClienteSerializer} # ?expand=cliente
         # fields = ['num', 'fecha', 'importe', 'cliente', 'cliente_nombre'] # Ejemplo de campos específicos
 
+    def validate(self, attrs):
+        if 'num' in attrs and 'serie' in attrs:
+            raise serializers.ValidationError({'serie': "Indique 'num' o 'serie', no ambos."})
+        return attrs
+
+    def create(self, validated_data):
+        serie = validated_data.pop('serie', settings.FACTURAS_SERIE)
+        if 'num' in validated_data:
+            factura = self.insertar(validated_data)
+            if factura is None:
+                raise serializers.ValidationError({'num': 'Ya existe una factura con el número %s.'
+                                                          % validated_data['num']})
+            return factura
+        # Misma transacción para el número y el alta: si el alta falla, el número no se consume
+        # en una serie sin huecos ni queda reservado para el proceso en una con huecos (ver numeracion.py)
+        with transaction.atomic():
+            while True:
+                try:
+                    validated_data['num'] = siguiente_numero(serie)
+                except NumeracionError as error:
+                    raise serializers.ValidationError({'serie': str(error)})
+                # Un número de la serie ya usado (alta con 'num' explícito, generar_datos) se salta:
+                # la reserva sigue en la transacción y se confirma con el alta del siguiente libre
+                factura = self.insertar(validated_data)
+                if factura is not None:
+                    return factura
+
+    def insertar(self, validated_data):
+        """Alta con validated_data['num']; None si ya existe una factura con ese número."""
+        # UniqueValidator no cubre dos altas simultáneas con el mismo 'num' ni un número de la serie
+        # ya dado a mano: la clave primaria duplicada no debe acabar en un 500
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            if not Factura.objects.filter(pk=validated_data['num']).exists():
+                raise
+            return None
+
+    def update(self, instance, validated_data):
+        validated_data.pop('serie', None)
+        return super().update(instance, validated_data)
+
 # Serializador para el modelo FacturaDetalle
-class FacturaDetalleSerializer(serializers.ModelSerializer):
+class FacturaDetalleSerializer(SerializacionMedidaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
     # Para mostrar la descripción del producto y el número de factura
     producto_descripcion = serializers.ReadOnlyField(source='producto.descripcion')
     factura_numero = serializers.ReadOnlyField(source='factura.num')
@@ -55,4 +230,102 @@ class FacturaDetalleSerializer(serializers.ModelSerializer):
     class Meta:
         model = FacturaDetalle
         fields = '__all__'
+        expandibles = {'factura': FacturaSerializer, 'producto': ProductoSerializer} # ?expand=producto
         # fields = ['ID_Detalle', 'factura', 'factura_numero', 'producto', 'producto_descripcion', 'cantidad', 'precio_unitario'] # Ejemplo de campos específicos
+
+# Serializador para el resumen mensual de ventas por cliente (solo lectura)
+class VentaClienteMesSerializer(SerializacionMedidaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
+    cliente_nombre = serializers.ReadOnlyField(source='cliente.NombreCliente')
+
+    class Meta:
+        model = VentaClienteMes
+        fields = '__all__'
+        expandibles = {'cliente': ClienteSerializer}
+
+# Serializador para el resumen mensual de ventas por producto (solo lectura)
+class VentaProductoMesSerializer(SerializacionMedidaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
+    producto_descripcion = serializers.ReadOnlyField(source='producto.descripcion')
+
+    class Meta:
+        model = VentaProductoMes
+        fields = '__all__'
+        expandibles = {'producto': ProductoSerializer}
+
+# Lista de líneas de factura: resuelve todos los productos con una única consulta
+class FacturaDetalleLineaListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        self.child.productos = Producto.objects.in_bulk(codigos_de_producto(data))
+        self.child.vistos = set()
+        return super().to_internal_value(data)
+
+# Línea de factura para la carga masiva
+class FacturaDetalleLineaSerializer(serializers.Serializer):
+    producto = serializers.IntegerField()
+    cantidad = serializers.IntegerField(min_value=1)
+    # Si no se indica, se toma el precio actual del producto
+    precio_unitario = serializers.DecimalField(max_digits=6, decimal_places=2, required=False)
+
+    class Meta:
+        list_serializer_class = FacturaDetalleLineaListSerializer
+
+    def validate_producto(self, codigo):
+        productos = getattr(self, 'productos', None)
+        if productos is None:
+            productos = Producto.objects.in_bulk([codigo])
+        if codigo not in productos:
+            raise serializers.ValidationError('Producto %s no existe.' % codigo)
+        vistos = getattr(self, 'vistos', set())
+        if codigo in vistos:
+            raise serializers.ValidationError('Producto %s repetido en la factura.' % codigo)
+        vistos.add(codigo)
+        return productos[codigo]
+
+    def validate(self, attrs):
+        attrs.setdefault('precio_unitario', attrs['producto'].precio)
+        return attrs
+
+# Serializador para crear/actualizar en bloque las líneas de una factura
+class FacturaDetalleBulkSerializer(serializers.Serializer):
+    factura = serializers.PrimaryKeyRelatedField(queryset=Factura.objects.all())
+    detalles = FacturaDetalleLineaSerializer(many=True, allow_empty=False)
+
+    def create(self, validated_data):
+        factura = validated_data['factura']
+        creadas, actualizadas = guardar_detalles_factura(factura, validated_data['detalles'])
+        self.resultado = {'creadas': creadas, 'actualizadas': actualizadas}
+        return factura
+
+    def to_representation(self, factura):
+        return {
+            'factura': factura.num,
+            'importe': serializers.DecimalField(max_digits=9, decimal_places=2)
+                       .to_representation(factura.importe),
+            **getattr(self, 'resultado', {}),
+        }
+
+# Serializador para Trabajo: al encolar solo se indican el tipo y sus parámetros (ver trabajos.py)
+class TrabajoSerializer(serializers.ModelSerializer):
+    # URL de descarga del fichero generado, cuando lo hay
+    descarga = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Trabajo
+        fields = ['id', 'tipo', 'parametros', 'estado', 'creado', 'iniciado', 'terminado', 'resultado',
+                  'descarga', 'error']
+        read_only_fields = ['estado', 'creado', 'iniciado', 'terminado', 'resultado', 'error']
+
+    def get_descarga(self, trabajo):
+        if trabajo.estado != Trabajo.TERMINADO or not trabajo.fichero:
+            return None
+        return reverse('trabajo-descarga', args=[trabajo.pk], request=self.context.get('request'))
+
+    def validate(self, attrs):
+        from .trabajos import TAREAS  # trabajos.py usa los serializadores de este módulo
+        if attrs['tipo'] not in TAREAS:
+            raise serializers.ValidationError({'tipo': 'Tipos admitidos: %s.' % ', '.join(sorted(TAREAS))})
+        parametros = TAREAS[attrs['tipo']][1](data=attrs.get('parametros', {}))
+        if not parametros.is_valid():
+            raise serializers.ValidationError({'parametros': parametros.errors})
+        # Normalizados (valores por defecto, decimales como texto) tal como los recibe la tarea
+        attrs['parametros'] = dict(parametros.data)
+        return attrs
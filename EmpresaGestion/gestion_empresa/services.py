@@ -0,0 +1,257 @@
+# gestion_empresa/services.py
+
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from . import cache, cambios, rollups
+from .models import Cambio, Factura, FacturaDetalle, Pedido, PedidoLinea, Producto, VentaProductoMes
+
+
+def calcular_importe(factura):
+    """Suma cantidad * precio_unitario de todas las líneas de la factura en la BD."""
+    total = FacturaDetalle.objects.filter(factura=factura).aggregate(
+        total=Sum(rollups.IMPORTE_LINEA)
+    )['total']
+    return (total or Decimal('0')).quantize(Decimal('0.01'))
+
+
+@transaction.atomic
+def guardar_detalles_factura(factura, lineas):
+    """
+    Crea o actualiza en bloque las líneas de una factura.
+
+    'lineas' es una lista de diccionarios ya validados con 'producto'
+    (instancia), 'cantidad' y 'precio_unitario'. Las líneas cuyo producto
+    ya existe en la factura se actualizan (unique_together factura/producto);
+    el resto se insertan. El importe de la factura se recalcula una sola vez.
+    Deja el nuevo importe en la instancia recibida y devuelve (creadas, actualizadas).
+    """
+    # Bloquea la cabecera para serializar importaciones concurrentes de la misma factura
+    Factura.objects.select_for_update().filter(pk=factura.pk).values_list('pk').get()
+    existentes = {
+        detalle.producto_id: detalle
+        for detalle in FacturaDetalle.objects.filter(
+            factura=factura, producto__in=[linea['producto'] for linea in lineas]
+        )
+    }
+
+    nuevas, modificadas, anteriores = [], [], []
+    ahora = timezone.now()  # bulk_update no aplica auto_now
+    for linea in lineas:
+        detalle = existentes.get(linea['producto'].pk)
+        if detalle is None:
+            nuevas.append(FacturaDetalle(factura=factura, producto=linea['producto'],
+                                         cantidad=linea['cantidad'],
+                                         precio_unitario=linea['precio_unitario']))
+        else:
+            anteriores.append((detalle.producto_id, detalle.cantidad, detalle.precio_unitario))
+            detalle.cantidad = linea['cantidad']
+            detalle.precio_unitario = linea['precio_unitario']
+            detalle.updated_at = ahora
+            modificadas.append(detalle)
+
+    FacturaDetalle.objects.bulk_create(nuevas, batch_size=500)
+    FacturaDetalle.objects.bulk_update(modificadas, ['cantidad', 'precio_unitario', 'updated_at'],
+                                       batch_size=500)
+    # bulk_create/bulk_update no envían señales: los resúmenes de ventas se actualizan aquí
+    rollups.lineas_guardadas_en_bloque(factura, anteriores, nuevas + modificadas)
+    # ... ni escriben el registro de cambios
+    claves_nuevas = [detalle.pk for detalle in nuevas]
+    if None in claves_nuevas:  # El backend no devuelve las claves insertadas (MySQL)
+        claves_nuevas = FacturaDetalle.objects.filter(
+            factura=factura, producto__in=[detalle.producto_id for detalle in nuevas]).values_list('pk', flat=True)
+    recurso = cambios.RECURSOS[FacturaDetalle]
+    cambios.registrar(recurso, claves_nuevas, Cambio.ALTA)
+    cambios.registrar(recurso, [detalle.pk for detalle in modificadas], Cambio.MODIFICACION)
+
+    factura.importe = calcular_importe(factura)
+    factura.save(update_fields=['importe', 'updated_at'])
+    return len(nuevas), len(modificadas)
+
+
+@transaction.atomic
+def guardar_lineas_pedido(pedido, lineas, reemplazar=False):
+    """
+    Guarda en bloque las líneas de un pedido.
+
+    'lineas' es una lista de diccionarios ya validados con 'producto_id' y
+    'cantidad'. Las líneas de productos que ya están en el pedido cambian de
+    cantidad (unique pedido/producto) y el resto se insertan; con 'reemplazar'
+    se borran además las líneas de productos que no aparecen. Devuelve
+    (creadas, actualizadas, borradas).
+    """
+    existentes = {linea.producto_id: linea for linea in PedidoLinea.objects.filter(pedido=pedido)}
+    nuevas, modificadas = [], []
+    ahora = timezone.now()  # bulk_update no aplica auto_now
+    for datos in lineas:
+        linea = existentes.pop(datos['producto_id'], None)
+        if linea is None:
+            nuevas.append(PedidoLinea(pedido=pedido, producto_id=datos['producto_id'],
+                                      cantidad=datos['cantidad']))
+        elif linea.cantidad != datos['cantidad']:
+            linea.cantidad = datos['cantidad']
+            linea.updated_at = ahora
+            modificadas.append(linea)
+
+    PedidoLinea.objects.bulk_create(nuevas, batch_size=500)
+    PedidoLinea.objects.bulk_update(modificadas, ['cantidad', 'updated_at'], batch_size=500)
+    borradas = 0
+    if reemplazar and existentes:
+        borradas, _ = PedidoLinea.objects.filter(pk__in=[linea.pk for linea in existentes.values()]).delete()
+    if nuevas or modificadas:
+        # bulk_create/bulk_update no envían señales: el pedido, que incluye sus líneas, cambia
+        cambios.registrar(cambios.DEPENDIENTES[PedidoLinea][0], [pedido.pk], Cambio.MODIFICACION)
+    return len(nuevas), len(modificadas), borradas
+
+
+def borrar_sin_senales(queryset):
+    """
+    DELETE directo del queryset, sin cargar los objetos, sin cascada y sin
+    señales: quien lo llama mantiene resúmenes, registro de cambios y caché.
+    Devuelve las filas borradas.
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def _borrar_por_bloques(queryset, tamano_bloque, antes_de_borrar, despues_de_borrar=None):
+    # Cada bloque de claves se lee, se procesa y se borra en su propia transacción
+    pendientes = queryset.order_by('pk').values_list('pk', flat=True)
+    total = 0
+    while True:
+        with transaction.atomic():
+            claves = list(pendientes[:tamano_bloque])
+            if not claves:
+                return total
+            bloque = queryset.model.objects.filter(pk__in=claves)
+            afectados = antes_de_borrar(bloque)
+            total += borrar_sin_senales(bloque)
+            if despues_de_borrar:
+                despues_de_borrar(claves, afectados)
+
+
+def _antes_de_borrar_detalles(detalles):
+    rollups.antes_de_borrar_lineas(detalles)
+    return set(detalles.values_list('factura_id', flat=True))
+
+
+def _despues_de_borrar_detalles(claves, facturas):
+    # Como en la carga en bloque, el importe de cada factura afectada se recalcula una vez
+    totales = dict(FacturaDetalle.objects.filter(factura__in=facturas).values('factura')
+                   .annotate(total=Sum(rollups.IMPORTE_LINEA)).values_list('factura', 'total').order_by())
+    ahora = timezone.now()
+    modificadas = list(Factura.objects.filter(pk__in=facturas).only('pk'))
+    for factura in modificadas:
+        factura.importe = (totales.get(factura.pk) or Decimal('0')).quantize(Decimal('0.01'))
+        factura.updated_at = ahora
+    Factura.objects.bulk_update(modificadas, ['importe', 'updated_at'], batch_size=500)
+    cambios.registrar(cambios.RECURSOS[FacturaDetalle], claves, Cambio.BAJA)
+    cambios.registrar(cambios.RECURSOS[Factura], [factura.pk for factura in modificadas], Cambio.MODIFICACION)
+
+
+def _despues_de_borrar_lineas_pedido(claves, pedidos):
+    # El pedido incluye sus líneas en la API: cambia su representación y sus validadores
+    Pedido.objects.filter(pk__in=pedidos).update(updated_at=timezone.now())
+    cambios.registrar(cambios.DEPENDIENTES[PedidoLinea][0], sorted(pedidos), Cambio.MODIFICACION)
+
+
+def borrar_proveedor_por_bloques(proveedor, tamano_bloque=1000):
+    """
+    Borra un proveedor con sus productos y lo que depende de ellos (líneas
+    de factura y de pedido, resúmenes de ventas por producto) por bloques
+    de 'tamano_bloque' filas, cada uno en su propia transacción: la memoria
+    y la duración de los bloqueos no dependen del tamaño del proveedor,
+    mientras que el borrado en cascada de Django carga todos los objetos
+    dependientes. Si se interrumpe, repetirlo continúa donde quedó.
+
+    Los resúmenes de ventas, el registro de cambios y la caché quedan como
+    tras el borrado normal; además se recalcula el importe de las facturas
+    que pierden líneas. Devuelve {modelo: filas borradas}.
+    """
+    borrados = Counter()
+    productos = Producto.objects.filter(id_proveedor=proveedor).order_by('pk').values_list('pk', flat=True)
+    while claves := list(productos[:tamano_bloque]):
+        borrados['facturas_detalle'] += _borrar_por_bloques(
+            FacturaDetalle.objects.filter(producto__in=claves), tamano_bloque,
+            _antes_de_borrar_detalles, _despues_de_borrar_detalles)
+        borrados['pedidos_linea'] += _borrar_por_bloques(
+            PedidoLinea.objects.filter(producto__in=claves), tamano_bloque,
+            lambda lineas: set(lineas.values_list('pedido_id', flat=True)), _despues_de_borrar_lineas_pedido)
+        with transaction.atomic():
+            # Sin líneas que los referencien, los productos se borran sin cascada
+            rollups.antes_de_borrar_productos(claves)
+            borrados['ventas_producto_mes'] += borrar_sin_senales(VentaProductoMes.objects.filter(producto__in=claves))
+            borrados['productos'] += borrar_sin_senales(Producto.objects.filter(pk__in=claves))
+            cambios.registrar(cambios.RECURSOS[Producto], claves, Cambio.BAJA)
+            cache.invalidar(cambios.RECURSOS[Producto], claves)
+    # Sin productos: el borrado normal envía las señales del proveedor (caché y registro de cambios)
+    proveedor.delete()
+    borrados['proveedores'] += 1
+    return dict(borrados)
+
+
+def _por_bloques_de_claves(filas, tamano_bloque):
+    # Bloques 'pk > último ORDER BY pk LIMIT n' de un values_list('pk', ...) ordenado por clave
+    ultimo = None
+    while bloque := list((filas if ultimo is None else filas.filter(pk__gt=ultimo))[:tamano_bloque]):
+        yield bloque
+        ultimo = bloque[-1][0]
+
+
+def recalcular_importes(tamano_bloque=1000):
+    """
+    Recalcula Factura.importe (suma de cantidad * precio_unitario de sus
+    líneas) de todas las facturas, por bloques de 'tamano_bloque' facturas en
+    transacciones independientes. Solo se escriben, y se registran como
+    modificadas, las facturas cuyo importe cambia. Devuelve (revisadas, corregidas).
+    """
+    revisadas = corregidas = 0
+    for bloque in _por_bloques_de_claves(Factura.objects.order_by('pk').values_list('pk', 'importe'),
+                                         tamano_bloque):
+        with transaction.atomic():
+            totales = dict(FacturaDetalle.objects.filter(factura__in=[pk for pk, _ in bloque]).values('factura')
+                           .annotate(total=Sum(rollups.IMPORTE_LINEA)).values_list('factura', 'total').order_by())
+            ahora = timezone.now()
+            modificadas = []
+            for pk, importe in bloque:
+                nuevo = Decimal(totales.get(pk) or 0).quantize(Decimal('0.01'))
+                if nuevo != importe:
+                    modificadas.append(Factura(pk=pk, importe=nuevo, updated_at=ahora))
+            Factura.objects.bulk_update(modificadas, ['importe', 'updated_at'], batch_size=500)
+            cambios.registrar(cambios.RECURSOS[Factura], [factura.pk for factura in modificadas],
+                              Cambio.MODIFICACION)
+        revisadas += len(bloque)
+        corregidas += len(modificadas)
+    return revisadas, corregidas
+
+
+def cambiar_precios(porcentaje, proveedor=None, tamano_bloque=1000):
+    """
+    Cambia un 'porcentaje' (negativo para bajar) el precio de todos los
+    productos, o de los de un proveedor, redondeado a céntimos: una UPDATE
+    por bloque de 'tamano_bloque' productos, cada una en su transacción, con
+    el registro de cambios y la caché de productos al día. Las facturas ya
+    emitidas no cambian (guardan su precio_unitario). Devuelve los productos
+    modificados; ValueError si algún precio no cabe en el campo.
+    """
+    factor = 1 + Decimal(porcentaje) / 100
+    productos = Producto.objects.all()
+    if proveedor is not None:
+        productos = productos.filter(id_proveedor=proveedor)
+    maximo = Decimal('9999.99')  # DecimalField(max_digits=6, decimal_places=2)
+    if factor > 1 and productos.filter(precio__gt=maximo / factor).exists():
+        raise ValueError('Con un cambio del %s%% algún precio superaría %s.' % (porcentaje, maximo))
+    total = 0
+    for bloque in _por_bloques_de_claves(productos.order_by('pk').values_list('pk'), tamano_bloque):
+        bloque = [pk for pk, in bloque]
+        with transaction.atomic():
+            Producto.objects.filter(pk__in=bloque).update(precio=Round(F('precio') * factor, 2),
+                                                          updated_at=timezone.now())
+            cambios.registrar(cambios.RECURSOS[Producto], bloque, Cambio.MODIFICACION)
+            cache.invalidar(cambios.RECURSOS[Producto], bloque)
+        total += len(bloque)
+    return total
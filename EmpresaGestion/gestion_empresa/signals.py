@@ -0,0 +1,96 @@
+# gestion_empresa/signals.py
+
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cache, cambios, rollups
+from .middleware import medir_consulta
+from .models import Cliente, Factura, FacturaDetalle, Producto, Proveedor
+
+
+# Resúmenes de ventas: líneas de factura
+@receiver(pre_save, sender=FacturaDetalle)
+def detalle_pre_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rollups.antes_de_guardar_linea(instance)
+
+@receiver(post_save, sender=FacturaDetalle)
+def detalle_post_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rollups.despues_de_guardar_linea(instance)
+
+@receiver(post_delete, sender=FacturaDetalle)
+def detalle_post_delete(sender, instance, origin=None, **kwargs):
+    rollups.despues_de_borrar_linea(instance, origin=origin)
+
+
+# Resúmenes de ventas: cambios de cliente/fecha y borrado de facturas
+@receiver(pre_save, sender=Factura)
+def factura_pre_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        rollups.antes_de_guardar_factura(instance, update_fields=update_fields)
+
+@receiver(post_save, sender=Factura)
+def factura_post_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rollups.despues_de_guardar_factura(instance)
+
+@receiver(pre_delete, sender=Factura)
+def factura_pre_delete(sender, instance, origin=None, **kwargs):
+    rollups.antes_de_borrar_factura(instance, origin=origin)
+
+
+# Resúmenes de ventas: borrado en cascada de las líneas de un producto
+@receiver(pre_delete, sender=Producto)
+def producto_pre_delete(sender, instance, origin=None, **kwargs):
+    rollups.antes_de_borrar_producto(instance, origin=origin)
+
+
+# Resúmenes de ventas: las ventas archivadas de un cliente que se borra
+@receiver(pre_delete, sender=Cliente)
+def cliente_pre_delete(sender, instance, **kwargs):
+    rollups.antes_de_borrar_cliente(instance)
+
+
+# Caché de la API: Producto
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def producto_invalidar_cache(sender, instance, **kwargs):
+    cache.invalidar('productos', [instance.pk])
+
+
+# Caché de la API: Proveedor, y sus productos (muestran 'id_proveedor_razon_social')
+@receiver(post_save, sender=Proveedor)
+@receiver(post_delete, sender=Proveedor)
+def proveedor_invalidar_cache(sender, instance, **kwargs):
+    cache.invalidar('proveedores', [instance.pk])
+    productos = list(Producto.objects.filter(id_proveedor=instance.pk).values_list('pk', flat=True))
+    cache.invalidar('productos', productos)
+
+
+# Registro de cambios para la sincronización incremental (ver cambios.py)
+def comparar_denormalizados(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    if not raw:
+        cambios.antes_de_guardar(instance, using, update_fields=update_fields)
+
+def registrar_guardado(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        cambios.guardado(instance, created)
+
+def registrar_borrado(sender, instance, **kwargs):
+    cambios.borrado(instance)
+
+for modelo in [*cambios.RECURSOS, *cambios.DEPENDIENTES]:
+    post_save.connect(registrar_guardado, sender=modelo, dispatch_uid='cambios_%s' % modelo.__name__)
+    post_delete.connect(registrar_borrado, sender=modelo, dispatch_uid='cambios_%s' % modelo.__name__)
+for modelo in cambios.DENORMALIZADOS:
+    pre_save.connect(comparar_denormalizados, sender=modelo, dispatch_uid='cambios_%s' % modelo.__name__)
+
+
+# Métricas por endpoint: las consultas de cualquier hilo cuentan en la petición en curso (MetricasMiddleware)
+@receiver(connection_created)
+def instrumentar_conexion(sender, connection, **kwargs):
+    # Al principio de la lista: execute_wrapper() quita el último al salir, aunque esta se añada dentro
+    if medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, medir_consulta)
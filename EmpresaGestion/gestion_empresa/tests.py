@@ -1,3 +1,1727 @@
-from django.test import TestCase
+import datetime
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from .models import Cliente, Proveedor, Producto, Pedido, PedidoLinea, Factura, FacturaDetalle
+from .mixins import plan_de_relaciones
+from .serializers import (
+    ProductoSerializer, PedidoSerializer, FacturaSerializer, FacturaDetalleSerializer
+)
+
+
+# Utilidad común: crea un juego de datos relacionado de tamaño 'n'
+def crear_datos(n, inicio=0):
+    proveedor = Proveedor.objects.create(rut=1000 + inicio, razon_social="Proveedor", telefono="600")
+    cliente = Cliente.objects.create(NombreCliente="Cliente %d" % inicio, celular="600")
+    productos = [
+        Producto.objects.create(descripcion="Producto %d" % i, precio=Decimal("1.50"),
+                                id_proveedor=proveedor)
+        for i in range(inicio, inicio + n)
+    ]
+    factura = Factura.objects.create(num=1000 + inicio, fecha=datetime.date(2025, 1, 1),
+                                     importe=Decimal("0"), cliente=cliente)
+    for producto in productos:
+        pedido = Pedido.objects.create(cliente=cliente, fecha=datetime.date(2025, 1, 1))
+        PedidoLinea.objects.create(pedido=pedido, producto=producto, cantidad=3)
+        FacturaDetalle.objects.create(factura=factura, producto=producto, cantidad=2,
+                                      precio_unitario=producto.precio)
+    return cliente, productos, factura
+
+
+class PlanDeRelacionesTests(TestCase):
+    def test_plan_deducido_de_los_source(self):
+        self.assertEqual(plan_de_relaciones(ProductoSerializer), ({"id_proveedor"}, set()))
+        self.assertEqual(plan_de_relaciones(PedidoSerializer), ({"cliente"}, {"lineas", "lineas__producto"}))
+        self.assertEqual(plan_de_relaciones(FacturaSerializer), ({"cliente"}, set()))
+        self.assertEqual(plan_de_relaciones(FacturaDetalleSerializer),
+                         ({"producto", "factura"}, set()))
+
+    def test_plan_explicito_por_viewset(self):
+        from .views import FacturaDetalleViewSet
+
+        class SinJoinViewSet(FacturaDetalleViewSet):
+            select_related_fields = ["producto"]
+            prefetch_related_fields = []
+
+        self.assertEqual(SinJoinViewSet().get_relation_plan(), (["producto"], []))
+        self.assertEqual(FacturaDetalleViewSet().get_relation_plan(), (["factura", "producto"], []))
+
+
+class ConsultasPorPaginaTests(TestCase):
+    """El número de consultas por página no depende de cuántas filas contiene."""
+    endpoints = ["/api/productos/", "/api/pedidos/", "/api/facturas/", "/api/facturas-detalle/"]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def contar_consultas(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_consultas_constantes(self):
+        crear_datos(1)
+        pocas = {url: self.contar_consultas(url) for url in self.endpoints}
+        crear_datos(9, inicio=100)
+        muchas = {url: self.contar_consultas(url) for url in self.endpoints}
+        self.assertEqual(pocas, muchas)
+        # Productos: validadores (ETag), COUNT de la paginación y una SELECT con los JOIN.
+        # El resto usa paginación por clave: validadores de la página y una SELECT, sin COUNT;
+        # los pedidos, las claves de la página antes de los validadores (que incluyen las líneas)
+        # y una SELECT más para las líneas de la página.
+        self.assertEqual(muchas, {"/api/productos/": 3, "/api/pedidos/": 4,
+                                  "/api/facturas/": 2, "/api/facturas-detalle/": 2})
+
+    def test_campos_relacionados_en_la_respuesta(self):
+        cliente, _, factura = crear_datos(1)
+        datos = self.client.get("/api/facturas/").json()["results"][0]
+        self.assertEqual(datos["cliente_nombre"], cliente.NombreCliente)
+        datos = self.client.get("/api/facturas-detalle/").json()["results"][0]
+        self.assertEqual(datos["factura_numero"], factura.num)
+        self.assertEqual(datos["producto_descripcion"], "Producto 0")
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cliente = Cliente.objects.create(NombreCliente="Cliente", celular="600")
+        # Fechas repetidas para comprobar el desempate por clave primaria
+        for i in range(25):
+            Pedido.objects.create(cliente=cliente, fecha=datetime.date(2025, 1, 1 + i % 3))
+        self.esperados = list(Pedido.objects.order_by("fecha", "pk").values_list("pk", flat=True))
+
+    def recorrer(self, url, clave):
+        vistos, paginas = [], []
+        while url:
+            datos = self.client.get(url).json()
+            self.assertNotIn("count", datos)
+            paginas.append(url)
+            vistos.extend(fila["id_pedido"] for fila in datos["results"])
+            url = datos[clave]
+        return vistos, paginas
+
+    def test_recorrido_completo_hacia_delante_y_atras(self):
+        vistos, paginas = self.recorrer("/api/pedidos/", "next")
+        self.assertEqual(vistos, self.esperados)
+        self.assertEqual(len(paginas), 3)
+
+        # Desde la última página, hacia atrás, se recorren las mismas filas
+        ultima = self.client.get(paginas[-1]).json()
+        anteriores, _ = self.recorrer(ultima["previous"], "previous")
+        ultimos = [fila["id_pedido"] for fila in ultima["results"]]
+        self.assertEqual(sorted(anteriores + ultimos), sorted(self.esperados))
+
+    def test_consultas_acotadas_en_paginas_profundas(self):
+        _, paginas = self.recorrer("/api/pedidos/", "next")
+        # Claves de la página (LIMIT), sus validadores con los de las líneas, la propia página y sus líneas
+        with self.assertNumQueries(4):
+            self.client.get(paginas[-1])
+
+    def test_modo_clasico_por_numero_de_pagina(self):
+        datos = self.client.get("/api/pedidos/?page=2").json()
+        self.assertEqual(datos["count"], 25)
+        self.assertEqual([fila["id_pedido"] for fila in datos["results"]], self.esperados[10:20])
+
+    def test_cursor_no_valido(self):
+        self.assertEqual(self.client.get("/api/pedidos/?cursor=basura").status_code, 404)
+
+
+class FacturaDetalleBulkTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.cliente, self.productos, self.factura = crear_datos(5)
+        FacturaDetalle.objects.all().delete()
+
+    def test_crea_y_actualiza_en_bloque(self):
+        FacturaDetalle.objects.create(factura=self.factura, producto=self.productos[0],
+                                      cantidad=1, precio_unitario=Decimal("1.00"))
+        detalles = [{"producto": p.codigo, "cantidad": 3} for p in self.productos]
+        detalles[0]["precio_unitario"] = "2.00"
+
+        # Consultas constantes: factura, productos, bloqueo, existentes, INSERT, UPDATE,
+        # resúmenes de ventas (cliente y productos en bloque), registro de cambios (altas y
+        # modificaciones de líneas, modificación de la factura), SUM y UPDATE del importe
+        with self.assertNumQueries(18):
+            respuesta = self.client.post("/api/facturas-detalle/bulk/",
+                                         {"factura": self.factura.num, "detalles": detalles},
+                                         format="json")
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        self.assertEqual(respuesta.json(), {"factura": self.factura.num, "importe": "24.00",
+                                            "creadas": 4, "actualizadas": 1})
+        self.assertEqual(FacturaDetalle.objects.filter(factura=self.factura).count(), 5)
+        self.factura.refresh_from_db()
+        self.assertEqual(self.factura.importe, Decimal("24.00"))
+
+    def test_errores_por_linea(self):
+        detalles = [
+            {"producto": self.productos[0].codigo, "cantidad": 1},
+            {"producto": 999999, "cantidad": 1},
+            {"producto": self.productos[0].codigo, "cantidad": 1},
+            {"producto": self.productos[1].codigo, "cantidad": "x"},
+            {"producto": self.productos[2].codigo, "cantidad": 0},
+            {"producto": self.productos[3].codigo, "cantidad": -2},
+        ]
+        respuesta = self.client.post("/api/facturas-detalle/bulk/",
+                                     {"factura": self.factura.num, "detalles": detalles},
+                                     format="json")
+        self.assertEqual(respuesta.status_code, 400)
+        # Todas las líneas erróneas se informan a la vez, indexadas por posición
+        errores = respuesta.json()["detalles"]
+        self.assertEqual(sorted(errores), ["1", "2", "3", "4", "5"])
+        self.assertIn("no existe", errores["1"]["producto"][0])
+        self.assertIn("repetido", errores["2"]["producto"][0])
+        self.assertIn("cantidad", errores["3"])
+        self.assertEqual((list(errores["4"]), list(errores["5"])), (["cantidad"], ["cantidad"]))
+        self.assertFalse(FacturaDetalle.objects.exists())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        crear_datos(5)
+
+    def leer(self, respuesta):
+        return b"".join(respuesta.streaming_content).decode()
+
+    def test_export_ndjson_por_bloques(self):
+        import json
+        from unittest import mock
+        from .views import ProductoViewSet
+
+        # Bloques de 2 filas: 5 productos → 3 consultas, sin COUNT ni OFFSET
+        with mock.patch.object(ProductoViewSet, "export_chunk_size", 2):
+            respuesta = self.client.get("/api/productos/export/")
+            with self.assertNumQueries(3):
+                lineas = self.leer(respuesta).splitlines()
+        self.assertEqual(respuesta["Content-Type"], "application/x-ndjson")
+        filas = [json.loads(linea) for linea in lineas]
+        self.assertEqual([fila["descripcion"] for fila in filas],
+                         ["Producto %d" % i for i in range(5)])
+        # Mismas claves y valores que la API paginada
+        api = self.client.get("/api/productos/").json()["results"][0]
+        self.assertEqual(filas[0], api)
+
+    def test_export_csv(self):
+        respuesta = self.client.get("/api/facturas-detalle/export/", {"formato": "csv"})
+        lineas = self.leer(respuesta).splitlines()
+        self.assertEqual(lineas[0], "id,producto_descripcion,factura_numero,cantidad,precio_unitario,"
+                                    "updated_at,factura,producto")
+        self.assertEqual(len(lineas), 6)
+
+    def test_formato_no_valido(self):
+        self.assertEqual(self.client.get("/api/pedidos/export/", {"formato": "xml"}).status_code, 400)
+
+
+class ResumenVentasTests(TestCase):
+    """Los resúmenes incrementales coinciden siempre con una reconstrucción completa."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.cliente, self.productos, self.factura = crear_datos(3)
+
+    def resumen(self):
+        from .models import VentaClienteMes, VentaProductoMes
+        return (
+            sorted(VentaClienteMes.objects.exclude(cantidad=0)
+                   .values_list("cliente_id", "mes", "cantidad", "importe")),
+            sorted(VentaProductoMes.objects.exclude(cantidad=0)
+                   .values_list("producto_id", "mes", "cantidad", "importe")),
+        )
+
+    def assertCoincideConReconstruccion(self):
+        from . import rollups
+        incremental = self.resumen()
+        rollups.reconstruir()
+        self.assertEqual(incremental, self.resumen())
+        return incremental
+
+    def test_altas_modificaciones_y_bajas_de_lineas(self):
+        clientes, productos = self.assertCoincideConReconstruccion()
+        self.assertEqual(clientes, [(self.cliente.pk, datetime.date(2025, 1, 1), 6, Decimal("9.00"))])
+        self.assertEqual(len(productos), 3)
+
+        detalle = FacturaDetalle.objects.first()
+        detalle.cantidad = 10
+        detalle.save()
+        self.assertCoincideConReconstruccion()
+        detalle.delete()
+        self.assertCoincideConReconstruccion()
+
+    def test_factura_cambia_de_mes_y_cliente(self):
+        otro = Cliente.objects.create(NombreCliente="Otro", celular="1")
+        self.factura.fecha = datetime.date(2025, 3, 15)
+        self.factura.cliente = otro
+        self.factura.save()
+        clientes, _ = self.assertCoincideConReconstruccion()
+        self.assertEqual(clientes, [(otro.pk, datetime.date(2025, 3, 1), 6, Decimal("9.00"))])
+
+    def test_borrados_en_cascada(self):
+        crear_datos(2, inicio=50)
+        self.productos[0].delete()
+        self.assertCoincideConReconstruccion()
+        self.factura.delete()
+        self.assertCoincideConReconstruccion()
+        Proveedor.objects.all().delete()
+        self.assertEqual(self.assertCoincideConReconstruccion(), ([], []))
+
+    def test_carga_en_bloque(self):
+        detalles = [{"producto": p.codigo, "cantidad": 7} for p in self.productos]
+        self.client.post("/api/facturas-detalle/bulk/",
+                         {"factura": self.factura.num, "detalles": detalles}, format="json")
+        clientes, _ = self.assertCoincideConReconstruccion()
+        self.assertEqual(clientes[0][2], 21)
+
+    def test_api_lectura_por_cliente_y_rango(self):
+        url = "/api/ventas-cliente-mes/?cliente=%d&desde=2025-01&hasta=2025-12" % self.cliente.pk
+        datos = self.client.get(url).json()["results"]
+        self.assertEqual(datos[0]["importe"], "9.00")
+        self.assertEqual(datos[0]["cliente_nombre"], self.cliente.NombreCliente)
+        self.assertEqual(self.client.get("/api/ventas-producto-mes/?desde=2025-02").json()["results"], [])
+        self.assertEqual(self.client.post("/api/ventas-producto-mes/", {}).status_code, 405)
+
+
+class CacheApiTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.cliente, self.productos, _ = crear_datos(2)
+        self.proveedor = self.productos[0].id_proveedor
+
+    def test_detalle_y_listado_desde_cache(self):
+        url = "/api/productos/%d/" % self.productos[0].pk
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta["X-Cache"], "HIT")
+        self.assertEqual(respuesta.json()["descripcion"], "Producto 0")
+
+        self.client.get("/api/productos/")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/productos/")["X-Cache"], "HIT")
+
+        # Un 304 servido desde la caché tampoco consulta la BD
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        estadisticas = self.client.get("/api/cache/estadisticas/").json()["productos"]
+        self.assertEqual((estadisticas["hits"], estadisticas["misses"]), (4, 2))
+
+    def test_invalidacion_al_guardar_y_borrar(self):
+        url = "/api/productos/%d/" % self.productos[0].pk
+        self.client.get(url)
+        self.client.get("/api/productos/")
+        self.client.patch(url, {"descripcion": "Nueva"}, format="json")
+        self.assertEqual(self.client.get(url).json()["descripcion"], "Nueva")
+        self.assertEqual(self.client.get("/api/productos/").json()["results"][0]["descripcion"], "Nueva")
+
+        self.productos[1].delete()
+        self.assertEqual(self.client.get("/api/productos/").json()["count"], 1)
+
+    def test_cambio_de_proveedor_invalida_sus_productos(self):
+        url = "/api/productos/%d/" % self.productos[0].pk
+        self.client.get(url)
+        self.client.get("/api/proveedores/%d/" % self.proveedor.pk)
+        self.proveedor.razon_social = "Renombrado"
+        self.proveedor.save()
+        self.assertEqual(self.client.get(url).json()["id_proveedor_razon_social"], "Renombrado")
+        self.assertEqual(self.client.get("/api/proveedores/%d/" % self.proveedor.pk).json()["razon_social"],
+                         "Renombrado")
+
+        self.proveedor.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get("/api/productos/").json()["count"], 0)
+
+
+class PeticionesCondicionalesTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.cliente, self.productos, self.factura = crear_datos(3)
+
+    def test_listado_304_con_una_consulta(self):
+        respuesta = self.client.get("/api/clientes/")
+        etag = respuesta["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+        # Sin Last-Modified en los listados: la fecha no cambia al borrar una fila
+        self.assertNotIn("Last-Modified", respuesta)
+        with self.assertNumQueries(1):
+            respuesta = self.client.get("/api/clientes/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta["ETag"], etag)
+
+        # Otra página u otros parámetros tienen otro validador
+        self.assertNotEqual(self.client.get("/api/clientes/?page=1")["ETag"], etag)
+
+        # Altas, bajas y modificaciones cambian el validador
+        Cliente.objects.create(NombreCliente="Nuevo", celular="1")
+        self.assertEqual(self.client.get("/api/clientes/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detalle_incluye_relaciones(self):
+        detalle = FacturaDetalle.objects.first()
+        url = "/api/facturas-detalle/%d/" % detalle.pk
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Cambia la descripción del producto, que el detalle muestra: el ETag cambia
+        producto = detalle.producto
+        producto.descripcion = "Otra descripción"
+        producto.save()
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()["producto_descripcion"], "Otra descripción")
+
+    def test_if_modified_since(self):
+        url = "/api/productos/%d/" % self.productos[0].pk
+        ultima = self.client.get(url)["Last-Modified"]
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=ultima).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE="Mon, 01 Jan 2001 00:00:00 GMT").status_code,
+                         200)
+
+    def test_listado_incluye_relaciones_con_prefetch(self):
+        pedido = Pedido.objects.order_by("pk").first()
+        # Página por clave, página por número y detalle
+        rutas = ("/api/pedidos/", "/api/pedidos/?page=1", "/api/pedidos/%d/" % pedido.pk)
+        for cambio in (
+            # La descripción del producto de una línea (lineas__producto__updated_at)
+            lambda: Producto.objects.filter(pk=pedido.lineas.get().producto_id).update(
+                descripcion="Otra", updated_at=datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)),
+            # Una línea más y una línea menos, sin tocar la cabecera
+            lambda: PedidoLinea.objects.create(pedido=pedido, producto=self.productos[1], cantidad=1),
+            lambda: PedidoLinea.objects.filter(pedido=pedido, producto=self.productos[1]).delete(),
+        ):
+            etags = [self.client.get(ruta)["ETag"] for ruta in rutas]
+            for ruta, etag in zip(rutas, etags):
+                self.assertEqual(self.client.get(ruta, HTTP_IF_NONE_MATCH=etag).status_code, 304, ruta)
+            cambio()
+            for ruta, etag in zip(rutas, etags):
+                self.assertEqual(self.client.get(ruta, HTTP_IF_NONE_MATCH=etag).status_code, 200, ruta)
+
+    def test_listado_no_responde_304_por_fecha(self):
+        ultima = self.client.get("/api/productos/%d/" % self.productos[0].pk)["Last-Modified"]
+        Producto.objects.filter(pk=self.productos[2].pk).delete()
+        # La fecha más reciente del listado no cambia con la baja: solo el ETag la detecta
+        self.assertEqual(self.client.get("/api/productos/", HTTP_IF_MODIFIED_SINCE=ultima).status_code, 200)
+
+    def test_detalle_inexistente(self):
+        self.assertEqual(self.client.get("/api/clientes/999999/").status_code, 404)
+
+    def test_carga_en_bloque_actualiza_updated_at(self):
+        etag = self.client.get("/api/facturas/%d/" % self.factura.num)["ETag"]
+        detalles = [{"producto": self.productos[0].codigo, "cantidad": 9}]
+        self.client.post("/api/facturas-detalle/bulk/",
+                         {"factura": self.factura.num, "detalles": detalles}, format="json")
+        self.assertEqual(self.client.get("/api/facturas/%d/" % self.factura.num,
+                                         HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class FiltrosTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.cliente, self.productos, self.factura = crear_datos(3)
+        Cliente.objects.create(NombreCliente="ANA López", celular="1")
+        Cliente.objects.create(NombreCliente="Mariana", celular="1")
+
+    def nombres(self, url):
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return sorted(fila["NombreCliente"] for fila in respuesta.json()["results"])
+
+    def test_prefijo_y_contiene_sin_distinguir_mayusculas(self):
+        self.assertEqual(self.nombres("/api/clientes/?nombre=ana"), ["ANA López"])
+        self.assertEqual(self.nombres("/api/clientes/?nombre_contiene=ANA"), ["ANA López", "Mariana"])
+        self.assertEqual(self.nombres("/api/clientes/?nombre=zz"), [])
+
+    def test_prefijo_con_letras_no_ascii(self):
+        Cliente.objects.create(NombreCliente="Ñandú", celular="1")
+        Cliente.objects.create(NombreCliente="Álvaro", celular="1")
+        self.assertEqual(self.nombres("/api/clientes/?nombre=Ñan"), ["Ñandú"])
+        self.assertEqual(self.nombres("/api/clientes/?nombre=ÁLV"), ["Álvaro"])
+
+    def test_rangos_y_claves_ajenas(self):
+        self.productos[0].precio = Decimal("9.00")
+        self.productos[0].save()
+        datos = self.client.get("/api/productos/?precio_min=5&proveedor=1000").json()
+        self.assertEqual([p["codigo"] for p in datos["results"]], [self.productos[0].pk])
+
+        url = "/api/facturas/?fecha_desde=2025-01-01&fecha_hasta=2025-01-31&cliente=%d" % self.cliente.pk
+        self.assertEqual(len(self.client.get(url).json()["results"]), 1)
+        self.assertEqual(self.client.get("/api/facturas/?fecha_desde=2025-02-01").json()["results"], [])
+
+        url = "/api/facturas-detalle/?producto=%d" % self.productos[1].pk
+        self.assertEqual(len(self.client.get(url).json()["results"]), 1)
+        # Los filtros también se aplican a la exportación
+        lineas = b"".join(self.client.get("/api/productos/export/?search=producto 1").streaming_content)
+        self.assertEqual(len(lineas.splitlines()), 1)
+
+    def test_valores_no_validos(self):
+        respuesta = self.client.get("/api/pedidos/?fecha_desde=ayer&cliente=x")
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(set(respuesta.json()), {"fecha_desde", "cliente"})
+
+    def test_plan_de_consulta_usa_indices(self):
+        from django.db import connection
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from .filters import FiltrosPorParametroBackend
+        from .views import ClienteViewSet, ProductoViewSet, PedidoViewSet, FacturaViewSet, FacturaDetalleViewSet
+
+        if connection.vendor != "sqlite":
+            self.skipTest("EXPLAIN QUERY PLAN es específico de SQLite")
+        casos = [
+            (ClienteViewSet, {"nombre": "ana"}),
+            (ClienteViewSet, {"nombre_contiene": "ana"}),
+            (ProductoViewSet, {"descripcion": "prod"}),
+            (ProductoViewSet, {"search": "prod"}),
+            (ProductoViewSet, {"precio_min": "1", "precio_max": "5"}),
+            (ProductoViewSet, {"proveedor": "1000"}),
+            (PedidoViewSet, {"fecha_desde": "2025-01-01", "fecha_hasta": "2025-01-31"}),
+            (PedidoViewSet, {"cliente": "1"}),
+            (PedidoViewSet, {"producto": "1"}),
+            (FacturaViewSet, {"fecha_desde": "2025-01-01"}),
+            (FacturaViewSet, {"cliente": "1"}),
+            (FacturaDetalleViewSet, {"producto": "1"}),
+        ]
+        factory = APIRequestFactory()
+        for vista, params in casos:
+            with self.subTest(vista=vista.__name__, params=params):
+                request = Request(factory.get("/", params))
+                queryset = FiltrosPorParametroBackend().filter_queryset(
+                    request, vista.queryset.model.objects.all(), vista())
+                plan = queryset.order_by().explain()
+                tabla = vista.queryset.model._meta.db_table
+                # Ninguna lectura de la tabla principal sin índice ("SCAN Tabla" a secas)
+                self.assertIn("INDEX", plan)
+                self.assertNotRegex(plan, r"SCAN %s\s*$" % tabla)
+                self.assertNotRegex(plan, r"SCAN %s\n" % tabla)
+
+
+class LecturaAsincronaTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.cliente, self.productos, self.factura = crear_datos(12)
+
+    async def test_listado_y_detalle_iguales_a_la_ruta_sincrona(self):
+        from asgiref.sync import sync_to_async
+        for recurso in ("pedidos", "facturas", "facturas-detalle"):
+            sincrono = await sync_to_async(self.client.get)("/api/%s/" % recurso)
+            asincrono = await self.async_client.get("/api/async/%s/" % recurso)
+            self.assertEqual(asincrono.status_code, 200)
+            self.assertEqual(asincrono.json()["results"], sincrono.json()["results"])
+
+        detalle = await FacturaDetalle.objects.afirst()
+        sincrono = await sync_to_async(self.client.get)("/api/facturas-detalle/%d/" % detalle.pk)
+        asincrono = await self.async_client.get("/api/async/facturas-detalle/%d/" % detalle.pk)
+        self.assertEqual(asincrono.content, sincrono.content)
+
+    async def test_recorrido_por_cursor_y_filtros(self):
+        vistos = []
+        url = "/api/async/productos/?precio_max=10"
+        while url:
+            datos = (await self.async_client.get(url)).json()
+            vistos += [p["codigo"] for p in datos["results"]]
+            url = datos["next"]
+        self.assertEqual(vistos, [p.pk for p in self.productos])
+
+    async def test_errores(self):
+        respuesta = await self.async_client.get("/api/async/clientes/999999/")
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertIn("detail", respuesta.json())
+        respuesta = await self.async_client.get("/api/async/pedidos/?fecha_desde=ayer")
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn("fecha_desde", respuesta.json())
+        respuesta = await self.async_client.get("/api/async/pedidos/?cursor=xx")
+        self.assertEqual(respuesta.status_code, 404)
+
+
+class ModoLigeroTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        crear_datos(15)
+        crear_datos(3, inicio=100)
+
+    def test_salida_identica_al_serializador(self):
+        from rest_framework.renderers import JSONRenderer
+        from .lean import compilar, queryset_ligero
+        from . import serializers as s
+
+        for serializer_class in (s.ClienteSerializer, s.ProveedorSerializer, s.ProductoSerializer,
+                                 s.PedidoSerializer, s.FacturaSerializer, s.FacturaDetalleSerializer,
+                                 s.VentaClienteMesSerializer, s.VentaProductoMesSerializer):
+            with self.subTest(serializer=serializer_class.__name__):
+                plan = compilar(serializer_class)
+                self.assertIsNotNone(plan)
+                queryset = serializer_class.Meta.model.objects.order_by("pk")
+                self.assertEqual(JSONRenderer().render(list(queryset_ligero(queryset, plan))),
+                                 JSONRenderer().render(serializer_class(queryset, many=True).data))
+
+    def test_serializadores_no_admitidos(self):
+        from rest_framework import serializers
+        from .lean import compilar
+        from .serializers import FacturaDetalleBulkSerializer, ProductoSerializer
+
+        class ConMetodo(ProductoSerializer):
+            etiqueta = serializers.SerializerMethodField()
+
+            def get_etiqueta(self, obj):
+                return str(obj)
+
+        self.assertIsNone(compilar(ConMetodo))
+        self.assertIsNone(compilar(FacturaDetalleBulkSerializer))
+
+    def test_listados_identicos_con_y_sin_modo_ligero(self):
+        from unittest import mock
+        from .views import PedidoViewSet, FacturaDetalleViewSet
+
+        for vista, url in ((PedidoViewSet, "/api/pedidos/"), (FacturaDetalleViewSet, "/api/facturas-detalle/")):
+            for parametros in ("", "?page=2", "?producto=%d" % Producto.objects.first().pk):
+                with self.subTest(url=url + parametros):
+                    paginas = []
+                    for ligero in (True, False):
+                        with mock.patch.object(vista, "lean_list", ligero):
+                            primera = self.client.get(url + parametros)
+                            siguiente = primera.json()["next"]
+                            segunda = self.client.get(siguiente) if siguiente else None
+                        paginas.append((primera.content, segunda and segunda.content))
+                    self.assertEqual(paginas[0], paginas[1])
+
+    def test_consultas_de_un_listado_ligero(self):
+        with self.assertNumQueries(2):  # Validadores de la página y la SELECT con values_list
+            self.client.get("/api/facturas-detalle/")
+
+
+class GenerarDatosTests(TestCase):
+    def test_volumenes_y_coherencia(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.db.models import Sum
+        from .models import VentaClienteMes
+        from .rollups import IMPORTE_LINEA
+
+        crear_datos(2)  # Los datos nuevos se añaden a los existentes
+        call_command("generar_datos", clientes=20, proveedores=3, productos=30, pedidos=50, facturas=40,
+                     lineas=4, lote=7, stdout=StringIO())
+        self.assertEqual(Cliente.objects.count(), 21)
+        self.assertEqual(Producto.objects.count(), 32)
+        self.assertEqual(Pedido.objects.count(), 52)
+        self.assertEqual(Factura.objects.count(), 41)
+
+        # El importe de cada factura es la suma de sus líneas, y los resúmenes cuadran
+        factura = Factura.objects.order_by("-num").first()
+        self.assertEqual(factura.importe,
+                         factura.facturadetalle_set.aggregate(total=Sum(IMPORTE_LINEA))["total"])
+        self.assertEqual(VentaClienteMes.objects.aggregate(total=Sum("importe"))["total"],
+                         FacturaDetalle.objects.aggregate(total=Sum(IMPORTE_LINEA))["total"])
+
+
+class MetricasTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from django.core.cache import cache
+        from . import metrics
+        cache.clear()
+        metrics.reiniciar()
+        self.client = APIClient()
+        self.personal = get_user_model().objects.create_user("admin", password="x", is_staff=True)
+        crear_datos(3)
+
+    def test_histogramas_por_accion(self):
+        self.client.get("/api/facturas/")
+        self.client.get("/api/facturas/")
+        self.client.get("/api/facturas/%d/" % Factura.objects.first().pk)
+
+        self.assertEqual(self.client.get("/api/metricas/").status_code, 403)
+        self.client.force_authenticate(self.personal)
+        datos = self.client.get("/api/metricas/").json()
+        listado = datos["FacturaViewSet.list"]
+        self.assertEqual(listado["wall_ms"]["count"], 2)
+        self.assertEqual(listado["queries"]["max"], 2)
+        self.assertEqual(listado["duplicate_queries"]["max"], 0)
+        self.assertGreater(listado["serializer_ms"]["sum"], 0)
+        self.assertGreater(listado["response_bytes"]["max"], 0)
+        self.assertGreater(datos["FacturaViewSet.retrieve"]["serializer_ms"]["sum"], 0)
+        self.assertEqual(listado["wall_ms"]["buckets"]["+Inf"], 2)
+        self.assertEqual(datos["FacturaViewSet.retrieve"]["wall_ms"]["count"], 1)
+
+        self.assertEqual(self.client.delete("/api/metricas/").status_code, 204)
+        self.assertNotIn("FacturaViewSet.list", self.client.get("/api/metricas/").json())
+
+    def test_tamano_sin_comprimir_y_serializadores_sin_parchear(self):
+        import gzip
+        from rest_framework import serializers
+        from . import metrics
+
+        crear_datos(20, inicio=100)
+        respuesta = self.client.get("/api/productos/?page=1", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(respuesta["Content-Encoding"], "gzip")
+        self.client.force_authenticate(self.personal)
+        tamano = self.client.get("/api/metricas/").json()["ProductoViewSet.list"]["response_bytes"]["max"]
+        self.assertEqual(tamano, len(gzip.decompress(respuesta.content)))
+        # Solo se miden los serializadores de la API: los de DRF siguen sin cambios
+        self.assertEqual(serializers.Serializer.data.fget.__module__, "rest_framework.serializers")
+        self.assertEqual(serializers.ListSerializer.data.fget.__module__, "rest_framework.serializers")
+        self.assertIsInstance(ProductoSerializer(Producto.objects.all(), many=True), metrics.ListSerializerMedido)
+
+    async def test_consultas_con_asgi_y_orm_asincrono(self):
+        from asgiref.sync import sync_to_async
+        from . import metrics
+
+        # Por ASGI: la vista síncrona y la asíncrona consultan la BD desde otros hilos
+        await self.async_client.get("/api/facturas/")
+        await self.async_client.get("/api/async/facturas/")
+        datos = await sync_to_async(metrics.resumen)()
+        self.assertEqual(datos["FacturaViewSet.list"]["queries"]["max"], 2)
+        asincrona = next(valor for endpoint, valor in datos.items() if "async" in endpoint)
+        self.assertEqual(asincrona["wall_ms"]["count"], 1)
+        self.assertGreater(asincrona["queries"]["max"], 0)
+        self.assertGreater(asincrona["db_ms"]["sum"], 0)
+
+    def test_consultas_duplicadas(self):
+        from .middleware import Medicion
+        medicion = Medicion(guardar_sql=False)
+        for sql in ["SELECT a WHERE id = %s"] * 3 + ["SELECT b"]:
+            medicion(lambda *args: None, sql, [1], False, {"connection": None})
+        self.assertEqual((medicion.consultas, medicion.duplicadas), (4, 2))
+
+    def test_registro_de_peticiones_lentas(self):
+        from django.test import override_settings
+        with override_settings(METRICAS_UMBRAL_LENTO_MS=0.0001), \
+                self.assertLogs("gestion_empresa.lento", level="WARNING") as registro:
+            self.client.get("/api/pedidos/?cliente=%d" % Cliente.objects.first().pk)
+        mensaje = registro.output[0]
+        self.assertIn("PedidoViewSet.list", mensaje)
+        self.assertIn("EXPLAIN", mensaje)
+        self.assertIn("Pedidos", mensaje)
+
+
+class ReplicaRouterTests(TestCase):
+    """Primario y réplica como dos bases de datos SQLite independientes."""
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        Cliente.objects.create(NombreCliente="En el primario", celular="1")
+        # Fila que solo existe en la réplica: permite saber de dónde se ha leído
+        Cliente.objects.using("replica").create(NombreCliente="En la réplica", celular="1")
+
+    def nombres(self):
+        return [c["NombreCliente"] for c in self.client.get("/api/clientes/").json()["results"]]
+
+    def test_lecturas_en_replica_y_lectura_de_lo_escrito(self):
+        from django.test import override_settings
+        with override_settings(REPLICA_DATABASES=["replica"]):
+            self.assertEqual(self.nombres(), ["En la réplica"])
+            # Tras escribir, el mismo cliente lee del primario (cookie de REPLICA_STICKY_SECONDS)
+            respuesta = self.client.post("/api/clientes/", {"NombreCliente": "Nuevo", "celular": "2"},
+                                         format="json")
+            self.assertEqual(respuesta.status_code, 201)
+            self.assertIn("db_primario", respuesta.cookies)
+            self.assertEqual(self.nombres(), ["En el primario", "Nuevo"])
+            # Otro cliente sin la cookie sigue leyendo de la réplica
+            self.assertEqual([c["NombreCliente"] for c in APIClient().get("/api/clientes/").json()["results"]],
+                             ["En la réplica"])
+
+    async def test_lecturas_en_replica_por_asgi(self):
+        from django.test import override_settings
+        with override_settings(REPLICA_DATABASES=["replica"]):
+            for url in ("/api/clientes/", "/api/async/clientes/"):
+                datos = (await self.async_client.get(url)).json()["results"]
+                self.assertEqual([c["NombreCliente"] for c in datos], ["En la réplica"], url)
+
+    def test_cadena_asincrona_sin_adaptar(self):
+        from django.core.handlers.asgi import ASGIHandler
+        from asgiref.sync import iscoroutinefunction
+
+        # Ningún middleware síncrono: con ASGI las vistas asíncronas no pasan a un hilo
+        with self.assertNoLogs("django.request", "DEBUG"):
+            handler = ASGIHandler()
+        self.assertTrue(iscoroutinefunction(handler._middleware_chain))
+
+    def test_sin_replicas_o_fuera_de_la_api(self):
+        from django.contrib.auth import get_user_model
+        from django.test import override_settings
+        from .routers import ReplicaRouter, lectura_en_replica
+
+        self.assertEqual(self.nombres(), ["En el primario"])  # REPLICA_DATABASES vacío
+        router = ReplicaRouter()
+        with override_settings(REPLICA_DATABASES=["replica"]):
+            self.assertIsNone(router.db_for_read(Cliente))  # Fuera de una petición GET
+            token = lectura_en_replica.set(True)
+            try:
+                self.assertEqual(router.db_for_read(Cliente), "replica")
+                self.assertIsNone(router.db_for_read(get_user_model()))  # Otras aplicaciones
+            finally:
+                lectura_en_replica.reset(token)
+
+
+class ImportarCsvTests(TestCase):
+    def setUp(self):
+        import tempfile
+        from django.core.cache import cache
+        cache.clear()
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.proveedor = Proveedor.objects.create(rut=77, razon_social="Proveedor", telefono="1")
+        self.producto = Producto.objects.create(descripcion="Antiguo", precio=Decimal("1.00"),
+                                                id_proveedor=self.proveedor)
+
+    def importar(self, recurso, contenido, **opciones):
+        import os
+        from io import StringIO
+        from django.core.management import call_command
+        ruta = os.path.join(self.directorio.name, "%s.csv" % recurso)
+        with open(ruta, "w", encoding="utf-8") as fichero:
+            fichero.write(contenido)
+        call_command("importar_csv", recurso, ruta, stdout=StringIO(), **opciones)
+        rechazos = ruta + ".rechazos.csv"
+        if not os.path.exists(rechazos):
+            return []
+        with open(rechazos, encoding="utf-8") as fichero:
+            return fichero.read().splitlines()[1:]
+
+    def test_altas_actualizaciones_y_rechazos(self):
+        # Caché del detalle del producto que se va a actualizar
+        self.assertEqual(APIClient().get("/api/productos/%d/" % self.producto.pk)["X-Cache"], "MISS")
+        rechazos = self.importar("productos", "\n".join([
+            "codigo,descripcion,precio,id_proveedor",
+            "%d,Actualizado,2.50,77" % self.producto.pk,
+            ",Nuevo 1,3.00,77",
+            ",Nuevo 2,3.00,999",        # Proveedor inexistente
+            ",Nuevo 3,no-es-precio,77",  # Precio no válido
+            ",,1.00,77",                 # Descripción obligatoria
+            ",Nuevo 4,4.00,77",
+        ]), bloque=2)
+
+        self.assertEqual(Producto.objects.count(), 3)
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.descripcion, self.producto.precio), ("Actualizado", Decimal("2.50")))
+        # Los rechazos se escriben en el orden en que se detectan dentro de cada bloque
+        rechazos = dict(r.split(",", 1) for r in rechazos)
+        self.assertEqual(sorted(rechazos), ["4", "5", "6"])
+        self.assertIn("id_proveedor: 999 no existe", rechazos["4"])
+        self.assertIn("precio", rechazos["5"])
+        # Registro de cambios: dos altas y una modificación
+        from .models import Cambio
+        registradas = Cambio.objects.filter(recurso="productos").exclude(clave=str(self.producto.pk))
+        self.assertEqual(list(registradas.values_list("operacion", flat=True)), ["A", "A"])
+        self.assertTrue(Cambio.objects.filter(clave=str(self.producto.pk), operacion="M").exists())
+        # La caché del producto actualizado se invalida
+        respuesta = APIClient().get("/api/productos/%d/" % self.producto.pk)
+        self.assertEqual((respuesta["X-Cache"], respuesta.json()["descripcion"]), ("MISS", "Actualizado"))
+
+    def test_proveedores_invalidan_la_cache_de_sus_productos(self):
+        cliente = APIClient()
+        url = "/api/productos/%d/" % self.producto.pk
+        for ruta in (url, "/api/productos/"):
+            cliente.get(ruta)
+            self.assertEqual(cliente.get(ruta)["X-Cache"], "HIT")
+        self.importar("proveedores", "rut,razon_social,telefono\n77,Renombrado,1\n")
+        # Productos muestra 'id_proveedor_razon_social': detalle y listado se vuelven a calcular
+        respuesta = cliente.get(url)
+        self.assertEqual((respuesta["X-Cache"], respuesta.json()["id_proveedor_razon_social"]),
+                         ("MISS", "Renombrado"))
+        respuesta = cliente.get("/api/productos/")
+        self.assertEqual((respuesta["X-Cache"], respuesta.json()["results"][0]["id_proveedor_razon_social"]),
+                         ("MISS", "Renombrado"))
+
+    def test_clave_repetida_y_cabecera_incompleta(self):
+        from django.core.management.base import CommandError
+        rechazos = self.importar("proveedores", "rut,razon_social,telefono\n5,Primera,1\n5,Segunda,2\n")
+        self.assertEqual(Proveedor.objects.get(rut=5).razon_social, "Segunda")
+        self.assertEqual(len(rechazos), 1)
+        self.assertTrue(rechazos[0].startswith("2,"))
+
+        with self.assertRaises(CommandError):
+            self.importar("clientes", "id,NombreCliente\n1,Sin celular\n")
+
+
+class PedidoLineasTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.cliente, self.productos, _ = crear_datos(30)
+        Pedido.objects.all().delete()
+
+    def alta(self, productos, **extra):
+        datos = {"cliente": self.cliente.pk, "fecha": "2025-03-01",
+                 "lineas": [{"producto": p.pk, "cantidad": 2} for p in productos], **extra}
+        return self.client.post("/api/pedidos/", datos, format="json")
+
+    def test_alta_con_lineas_en_una_peticion(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        consultas = []
+        for n in (2, 30):
+            with CaptureQueriesContext(connection) as ctx:
+                respuesta = self.alta(self.productos[:n])
+            self.assertEqual(respuesta.status_code, 201, respuesta.content)
+            consultas.append(len(ctx.captured_queries))
+        # Las consultas no dependen del número de líneas (validación e inserción en bloque)
+        self.assertEqual(consultas[0], consultas[1])
+
+        datos = respuesta.json()
+        self.assertEqual(len(datos["lineas"]), 30)
+        self.assertEqual(datos["lineas"][0]["producto_descripcion"], "Producto 0")
+        self.assertEqual(PedidoLinea.objects.filter(pedido=datos["id_pedido"]).count(), 30)
+        # El listado y el detalle devuelven las mismas líneas
+        detalle = self.client.get("/api/pedidos/%d/" % datos["id_pedido"]).json()
+        self.assertEqual(detalle["lineas"], datos["lineas"])
+        url = "/api/pedidos/?producto=%d" % self.productos[10].pk
+        self.assertEqual([p["id_pedido"] for p in self.client.get(url).json()["results"]], [datos["id_pedido"]])
+
+    def test_errores_de_validacion(self):
+        respuesta = self.alta([self.productos[0], self.productos[0]])
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn("repetido", str(respuesta.json()["lineas"]))
+        respuesta = self.alta([], lineas=[{"producto": 999999, "cantidad": 1}, {"producto": self.productos[0].pk,
+                                                                                 "cantidad": 0}])
+        self.assertEqual(respuesta.status_code, 400)
+        errores = str(respuesta.json()["lineas"])
+        self.assertIn("Producto 999999 no existe", errores)
+        self.assertIn("cantidad", errores)
+        self.assertEqual(self.alta([], lineas=[]).status_code, 400)
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_modificacion_de_lineas(self):
+        pedido = self.alta(self.productos[:3]).json()
+        url = "/api/pedidos/%d/" % pedido["id_pedido"]
+
+        # PATCH sin líneas: solo la cabecera
+        self.assertEqual(self.client.patch(url, {"fecha": "2025-03-02"}, format="json").status_code, 200)
+        self.assertEqual(PedidoLinea.objects.filter(pedido=pedido["id_pedido"]).count(), 3)
+
+        # PUT: cambia una cantidad, añade un producto y quita los que no aparecen
+        lineas = [{"producto": self.productos[0].pk, "cantidad": 5}, {"producto": self.productos[9].pk, "cantidad": 1}]
+        respuesta = self.client.put(url, {"cliente": self.cliente.pk, "fecha": "2025-03-02", "lineas": lineas},
+                                    format="json")
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([(l["producto"], l["cantidad"]) for l in respuesta.json()["lineas"]],
+                         [(self.productos[0].pk, 5), (self.productos[9].pk, 1)])
+        self.assertEqual(PedidoLinea.objects.filter(pedido=pedido["id_pedido"]).count(), 2)
+
+
+
+class PedidosALineasMigracionTests(TransactionTestCase):
+    # Migración de datos 0012 sobre el esquema de 0011 (Pedidos todavía con producto)
+
+    def setUp(self):
+        import importlib
+        from django.db import connection
+        from django.db.migrations.loader import MigrationLoader
+
+        self.migracion = importlib.import_module("gestion_empresa.migrations.0012_pedidos_a_lineas")
+        self.apps = MigrationLoader(None).project_state(("gestion_empresa", "0011_pedido_lineas")).apps
+        self.Pedido = self.apps.get_model("gestion_empresa", "Pedido")
+        campo = self.Pedido._meta.get_field("producto")
+        with connection.schema_editor() as editor:
+            editor.add_field(self.Pedido, campo)
+
+        def quitar_campo():
+            with connection.schema_editor() as editor:
+                editor.remove_field(self.Pedido, campo)
+        self.addCleanup(quitar_campo)
+
+    def migrar(self, funcion):
+        from django.db import connection
+
+        with connection.schema_editor() as editor:
+            funcion(self.apps, editor)
+
+    def test_cada_fila_pasa_a_una_linea_y_vuelve(self):
+        self.migracion.LOTE, lote = 2, self.migracion.LOTE  # Varios bloques
+        self.addCleanup(setattr, self.migracion, "LOTE", lote)
+        cliente, productos, _ = crear_datos(3)
+        PedidoLinea.objects.all().delete()
+        Pedido.objects.all().delete()
+        # Mismo cliente y fecha, y un producto repetido: siguen siendo pedidos distintos
+        filas = [productos[0], productos[1], productos[0], None]
+        pedidos = [self.Pedido.objects.create(cliente_id=cliente.pk, fecha=datetime.date(2025, 1, 1),
+                                              producto_id=producto and producto.pk).pk for producto in filas]
+
+        self.migrar(self.migracion.pedidos_a_lineas)
+        self.assertEqual(sorted(Pedido.objects.values_list("pk", flat=True)), pedidos)
+        self.assertEqual(sorted(PedidoLinea.objects.values_list("pedido", "producto", "cantidad")),
+                         [(pk, producto.pk, 1) for pk, producto in zip(pedidos, filas) if producto])
+
+        self.Pedido.objects.update(producto=None)
+        PedidoLinea.objects.create(pedido_id=pedidos[1], producto=productos[2], cantidad=4)
+        self.migrar(self.migracion.lineas_a_pedidos)
+        # Cada pedido recupera el producto de su primera línea; sin líneas, sin producto
+        self.assertEqual(list(self.Pedido.objects.order_by("pk").values_list("pk", "producto")),
+                         [(pk, producto and producto.pk) for pk, producto in zip(pedidos, filas)])
+
+class CambiosTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.cliente, self.productos, self.factura = crear_datos(3)
+        self.cursor = self.client.get("/api/cambios/").json()["cursor"]
+
+    def cambios(self, **params):
+        respuesta = self.client.get("/api/cambios/", {"cursor": self.cursor, **params})
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        datos = respuesta.json()
+        self.cursor = datos["cursor"]
+        return datos
+
+    def test_altas_modificaciones_y_bajas_en_cascada(self):
+        nuevo = self.client.post("/api/clientes/", {"NombreCliente": "Nuevo", "celular": "1"}).json()
+        self.client.patch("/api/clientes/%d/" % nuevo["id"], {"celular": "2"})
+        self.client.patch("/api/productos/%d/" % self.productos[0].pk, {"precio": "9.99"})
+        self.client.patch("/api/clientes/%d/" % self.cliente.pk, {"celular": "3"})
+
+        datos = self.cambios()
+        self.assertFalse(datos["hay_mas"])
+        cambios = {(c["recurso"], c["clave"]): c for c in datos["cambios"]}
+        # Alta y modificación del mismo objeto: un único alta con el estado actual
+        self.assertEqual(len(datos["cambios"]), 3)
+        self.assertEqual(cambios[("clientes", str(nuevo["id"]))]["operacion"], "alta")
+        self.assertEqual(cambios[("clientes", str(nuevo["id"]))]["datos"]["celular"], "2")
+        self.assertEqual(cambios[("productos", str(self.productos[0].pk))]["datos"]["precio"], "9.99")
+        self.assertEqual(cambios[("clientes", str(self.cliente.pk))]["operacion"], "modificacion")
+
+        # Borrado en cascada: proveedor -> productos -> líneas de pedido y de factura
+        Proveedor.objects.all().delete()
+        cambios = self.cambios()["cambios"]
+        bajas = {(c["recurso"], c["clave"]) for c in cambios if c["operacion"] == "baja"}
+        self.assertTrue({("proveedores", "1000")} | {("productos", str(p.pk)) for p in self.productos} <= bajas)
+        self.assertEqual(len([b for b in bajas if b[0] == "facturas-detalle"]), 3)
+        # Los pedidos siguen existiendo, sin líneas: se publican modificados
+        pedidos = {(c["operacion"], len(c["datos"]["lineas"])) for c in cambios if c["recurso"] == "pedidos"}
+        self.assertEqual(pedidos, {("modificacion", 0)})
+        self.assertEqual(self.cambios()["cambios"], [])
+
+    def test_campos_mostrados_en_otros_recursos(self):
+        def modificados():
+            return {(c["recurso"], c["clave"]) for c in self.cambios()["cambios"]}
+
+        producto, proveedor = self.productos[0], self.productos[0].id_proveedor
+        # El nombre del cliente aparece en sus pedidos y facturas
+        self.client.patch("/api/clientes/%d/" % self.cliente.pk, {"NombreCliente": "Otro nombre"})
+        pedidos = {("pedidos", str(pk)) for pk in Pedido.objects.values_list("pk", flat=True)}
+        self.assertEqual(modificados(),
+                         {("clientes", str(self.cliente.pk)), ("facturas", str(self.factura.pk))} | pedidos)
+        # La descripción del producto, en las líneas de pedido (su pedido) y de factura
+        self.client.patch("/api/productos/%d/" % producto.pk, {"descripcion": "Otra"})
+        self.assertEqual(modificados(), {
+            ("productos", str(producto.pk)),
+            ("pedidos", str(PedidoLinea.objects.get(producto=producto).pedido_id)),
+            ("facturas-detalle", str(FacturaDetalle.objects.get(producto=producto).pk)),
+        })
+        proveedor.razon_social = "Otra razón"
+        proveedor.save()
+        self.assertEqual(modificados(),
+                         {("proveedores", str(proveedor.pk))} | {("productos", str(p.pk)) for p in self.productos})
+        # Sin cambios en esos campos, solo el propio objeto
+        self.client.patch("/api/clientes/%d/" % self.cliente.pk, {"celular": "3"})
+        proveedor.save(update_fields=["telefono"])
+        self.assertEqual(modificados(), {("clientes", str(self.cliente.pk)), ("proveedores", str(proveedor.pk))})
+
+    def test_filtro_por_recurso_y_limite(self):
+        for i in range(5):
+            self.client.post("/api/clientes/", {"NombreCliente": "Cliente %d" % i, "celular": "1"})
+        self.client.patch("/api/productos/%d/" % self.productos[0].pk, {"precio": "9.99"})
+
+        vistos, peticiones = [], 0
+        while True:
+            datos = self.cambios(recursos="clientes", limite=2)
+            vistos += [c["datos"]["NombreCliente"] for c in datos["cambios"]]
+            peticiones += 1
+            if not datos["hay_mas"]:
+                break
+        self.assertEqual(vistos, ["Cliente %d" % i for i in range(5)])
+        self.assertEqual(peticiones, 3)
+        # El cursor ya ha pasado por delante del cambio del producto
+        self.assertEqual(self.cambios(recursos="productos")["cambios"], [])
+
+    def test_hueco_reciente_en_la_secuencia(self):
+        from django.utils import timezone
+        from .cambios import leer, posicion_estable
+        from .models import Cambio
+
+        ultima = posicion_estable()
+        Cambio.objects.create(seq=ultima + 1, recurso="clientes", clave="1", operacion="M")
+        # ultima + 2 sin confirmar todavía (transacción abierta)
+        Cambio.objects.create(seq=ultima + 3, recurso="clientes", clave="2", operacion="M")
+        self.assertEqual(posicion_estable(), ultima + 1)
+        self.assertEqual(leer(ultima)[0], [("clientes", "1", "M")])
+        # Pasado el margen el hueco se da por anulado
+        Cambio.objects.filter(seq__gt=ultima).update(fecha=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(posicion_estable(), ultima + 3)
+
+    def test_parametros_no_validos_y_cursor_caducado(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from .cambios import codificar_cursor
+        from .models import Cambio
+
+        respuesta = self.client.get("/api/cambios/", {"cursor": "basura", "limite": "0", "recursos": "x"})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(set(respuesta.json()), {"cursor", "limite", "recursos"})
+
+        self.client.patch("/api/clientes/%d/" % self.cliente.pk, {"celular": "3"})
+        Cambio.objects.update(fecha=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        call_command("purgar_cambios", dias=30, stdout=StringIO())
+        self.client.patch("/api/clientes/%d/" % self.cliente.pk, {"celular": "4"})
+        self.assertEqual(self.client.get("/api/cambios/", {"cursor": codificar_cursor(0)}).status_code, 410)
+
+
+class CamposDinamicosTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.cliente, self.productos, self.factura = crear_datos(3)
+
+    def consultas(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return respuesta.json(), [consulta["sql"] for consulta in ctx.captured_queries]
+
+    def test_fields_limita_columnas_y_joins(self):
+        datos, sql = self.consultas("/api/facturas/?fields=num,importe")
+        self.assertEqual(datos["results"], [{"num": self.factura.num, "importe": "0.00"}])
+        # Sin el nombre del cliente no hay JOIN, y solo se leen las columnas pedidas (más las del cursor)
+        self.assertNotIn("JOIN", sql[-1])
+        self.assertNotIn("updated_at", sql[-1].split(" FROM ")[0])
+
+        datos, sql = self.consultas("/api/facturas-detalle/?fields=cantidad,producto_descripcion")
+        self.assertEqual(datos["results"][0], {"producto_descripcion": "Producto 0", "cantidad": 2})
+        self.assertEqual(sql[-1].count("JOIN"), 1)
+        self.assertNotIn('"precio"', sql[-1].split(" FROM ")[0])
+
+    def test_expand_embebe_la_relacion(self):
+        datos, sql = self.consultas("/api/facturas/?expand=cliente&fields=num,cliente")
+        self.assertEqual(datos["results"][0]["cliente"], {
+            "id": self.cliente.pk, "NombreCliente": self.cliente.NombreCliente, "celular": "600",
+            "updated_at": datos["results"][0]["cliente"]["updated_at"]})
+        self.assertEqual(sql[-1].count("JOIN"), 1)
+
+        datos, sql = self.consultas("/api/facturas-detalle/?expand=producto")
+        producto = datos["results"][0]["producto"]
+        self.assertEqual((producto["codigo"], producto["id_proveedor_razon_social"]),
+                         (self.productos[0].pk, "Proveedor"))
+        # Producto y su proveedor en la misma SELECT: las consultas no crecen con las filas
+        self.assertEqual(len(sql), 2)
+        self.assertEqual(datos["results"][0]["factura_numero"], self.factura.num)
+
+    def test_pedidos_sin_lineas_ni_prefetch(self):
+        datos, sql = self.consultas("/api/pedidos/?fields=id_pedido,fecha")
+        self.assertEqual(set(datos["results"][0]), {"id_pedido", "fecha"})
+        self.assertEqual(len(sql), 2)  # Validadores y la SELECT, sin la consulta de las líneas
+        datos, _ = self.consultas("/api/pedidos/?fields=id_pedido,lineas&expand=cliente")
+        self.assertEqual(datos["results"][0]["lineas"][0]["producto_descripcion"], "Producto 0")
+
+    def test_detalle_exportacion_y_escrituras(self):
+        datos, _ = self.consultas("/api/productos/%d/?fields=descripcion" % self.productos[0].pk)
+        self.assertEqual(datos, {"descripcion": "Producto 0"})
+        respuesta = self.client.get("/api/productos/export/?formato=csv&fields=codigo,precio")
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(b"".join(respuesta.streaming_content).decode().splitlines()[0], "codigo,precio")
+        # En las escrituras los parámetros no cambian la validación ni la respuesta
+        respuesta = self.client.post("/api/clientes/?fields=celular",
+                                     {"NombreCliente": "Nuevo", "celular": "1"}, format="json")
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertIn("NombreCliente", respuesta.json())
+
+    def test_parametros_no_validos(self):
+        respuesta = self.client.get("/api/facturas/?fields=num,inexistente&expand=lineas")
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(set(respuesta.json()), {"fields", "expand"})
+        self.assertIn("inexistente", respuesta.json()["fields"][0])
+
+
+class RenderizadoTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        crear_datos(12)
+
+    def test_misma_salida_que_jsonrenderer(self):
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import JSONRapidoRenderer
+
+        datos = FacturaDetalleSerializer(FacturaDetalle.objects.all(), many=True).data
+        datos[0]["nota"] = "línea €"
+        datos[0]["alta"] = datetime.datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc)
+        self.assertEqual(JSONRapidoRenderer().render(datos), JSONRenderer().render(datos))
+        # Decimal sin pasar por un DecimalField: cadena exacta en lugar de float
+        self.assertEqual(JSONRapidoRenderer().render({"importe": Decimal("12345678901234.10")}),
+                         b'{"importe":"12345678901234.10"}')
+        self.assertEqual(JSONRapidoRenderer().render(None), b"")
+        # Con 'indent' se delega en JSONRenderer
+        self.assertIn(b'\n  "a": 1', JSONRapidoRenderer().render({"a": 1}, "application/json; indent=2"))
+
+    def test_compresion_negociada(self):
+        import gzip
+
+        normal = self.client.get("/api/facturas-detalle/")
+        comprimida = self.client.get("/api/facturas-detalle/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertNotIn("Content-Encoding", normal)
+        self.assertEqual(comprimida["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", comprimida["Vary"])
+        self.assertEqual(gzip.decompress(comprimida.content), normal.content)
+        self.assertLess(len(comprimida.content), len(normal.content))
+
+
+class BorradoYArchivoTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.cliente, self.productos, self.factura = crear_datos(5)
+        self.otro_cliente, self.otros_productos, self.otra_factura = crear_datos(2, inicio=100)
+        # Una factura de otro proveedor con una línea de este: pierde la línea y cambia de importe
+        FacturaDetalle.objects.create(factura=self.otra_factura, producto=self.productos[0], cantidad=4,
+                                      precio_unitario=Decimal("2.00"))
+
+    def resumenes(self):
+        from .models import VentaClienteMes, VentaProductoMes
+        # Las filas que quedan a cero equivalen a las que no existen
+        return tuple(sorted(modelo.objects.exclude(cantidad=0, importe=0).values_list(clave, "mes", "cantidad", "importe"))
+                     for modelo, clave in ((VentaClienteMes, "cliente"), (VentaProductoMes, "producto")))
+
+    def assertResumenesCoherentes(self):
+        from . import rollups
+        incrementales = self.resumenes()
+        rollups.reconstruir()
+        self.assertEqual(incrementales, self.resumenes())
+
+    def cambios(self, recurso, operacion):
+        from .models import Cambio
+        return Cambio.objects.filter(recurso=recurso, operacion=operacion).count()
+
+    def test_borrado_de_proveedor_por_bloques(self):
+        from .models import Cambio
+        from .services import borrar_proveedor_por_bloques
+
+        Cambio.objects.all().delete()
+        borrados = borrar_proveedor_por_bloques(self.productos[0].id_proveedor, tamano_bloque=2)
+        self.assertEqual(borrados, {"facturas_detalle": 6, "pedidos_linea": 5, "ventas_producto_mes": 5,
+                                    "productos": 5, "proveedores": 1})
+        self.assertEqual(list(Producto.objects.all()), self.otros_productos)
+        self.assertEqual(Pedido.objects.count(), 7)  # Como en la cascada: los pedidos quedan sin esas líneas
+        self.assertFalse(FacturaDetalle.objects.filter(factura=self.factura).exists())
+        self.otra_factura.refresh_from_db()
+        self.assertEqual(self.otra_factura.importe, Decimal("6.00"))  # Recalculado: 2 líneas de 2 x 1.50
+        self.assertResumenesCoherentes()
+        self.assertEqual((self.cambios("productos", "B"), self.cambios("facturas-detalle", "B"),
+                          self.cambios("proveedores", "B"), self.cambios("pedidos", "M")), (5, 6, 1, 5))
+        # Una modificación por bloque de líneas que toca la factura
+        self.assertEqual(set(Cambio.objects.filter(recurso="facturas").values_list("clave", flat=True)),
+                         {str(self.factura.pk), str(self.otra_factura.pk)})
+
+    def test_admin_confirma_con_recuentos_y_borra_por_bloques(self):
+        from django.contrib.auth import get_user_model
+        get_user_model().objects.create_superuser("admin", password="x")
+        self.client.login(username="admin", password="x")
+        proveedor = self.productos[0].id_proveedor
+        url = "/admin/gestion_empresa/proveedor/"
+        confirmacion = self.client.post(url, {"action": "delete_selected", "_selected_action": [proveedor.pk]})
+        self.assertContains(confirmacion, "Productos: 5")
+        respuesta = self.client.post(url, {"action": "delete_selected", "_selected_action": [proveedor.pk],
+                                           "post": "yes"})
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertFalse(Proveedor.objects.filter(pk=proveedor.pk).exists())
+        self.assertEqual(Producto.objects.count(), 2)
+        self.assertResumenesCoherentes()
+
+    def test_archivo_de_pedidos_y_facturas_antiguos(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import FacturaArchivo, FacturaDetalleArchivo, PedidoArchivo, PedidoLineaArchivo
+
+        self.otra_factura.fecha = datetime.date(2026, 3, 1)
+        self.otra_factura.save()
+        Pedido.objects.filter(cliente=self.otro_cliente).update(fecha=datetime.date(2026, 3, 1))
+        antes = self.resumenes()
+        detalle = FacturaDetalle.objects.filter(factura=self.factura).order_by("pk").first()
+
+        call_command("archivar", antes_de=datetime.date(2026, 1, 1), tamano_bloque=2, stdout=StringIO())
+        self.assertEqual(list(Factura.objects.all()), [self.otra_factura])
+        self.assertEqual(Pedido.objects.count(), 2)
+        self.assertEqual((PedidoArchivo.objects.count(), PedidoLineaArchivo.objects.count()), (5, 5))
+        self.assertEqual((FacturaArchivo.objects.count(), FacturaDetalleArchivo.objects.count()), (1, 5))
+        archivado = FacturaDetalleArchivo.objects.get(pk=detalle.pk)
+        self.assertEqual((archivado.factura_id, archivado.producto_id, archivado.cantidad,
+                          archivado.precio_unitario), (self.factura.pk, detalle.producto_id, 2, Decimal("1.50")))
+        self.assertEqual((self.cambios("facturas", "B"), self.cambios("facturas-detalle", "B"),
+                          self.cambios("pedidos", "B")), (1, 5, 5))
+        # Las ventas archivadas siguen en los resúmenes, también al reconstruirlos
+        self.assertEqual(self.resumenes(), antes)
+        self.assertResumenesCoherentes()
+
+        # Repetirlo no mueve nada; borrar productos con ventas archivadas las descuenta
+        call_command("archivar", antes_de=datetime.date(2026, 1, 1), stdout=StringIO())
+        self.assertEqual(FacturaArchivo.objects.count(), 1)
+        self.productos[1].delete()
+        self.assertResumenesCoherentes()
+        self.cliente.delete()
+        self.assertResumenesCoherentes()
+        self.assertEqual(FacturaDetalleArchivo.objects.count(), 5)  # El archivo conserva la historia
+
+
+class AdminListadosTests(TestCase):
+    LISTADOS = ["cliente", "proveedor", "producto", "pedido", "pedidolinea", "factura", "facturadetalle"]
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        get_user_model().objects.create_superuser("admin", password="x")
+        self.client.login(username="admin", password="x")
+        crear_datos(3)
+
+    def consultas(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as capturadas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return [consulta["sql"] for consulta in capturadas.captured_queries]
+
+    def test_consultas_constantes_por_listado(self):
+        antes = {modelo: len(self.consultas("/admin/gestion_empresa/%s/" % modelo)) for modelo in self.LISTADOS}
+        crear_datos(20, inicio=100)
+        for modelo in self.LISTADOS:
+            with self.subTest(modelo=modelo):
+                # Sesión y usuario, estadísticas, recuento y página; en pedidos y facturas, además,
+                # el rango de fechas y los años de date_hierarchy
+                self.assertEqual(antes[modelo], 7 if modelo in ("pedido", "factura") else 5)
+                self.assertEqual(len(self.consultas("/admin/gestion_empresa/%s/" % modelo)), antes[modelo])
+
+    def test_filtrado_sin_recuento_total(self):
+        sql = self.consultas("/admin/gestion_empresa/factura/?fecha__year=2025")
+        self.assertEqual(sum("COUNT(" in consulta for consulta in sql), 1)
+        respuesta = self.client.get("/admin/gestion_empresa/producto/?q=producto 1")
+        self.assertContains(respuesta, "Producto :")
+        self.assertEqual(respuesta.context["cl"].result_count, 1)
+
+    def test_recuento_estimado_en_tablas_grandes(self):
+        from unittest import mock
+        from django.db import connection
+        from .admin import ConteoEstimadoPaginator
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        crear_datos(2, inicio=100)  # Las estadísticas ya no coinciden con la tabla
+        with mock.patch.object(ConteoEstimadoPaginator, "minimo", 1):
+            sql = self.consultas("/admin/gestion_empresa/producto/")
+            respuesta = self.client.get("/admin/gestion_empresa/producto/")
+            self.assertEqual(respuesta.context["cl"].result_count, 3)
+            self.assertFalse(any("COUNT(" in consulta for consulta in sql))
+            # Con filtros el recuento es exacto
+            respuesta = self.client.get("/admin/gestion_empresa/producto/?q=producto")
+            self.assertEqual(respuesta.context["cl"].result_count, 5)
+
+
+class BatchRetrieveTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.cliente, self.productos, self.factura = crear_datos(5)
+
+    def test_orden_de_la_peticion_y_claves_inexistentes(self):
+        claves = [self.productos[3].pk, 999999, self.productos[0].pk, self.productos[3].pk]
+        with self.assertNumQueries(1):  # IN con el JOIN del proveedor
+            respuesta = self.client.get("/api/productos/batch/?ids=%s" % ",".join(map(str, claves)))
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual([p["codigo"] for p in datos["resultados"]], [self.productos[3].pk, self.productos[0].pk])
+        self.assertEqual(datos["resultados"][0], self.client.get("/api/productos/%d/" % claves[0]).json())
+        self.assertEqual(datos["no_encontrados"], [999999])
+
+    def test_post_con_lineas_anidadas(self):
+        pedidos = list(Pedido.objects.order_by("-pk").values_list("pk", flat=True)[:3])
+        with self.assertNumQueries(2):  # Pedidos y sus líneas con producto (prefetch)
+            respuesta = self.client.post("/api/pedidos/batch/", {"ids": pedidos}, format="json")
+        self.assertEqual([p["id_pedido"] for p in respuesta.json()["resultados"]], pedidos)
+        self.assertEqual(len(respuesta.json()["resultados"][0]["lineas"]), 1)
+        respuesta = self.client.get("/api/facturas/batch/?ids=%d&fields=num" % self.factura.pk)
+        self.assertEqual(respuesta.json()["resultados"], [{"num": self.factura.pk}])
+
+    def test_errores_y_limite(self):
+        from django.test import override_settings
+
+        for respuesta in (self.client.get("/api/clientes/batch/"),
+                          self.client.get("/api/clientes/batch/?ids=1,x"),
+                          self.client.post("/api/clientes/batch/", {"ids": "1,2"}, format="json")):
+            self.assertEqual(respuesta.status_code, 400)
+            self.assertIn("ids", respuesta.json())
+        with override_settings(API_BATCH_MAXIMO=3):
+            self.assertEqual(self.client.get("/api/clientes/batch/?ids=1,2,3").status_code, 200)
+            respuesta = self.client.get("/api/clientes/batch/?ids=1,2,3,4")
+            self.assertEqual(respuesta.status_code, 400)
+            self.assertIn("3", str(respuesta.json()["ids"]))
+
+
+class NumeracionFacturasTests(TestCase):
+    def setUp(self):
+        from . import numeracion
+        from .models import SerieFactura
+
+        numeracion.descartar_bloques()
+        self.addCleanup(numeracion.descartar_bloques)
+        self.client = APIClient()
+        self.cliente = Cliente.objects.create(NombreCliente="Cliente", celular="600")
+        SerieFactura.objects.create(codigo="A", siguiente=100, tamano_bloque=10)
+        SerieFactura.objects.create(codigo="B", siguiente=5000, hasta=5001, sin_huecos=True)
+
+    def alta(self, **extra):
+        # Cada alta es su propia transacción: el bloque reservado se reparte tras su commit (numeracion.py)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/api/facturas/", {"fecha": "2025-01-01", "importe": "0",
+                                                       "cliente": self.cliente.pk, **extra}, format="json")
+
+    def test_alta_sin_numero_usa_bloques_de_la_serie(self):
+        from .models import SerieFactura
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.assertEqual(self.alta().json()["num"], 100)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.alta().json()["num"], 101)
+        # El número sale del bloque reservado por el proceso, sin consultar la serie
+        self.assertFalse([c for c in consultas.captured_queries if "Series_Factura" in c["sql"]])
+        numeros = [self.alta().json()["num"] for _ in range(11)]
+        numeros.insert(0, 101)
+        self.assertEqual(numeros, list(range(101, 113)))
+        # Dos bloques reservados en total: 100-109 y 110-119
+        self.assertEqual(SerieFactura.objects.get(pk="A").siguiente, 120)
+        self.assertEqual(self.alta(num=7).json()["num"], 7)  # Número explícito, como antes
+        self.assertEqual(self.alta(num=8, serie="A").status_code, 400)
+        self.assertIn("no existe", str(self.alta(serie="X").json()["serie"]))
+
+    def test_alta_fallida_no_deja_el_bloque_en_el_proceso(self):
+        from django.db import transaction
+        from . import numeracion
+        from .models import SerieFactura
+
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError), transaction.atomic():
+            self.assertEqual(numeracion.siguiente_numero("A"), 100)
+            raise RuntimeError("alta fallida")
+        # La reserva se ha deshecho con el alta: ni la serie ni el proceso dan por usados 100-109
+        self.assertEqual(SerieFactura.objects.get(pk="A").siguiente, 100)
+        self.assertEqual(numeracion._bloques, {})
+        self.assertEqual([self.alta().json()["num"] for _ in range(2)], [100, 101])
+
+    def test_numero_de_la_serie_ya_usado_a_mano(self):
+        from .models import SerieFactura
+
+        # El primer número de un bloque y el siguiente dentro de un bloque ya reservado
+        self.assertEqual(self.alta(num=100).status_code, 201)
+        self.assertEqual(self.alta(num=111).status_code, 201)
+        self.assertEqual(self.alta(num=100).status_code, 400)
+        numeros = [self.alta() for _ in range(3)]
+        self.assertEqual([r.status_code for r in numeros], [201] * 3)
+        # El 100 se salta con su bloque (huecos); el 111, dentro del bloque 110-119
+        self.assertEqual([r.json()["num"] for r in numeros], [110, 112, 113])
+        self.assertEqual(SerieFactura.objects.get(pk="A").siguiente, 120)
+
+        # Serie sin huecos: se salta el número usado y la serie no se queda bloqueada en él
+        self.assertEqual(self.alta(num=5000).status_code, 201)
+        self.assertEqual(self.alta(serie="B").json()["num"], 5001)
+        self.assertIn("no tiene más números", str(self.alta(serie="B").json()["serie"]))
+
+    def test_serie_sin_huecos(self):
+        from django.db import transaction
+        from .numeracion import siguiente_numero
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.assertEqual(siguiente_numero("B"), 5000)
+            raise RuntimeError("alta fallida")
+        # El número del alta fallida no se ha consumido
+        self.assertEqual([self.alta(serie="B").json()["num"] for _ in range(2)], [5000, 5001])
+        self.assertIn("no tiene más números", str(self.alta(serie="B").json()["serie"]))
+
+
+class NumeracionConcurrenteTests(TransactionTestCase):
+    HILOS, ALTAS = 8, 25
+
+    def setUp(self):
+        from django.db import connection
+        from . import numeracion
+
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("SQLite en memoria no admite escrituras concurrentes: SQLITE_TEST_NAME (settings.py)")
+        from .models import SerieFactura
+
+        numeracion.descartar_bloques()
+        self.addCleanup(numeracion.descartar_bloques)
+        self.cliente = Cliente.objects.create(NombreCliente="Cliente", celular="600")
+        SerieFactura.objects.create(codigo="A", siguiente=1, tamano_bloque=7)
+        SerieFactura.objects.create(codigo="B", siguiente=100000, sin_huecos=True)
+
+    def altas_concurrentes(self, serie):
+        from concurrent.futures import ThreadPoolExecutor
+        from django.db import connection
+
+        def cajero(_):
+            cliente = APIClient()
+            try:
+                return [cliente.post("/api/facturas/", {"fecha": "2025-01-01", "importe": "0", "serie": serie,
+                                                        "cliente": self.cliente.pk}, format="json").json()["num"]
+                        for _ in range(self.ALTAS)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.HILOS) as pool:
+            return [num for nums in pool.map(cajero, range(self.HILOS)) for num in nums]
+
+    def test_sin_numeros_repetidos(self):
+        for serie, primero in (("A", 1), ("B", 100000)):
+            with self.subTest(serie=serie):
+                numeros = self.altas_concurrentes(serie)
+                self.assertEqual(len(numeros), self.HILOS * self.ALTAS)
+                self.assertEqual(len(set(numeros)), len(numeros))
+                self.assertEqual(Factura.objects.filter(num__in=numeros).count(), len(numeros))
+                if serie == "B":  # Sin huecos: números consecutivos
+                    self.assertEqual(sorted(numeros), list(range(primero, primero + len(numeros))))
+
+
+class InformesTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.client = APIClient()
+        # Cliente 0: 3 productos x 2 uds x 1.50 en enero; cliente 100: 2 productos más en febrero
+        self.cliente, self.productos, self.factura = crear_datos(3)
+        self.otro_cliente, self.otros_productos, self.otra_factura = crear_datos(2, inicio=100)
+        self.otra_factura.fecha = datetime.date(2025, 2, 10)
+        self.otra_factura.save()
+        FacturaDetalle.objects.filter(factura=self.otra_factura).update(cantidad=5)
+        from .rollups import reconstruir
+        reconstruir()
+        for factura in (self.factura, self.otra_factura):
+            Factura.objects.filter(pk=factura.pk).update(
+                importe=sum(d.cantidad * d.precio_unitario for d in factura.facturadetalle_set.all()))
+
+    def test_top_productos_y_ranking_de_clientes(self):
+        url = "/api/informes/top-productos/?desde=2025-01&hasta=2025-12&limite=3"
+        datos = self.client.get(url).json()
+        self.assertEqual([(p["posicion"], p["producto"], p["importe"]) for p in datos["resultados"]],
+                         [(1, self.otros_productos[0].pk, "7.50"), (1, self.otros_productos[1].pk, "7.50"),
+                          (3, self.productos[0].pk, "3.00")])
+        self.assertEqual(datos["resultados"][0]["descripcion"], "Producto 100")
+        datos = self.client.get("/api/informes/top-productos/?desde=2025-01&hasta=2025-01&criterio=cantidad").json()
+        self.assertEqual([p["cantidad"] for p in datos["resultados"]], [2, 2, 2])
+
+        datos = self.client.get("/api/informes/ranking-clientes/?desde=2025-01&hasta=2025-02").json()
+        self.assertEqual([(c["posicion"], c["nombre"], c["importe"]) for c in datos["resultados"]],
+                         [(1, "Cliente 100", "15.00"), (2, "Cliente 0", "9.00")])
+
+    def test_serie_de_ventas_por_periodo(self):
+        datos = self.client.get("/api/informes/serie-ventas/?desde=2024-12-31&hasta=2025-02-10&periodo=mes").json()
+        self.assertEqual(datos["resultados"], [
+            {"periodo": "2024-12-01", "facturas": 0, "importe": "0.00"},
+            {"periodo": "2025-01-01", "facturas": 1, "importe": "9.00"},
+            {"periodo": "2025-02-01", "facturas": 1, "importe": "15.00"},
+        ])
+        semanas = self.client.get("/api/informes/serie-ventas/?desde=2025-01-01&hasta=2025-02-10&periodo=semana")
+        semanas = semanas.json()["resultados"]
+        self.assertEqual((semanas[0]["periodo"], semanas[-1]["periodo"], len(semanas)), ("2024-12-30", "2025-02-10", 7))
+        dias = self.client.get("/api/informes/serie-ventas/?desde=2025-01-01&hasta=2025-01-02").json()["resultados"]
+        self.assertEqual([d["importe"] for d in dias], ["9.00", "0.00"])
+
+    def test_cache_por_parametros_y_errores(self):
+        url = "/api/informes/ranking-clientes/?desde=2025-01&hasta=2025-02"
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        self.assertEqual(self.client.get(url + "&limite=1")["X-Cache"], "MISS")
+        self.assertEqual(self.client.get("/api/cache/estadisticas/").json()["informes"]["hits"], 1)
+
+        respuesta = self.client.get("/api/informes/top-productos/?desde=2025-13&criterio=precio&limite=0")
+        self.assertEqual(set(respuesta.json()), {"desde", "criterio", "limite"})
+        respuesta = self.client.get("/api/informes/serie-ventas/?desde=2025-02-01&hasta=2025-01-01&periodo=año")
+        self.assertEqual(set(respuesta.json()), {"desde", "periodo"})
+        # Intervalo acotado según el periodo, y sin pasar de la última fecha representable
+        respuesta = self.client.get("/api/informes/serie-ventas/?desde=2025-01-01&hasta=9999-12-31")
+        self.assertEqual((respuesta.status_code, set(respuesta.json())), (400, {"hasta"}))
+        self.assertEqual(self.client.get("/api/informes/serie-ventas/?desde=2024-01-01&hasta=2025-01-01").status_code,
+                         400)
+        self.assertEqual(self.client.get("/api/informes/serie-ventas/?desde=2025-01-01&hasta=2025-12-31").status_code,
+                         200)
+        for periodo, desde, elementos in (("dia", "9999-12-30", 2), ("semana", "9999-12-01", 5),
+                                          ("mes", "9999-01-01", 12)):
+            respuesta = self.client.get("/api/informes/serie-ventas/",
+                                        {"desde": desde, "hasta": "9999-12-31", "periodo": periodo})
+            self.assertEqual(len(respuesta.json()["resultados"]), elementos)
+
+
+# Sustituye a trabajos.ejecutar en el pool: la primera vez mata su proceso antes de empezar el trabajo
+_MARCA_POOL = None
+
+
+def _morir_una_vez(pk):
+    import os
+
+    if not os.path.exists(_MARCA_POOL):
+        open(_MARCA_POOL, "w").close()
+        os._exit(1)
+    return "T"
+
+
+class TrabajosTests(TestCase):
+    def setUp(self):
+        import tempfile
+        from django.contrib.auth import get_user_model
+        from django.test import override_settings
+
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(TRABAJOS_DIR=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_superuser("admin", password="x"))
+        self.cliente, self.productos, self.factura = crear_datos(3)
+
+    def encolar(self, tipo, **parametros):
+        respuesta = self.client.post("/api/trabajos/", {"tipo": tipo, "parametros": parametros}, format="json")
+        self.assertEqual(respuesta.status_code, 202, respuesta.content)
+        return respuesta
+
+    def ejecutar_pendientes(self):
+        from django.core.management import call_command
+        from io import StringIO
+
+        call_command("trabajos", sin_pool=True, una_vez=True, stdout=StringIO())
+
+    def test_exportacion_en_segundo_plano(self):
+        respuesta = self.encolar("exportar", recurso="productos", formato="csv")
+        url = respuesta["Location"]
+        self.assertEqual(self.client.get(url).json()["estado"], "P")
+        self.ejecutar_pendientes()
+        trabajo = self.client.get(url).json()
+        self.assertEqual((trabajo["estado"], trabajo["resultado"]), ("T", {"filas": 3}))
+        descarga = self.client.get(trabajo["descarga"])
+        self.assertEqual(descarga.status_code, 200)
+        contenido = b"".join(descarga.streaming_content).decode()
+        self.assertEqual(contenido.splitlines()[0], "codigo,id_proveedor_razon_social,descripcion,precio,updated_at,id_proveedor")
+        self.assertEqual(len(contenido.splitlines()), 4)
+
+    def test_validacion_y_permisos(self):
+        respuesta = self.client.post("/api/trabajos/", {"tipo": "exportar", "parametros": {"recurso": "x"}},
+                                     format="json")
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn("recurso", respuesta.json()["parametros"])
+        respuesta = self.client.post("/api/trabajos/", {"tipo": "otro"}, format="json")
+        self.assertIn("tipo", respuesta.json())
+        self.assertEqual(APIClient().get("/api/trabajos/").status_code, 403)
+
+    def test_recalculo_de_importes_y_cambio_de_precios(self):
+        from .models import Cambio, Trabajo
+
+        otro = Proveedor.objects.create(rut=1, razon_social="Otro", telefono="600")
+        Producto.objects.create(descripcion="Caro", precio=Decimal("9000.00"), id_proveedor=otro)
+        self.encolar("recalcular_importes")
+        self.encolar("cambiar_precios", porcentaje="10", proveedor=self.productos[0].id_proveedor_id)
+        # El precio del producto caro no cabría en el campo: no cambia ninguno
+        self.encolar("cambiar_precios", porcentaje="50")
+        with self.assertLogs("gestion_empresa.trabajos", "ERROR"):
+            self.ejecutar_pendientes()
+        trabajos = list(Trabajo.objects.order_by("pk"))
+        self.assertEqual([t.estado for t in trabajos], ["T", "T", "F"])
+        self.assertEqual(trabajos[0].resultado, {"revisadas": 1, "corregidas": 1})
+        self.assertIn("ValueError", trabajos[2].error)
+        self.factura.refresh_from_db()
+        self.assertEqual(self.factura.importe, Decimal("9.00"))
+        self.assertEqual({p.precio for p in Producto.objects.all()}, {Decimal("1.65"), Decimal("9000.00")})
+        self.assertTrue(Cambio.objects.filter(recurso="productos", clave=str(self.productos[0].pk)).exists())
+        # Las facturas guardan su precio
+        self.assertEqual({d.precio_unitario for d in FacturaDetalle.objects.all()}, {Decimal("1.50")})
+
+    def test_un_trabajo_solo_se_toma_una_vez(self):
+        from .models import Trabajo
+        from . import trabajos
+
+        pk = self.encolar("reconstruir_resumenes").json()["id"]
+        self.assertEqual(trabajos.tomar("a:1", 5), [pk])
+        self.assertEqual(trabajos.tomar("b:2", 5), [])
+        # Solo vuelve a pendientes si sigue a nombre de quien lo tomó: nadie lo ha empezado
+        self.assertEqual(trabajos.devolver_pendientes("b:2", [pk]), 0)
+        # Worker inexistente en esta máquina: su trabajo queda como fallido al arrancar otro
+        Trabajo.objects.filter(pk=pk).update(ejecutor="%s:%d" % (trabajos.socket.gethostname(), 2 ** 22 + 1))
+        self.assertEqual(trabajos.marcar_interrumpidos(), 1)
+        self.assertEqual(Trabajo.objects.get(pk=pk).estado, Trabajo.FALLIDO)
+
+    def test_proceso_del_pool_muerto(self):
+        import os
+        from io import StringIO
+        from unittest import mock
+        from django.conf import settings
+        from django.core.management import call_command
+        from . import tests, trabajos
+
+        pk = self.encolar("reconstruir_resumenes").json()["id"]
+        salida, avisos = StringIO(), StringIO()
+        with mock.patch.object(tests, "_MARCA_POOL", os.path.join(settings.TRABAJOS_DIR, "muerto")), \
+                mock.patch.object(trabajos, "ejecutar", _morir_una_vez), \
+                mock.patch("gestion_empresa.management.commands.trabajos.connections.close_all"):
+            # Los procesos del pool no usan la BD: no se cierra la conexión con la transacción del test
+            call_command("trabajos", procesos=1, una_vez=True, stdout=salida, stderr=avisos)
+        # El trabajo no llegó a empezar: vuelve a pendientes y lo ejecuta el pool nuevo
+        self.assertIn("Pool de procesos roto: 1 trabajos devueltos a pendientes y 0 fallidos", avisos.getvalue())
+        self.assertIn("Trabajo %s: Terminado" % pk, salida.getvalue())
+
+
+class BenchApiTests(TestCase):
+    def test_escenario_completo(self):
+        import json
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+
+        crear_datos(5)
+        avisos = StringIO()
+        with tempfile.TemporaryDirectory() as directorio:
+            salida = os.path.join(directorio, "bench.json")
+            call_command("bench_api", iteraciones=2, salida=salida, stdout=StringIO(), stderr=avisos)
+            with open(salida, encoding="utf-8") as fichero:
+                resultados = json.load(fichero)["resultados"]
+        self.assertIn("facturas.create", resultados)
+        self.assertEqual({nombre: r["errores"] for nombre, r in resultados.items() if r["errores"]}, {})
+        # Trabajos (solo administradores) no es un recurso de datos: ni se mide ni falla
+        self.assertFalse([nombre for nombre in resultados if nombre.startswith("trabajos.")])
+        self.assertIn("trabajos: omitido", avisos.getvalue())
+        # Las altas del escenario se deshacen
+        self.assertEqual(Cliente.objects.count(), 1)
+
+
+class ArranqueTests(TestCase):
+    def test_perfil_de_produccion(self):
+        import os
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import CommandError, call_command
+
+        salida = StringIO()
+        # Cada medición es un proceso nuevo con DJANGO_PERFIL=produccion (solo variables de entorno)
+        with mock.patch.dict(os.environ, {"DB_ENGINE": "sqlite"}):
+            call_command("bench_arranque", perfiles=["produccion"], repeticiones=1, umbral_ms=0, stdout=salida)
+            with self.assertRaisesMessage(CommandError, "Arranque por encima de"):
+                call_command("bench_arranque", perfiles=["produccion"], repeticiones=1, umbral_ms=0.001,
+                             stdout=StringIO())
+        fila = salida.getvalue().splitlines()[1].split()
+        # perfil, importación, primera, total, segunda, estado, apps, apps de desarrollo
+        self.assertEqual((fila[0], fila[5], fila[7]), ("produccion", "200", "-"))
@@ -0,0 +1,217 @@
+# gestion_empresa/trabajos.py
+
+"""
+Trabajos en segundo plano sin broker externo: exportaciones completas,
+recálculos y mantenimiento que no deben ocupar a los workers web.
+
+- La API (/api/trabajos/) solo inserta la fila en Trabajo y responde 202;
+  el cliente consulta después el estado y descarga el fichero resultante.
+- 'manage.py trabajos' toma los pendientes por orden de llegada y los
+  ejecuta en un pool de procesos. Tomar un trabajo es una UPDATE
+  condicionada a que siga pendiente: varios workers, también en otras
+  máquinas contra la misma base de datos, no ejecutan dos veces el mismo.
+- Si un worker muere con trabajos en ejecución, el siguiente que arranca en
+  la misma máquina los marca como fallidos. No se repiten solos: no todos
+  son repetibles (cambiar_precios). Si solo muere un proceso del pool, el
+  worker crea otro pool y devuelve a pendientes los tomados que ningún
+  proceso llegó a empezar.
+
+Cada tipo se registra con @tarea(tipo, Parametros): el serializador valida
+los parámetros al encolar y la función recibe el trabajo y devuelve su
+resultado (JSON). Si genera un fichero, lo escribe en ruta_fichero() y
+guarda el nombre en trabajo.fichero.
+"""
+
+import logging
+import os
+import socket
+import traceback
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import cambios, exports, rollups, services
+from .models import Proveedor, Trabajo
+from .serializers import (
+    ClienteSerializer, FacturaDetalleSerializer, FacturaSerializer, PedidoSerializer, ProductoSerializer,
+    ProveedorSerializer
+)
+
+logger = logging.getLogger(__name__)
+
+# Tipo -> (función, serializador de los parámetros)
+TAREAS = {}
+
+# Recurso de la API -> serializador cuyas columnas se exportan
+EXPORTABLES = {
+    cambios.RECURSOS[serializer.Meta.model]: serializer
+    for serializer in (ClienteSerializer, ProveedorSerializer, ProductoSerializer, PedidoSerializer,
+                       FacturaSerializer, FacturaDetalleSerializer)
+}
+
+
+def tarea(tipo, parametros=serializers.Serializer):
+    def registrar(funcion):
+        TAREAS[tipo] = (funcion, parametros)
+        return funcion
+    return registrar
+
+
+def ruta_fichero(nombre):
+    return os.path.join(settings.TRABAJOS_DIR, nombre)
+
+
+def identificador_worker():
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+# Exportación completa de un recurso, con las columnas de <recurso>/export/
+class ExportarParametros(serializers.Serializer):
+    recurso = serializers.ChoiceField(choices=sorted(EXPORTABLES))
+    formato = serializers.ChoiceField(choices=sorted(exports.FORMATOS), default='ndjson')
+
+
+@tarea('exportar', ExportarParametros)
+def exportar(trabajo):
+    recurso, formato = trabajo.parametros['recurso'], trabajo.parametros['formato']
+    serializer = EXPORTABLES[recurso]
+    columnas = exports.columnas_exportables(serializer)
+    filas = exports.iterar_filas(serializer.Meta.model.objects.all(), [ruta for _, ruta, _ in columnas])
+    total = 0
+
+    def contadas():
+        nonlocal total
+        for fila in exports.convertir_filas(columnas, filas):
+            total += 1
+            yield fila
+
+    generador, _ = exports.FORMATOS[formato]
+    nombre = '%d-%s.%s' % (trabajo.pk, recurso, formato)
+    os.makedirs(settings.TRABAJOS_DIR, exist_ok=True)
+    # Se escribe aparte y se renombra al terminar: nunca queda un fichero a medias con el nombre final
+    temporal = ruta_fichero(nombre + '.tmp')
+    try:
+        with open(temporal, 'w', encoding='utf-8', newline='') as fichero:
+            fichero.writelines(generador([columna for columna, _, _ in columnas], contadas()))
+        os.replace(temporal, ruta_fichero(nombre))
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    trabajo.fichero = nombre
+    return {'filas': total}
+
+
+class RecalcularImportesParametros(serializers.Serializer):
+    tamano_bloque = serializers.IntegerField(min_value=1, max_value=10000, default=1000)
+
+
+@tarea('recalcular_importes', RecalcularImportesParametros)
+def recalcular_importes(trabajo):
+    revisadas, corregidas = services.recalcular_importes(trabajo.parametros['tamano_bloque'])
+    return {'revisadas': revisadas, 'corregidas': corregidas}
+
+
+class CambiarPreciosParametros(serializers.Serializer):
+    porcentaje = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=-99, max_value=1000)
+    proveedor = serializers.PrimaryKeyRelatedField(queryset=Proveedor.objects.all(), required=False,
+                                                   allow_null=True)
+
+
+@tarea('cambiar_precios', CambiarPreciosParametros)
+def cambiar_precios(trabajo):
+    parametros = trabajo.parametros
+    return {'productos': services.cambiar_precios(parametros['porcentaje'], parametros.get('proveedor'))}
+
+
+class ReconstruirResumenesParametros(serializers.Serializer):
+    tamano_bloque = serializers.IntegerField(min_value=1, max_value=10000, default=1000)
+
+
+@tarea('reconstruir_resumenes', ReconstruirResumenesParametros)
+def reconstruir_resumenes(trabajo):
+    clientes, productos = rollups.reconstruir(batch_size=trabajo.parametros['tamano_bloque'])
+    return {'ventas_cliente_mes': clientes, 'ventas_producto_mes': productos}
+
+
+def tomar(ejecutor, cantidad):
+    """Pasa a 'en ejecución' hasta 'cantidad' trabajos pendientes, los más antiguos, y devuelve sus claves."""
+    tomados = []
+    while len(tomados) < cantidad:
+        candidatos = list(Trabajo.objects.filter(estado=Trabajo.PENDIENTE).order_by('pk')
+                          .values_list('pk', flat=True)[:cantidad - len(tomados)])
+        if not candidatos:
+            break
+        for pk in candidatos:
+            # Otro worker puede haberlo tomado entre la lectura y la UPDATE: entonces no actualiza nada
+            if Trabajo.objects.filter(pk=pk, estado=Trabajo.PENDIENTE).update(
+                    estado=Trabajo.EJECUTANDO, ejecutor=ejecutor, iniciado=timezone.now()):
+                tomados.append(pk)
+    return tomados
+
+
+def devolver_pendientes(ejecutor, pks):
+    """Devuelve a pendientes los trabajos tomados por 'ejecutor' que ningún proceso ha empezado."""
+    return Trabajo.objects.filter(pk__in=pks, estado=Trabajo.EJECUTANDO, ejecutor=ejecutor).update(
+        estado=Trabajo.PENDIENTE, ejecutor='', iniciado=None)
+
+
+def marcar_fallido(pk, error):
+    return Trabajo.objects.filter(pk=pk, estado=Trabajo.EJECUTANDO).update(
+        estado=Trabajo.FALLIDO, error=error, terminado=timezone.now())
+
+
+def cerrar_conexiones_viejas():
+    """close_old_connections(), salvo en las conexiones con una transacción abierta (la del llamante)."""
+    for conexion in connections.all(initialized_only=True):
+        if not conexion.in_atomic_block:
+            conexion.close_if_unusable_or_obsolete()
+
+
+def ejecutar(pk):
+    """Ejecuta un trabajo ya tomado y guarda su resultado o su error; devuelve el estado final."""
+    # Como en cada petición web: los procesos del pool viven mucho, y una conexión caída o pasada de
+    # CONN_MAX_AGE durante un trabajo no debe hacer fallar el siguiente
+    cerrar_conexiones_viejas()
+    try:
+        # El proceso que lo ejecuta pasa a ser su ejecutor: si muere, el trabajo ya no se puede devolver
+        # a pendientes, y marcar_interrumpidos() lo reconoce por su pid
+        Trabajo.objects.filter(pk=pk, estado=Trabajo.EJECUTANDO).update(ejecutor=identificador_worker())
+        trabajo = Trabajo.objects.get(pk=pk)
+        try:
+            resultado = TAREAS[trabajo.tipo][0](trabajo)
+        except Exception:
+            logger.exception('Trabajo %s (%s) fallido', trabajo.pk, trabajo.tipo)
+            marcar_fallido(pk, traceback.format_exc())
+            return Trabajo.FALLIDO
+        Trabajo.objects.filter(pk=pk).update(estado=Trabajo.TERMINADO, resultado=resultado,
+                                             fichero=trabajo.fichero, terminado=timezone.now())
+        return Trabajo.TERMINADO
+    finally:
+        cerrar_conexiones_viejas()
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Existe, de otro usuario
+    return True
+
+
+def marcar_interrumpidos():
+    """
+    Marca como fallidos los trabajos en ejecución de workers de esta máquina
+    cuyo proceso ya no existe. Devuelve cuántos.
+    """
+    maquina = socket.gethostname()
+    en_ejecucion = Trabajo.objects.filter(estado=Trabajo.EJECUTANDO, ejecutor__startswith=maquina + ':')
+    interrumpidos = []
+    for pk, ejecutor in en_ejecucion.values_list('pk', 'ejecutor'):
+        nombre, _, pid = ejecutor.rpartition(':')
+        if nombre == maquina and not _proceso_vivo(int(pid)):
+            interrumpidos.append(pk)
+    return sum(marcar_fallido(pk, 'Interrumpido: el worker terminó sin completarlo.') for pk in interrumpidos)
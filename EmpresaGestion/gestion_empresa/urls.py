@@ -2,9 +2,12 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .async_views import VistaLecturaAsync
 from .views import (
     ClienteViewSet, ProveedorViewSet, ProductoViewSet,
-    PedidoViewSet, FacturaViewSet, FacturaDetalleViewSet
+    PedidoViewSet, FacturaViewSet, FacturaDetalleViewSet, TrabajoViewSet,
+    VentaClienteMesViewSet, VentaProductoMesViewSet, cache_estadisticas, cambios_desde, informe_ranking_clientes,
+    informe_serie_ventas, informe_top_productos, metricas
 )
 
 # Crea un enrutador por defecto
@@ -17,8 +20,38 @@ router.register(r'productos', ProductoViewSet)
 router.register(r'pedidos', PedidoViewSet)
 router.register(r'facturas', FacturaViewSet)
 router.register(r'facturas-detalle', FacturaDetalleViewSet)
+# Resúmenes de ventas precalculados (solo lectura)
+router.register(r'ventas-cliente-mes', VentaClienteMesViewSet)
+router.register(r'ventas-producto-mes', VentaProductoMesViewSet)
+# Trabajos en segundo plano: se encolan aquí y los ejecuta 'manage.py trabajos'
+router.register(r'trabajos', TrabajoViewSet)
+
+# Lectura asíncrona (ASGI) de los seis modelos: /api/async/<recurso>/ y /api/async/<recurso>/<pk>/
+RECURSOS_ASYNC = {
+    'clientes': ClienteViewSet,
+    'proveedores': ProveedorViewSet,
+    'productos': ProductoViewSet,
+    'pedidos': PedidoViewSet,
+    'facturas': FacturaViewSet,
+    'facturas-detalle': FacturaDetalleViewSet,
+}
+urls_async = []
+for recurso, viewset in RECURSOS_ASYNC.items():
+    vista = VistaLecturaAsync.as_view(viewset_class=viewset)
+    urls_async += [
+        path('%s/' % recurso, vista, name='async-%s-list' % recurso),
+        path('%s/<str:pk>/' % recurso, vista, name='async-%s-detail' % recurso),
+    ]
 
 # Las URLs generadas por el enrutador
 urlpatterns = [
+    path('cache/estadisticas/', cache_estadisticas, name='cache-estadisticas'),
+    path('metricas/', metricas, name='metricas'),
+    path('cambios/', cambios_desde, name='cambios'),
+    # Informes de ventas calculados en la base de datos, cacheados unos segundos (informes.py)
+    path('informes/top-productos/', informe_top_productos, name='informe-top-productos'),
+    path('informes/ranking-clientes/', informe_ranking_clientes, name='informe-ranking-clientes'),
+    path('informes/serie-ventas/', informe_serie_ventas, name='informe-serie-ventas'),
+    path('async/', include(urls_async)),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,38 +1,332 @@
 # gestion_empresa/views.py
 
-from rest_framework import viewsets
-from .models import Cliente, Proveedor, Producto, Pedido, Factura, FacturaDetalle
+import datetime
+
+from django.db.models import Prefetch
+from django.http import FileResponse, Http404
+from django.utils import timezone
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from . import cache, cambios, informes, metrics, rollups, trabajos
+from .cache import CachedResponseMixin
+from .conditional import ConditionalRequestMixin
+from .lean import LeanListMixin
+from .mixins import BatchRetrieveMixin, ExportMixin, PrefetchPlanMixin
+from .pagination import KeysetPagination
+from .models import (
+    Cambio, Cliente, Proveedor, Producto, Pedido, PedidoLinea, Factura, FacturaDetalle, Trabajo, VentaClienteMes,
+    VentaProductoMes
+)
 from .serializers import (
     ClienteSerializer, ProveedorSerializer, ProductoSerializer,
-    PedidoSerializer, FacturaSerializer, FacturaDetalleSerializer
+    PedidoSerializer, FacturaSerializer, FacturaDetalleSerializer,
+    FacturaDetalleBulkSerializer, TrabajoSerializer, VentaClienteMesSerializer, VentaProductoMesSerializer
 )
 
 # ViewSet para Cliente: Permite operaciones CRUD (Crear, Leer, Actualizar, Borrar)
-class ClienteViewSet(viewsets.ModelViewSet):
+class ClienteViewSet(ConditionalRequestMixin, PrefetchPlanMixin, ExportMixin, BatchRetrieveMixin,
+                     viewsets.ModelViewSet):
     queryset = Cliente.objects.all() # Define el conjunto de datos a usar
     serializer_class = ClienteSerializer # Define el serializador para este ViewSet
+    # ?nombre=ana (empieza por) y ?nombre_contiene=ana, sin distinguir mayúsculas
+    filtros = {'nombre': ('NombreCliente', 'prefijo'), 'nombre_contiene': ('NombreCliente', 'contiene')}
 
 # ViewSet para Proveedor
-class ProveedorViewSet(viewsets.ModelViewSet):
+class ProveedorViewSet(CachedResponseMixin, ConditionalRequestMixin, PrefetchPlanMixin, ExportMixin,
+                       BatchRetrieveMixin, viewsets.ModelViewSet):
     queryset = Proveedor.objects.all()
     serializer_class = ProveedorSerializer
+    cache_resource = 'proveedores' # Respuestas cacheadas; se invalidan desde signals.py
 
 # ViewSet para Producto
-class ProductoViewSet(viewsets.ModelViewSet):
+class ProductoViewSet(CachedResponseMixin, ConditionalRequestMixin, PrefetchPlanMixin, ExportMixin,
+                       BatchRetrieveMixin, viewsets.ModelViewSet):
     queryset = Producto.objects.all()
     serializer_class = ProductoSerializer
+    cache_resource = 'productos' # Respuestas cacheadas; se invalidan desde signals.py
+    filtros = {
+        'descripcion': ('descripcion', 'prefijo'),
+        'search': ('descripcion', 'contiene'),
+        'precio_min': ('precio', 'desde'),
+        'precio_max': ('precio', 'hasta'),
+        'proveedor': ('id_proveedor', 'exacto'),
+    }
 
 # ViewSet para Pedido
-class PedidoViewSet(viewsets.ModelViewSet):
+class PedidoViewSet(ConditionalRequestMixin, LeanListMixin, PrefetchPlanMixin, ExportMixin,
+                    BatchRetrieveMixin, viewsets.ModelViewSet):
     queryset = Pedido.objects.all()
     serializer_class = PedidoSerializer
+    lean_list = True # Listado serializado desde values_list (ver lean.py)
+    pagination_class = KeysetPagination # Paginación por clave; '?page=N' mantiene el modo clásico
+    keyset_ordering = ('fecha', 'pk')
+    filtros = {
+        'fecha_desde': ('fecha', 'desde'),
+        'fecha_hasta': ('fecha', 'hasta'),
+        'cliente': ('cliente', 'exacto'),
+        # Pedidos con una línea del producto: (pedido, producto) es único, no hay duplicados
+        'producto': ('lineas__producto', 'exacto'),
+    }
+    # Líneas con su producto en una sola consulta adicional por página
+    prefetch_related_fields = [Prefetch('lineas', queryset=PedidoLinea.objects.select_related('producto'))]
 
 # ViewSet para Factura
-class FacturaViewSet(viewsets.ModelViewSet):
+class FacturaViewSet(ConditionalRequestMixin, PrefetchPlanMixin, ExportMixin, BatchRetrieveMixin,
+                     viewsets.ModelViewSet):
     queryset = Factura.objects.all()
     serializer_class = FacturaSerializer
+    pagination_class = KeysetPagination # Paginación por clave; '?page=N' mantiene el modo clásico
+    keyset_ordering = ('fecha', 'pk')
+    filtros = {
+        'fecha_desde': ('fecha', 'desde'),
+        'fecha_hasta': ('fecha', 'hasta'),
+        'cliente': ('cliente', 'exacto'),
+    }
 
 # ViewSet para FacturaDetalle
-class FacturaDetalleViewSet(viewsets.ModelViewSet):
+class FacturaDetalleViewSet(ConditionalRequestMixin, LeanListMixin, PrefetchPlanMixin, ExportMixin,
+                            BatchRetrieveMixin, viewsets.ModelViewSet):
     queryset = FacturaDetalle.objects.all()
-    serializer_class = FacturaDetalleSerializer
\ No newline at end of file
+    serializer_class = FacturaDetalleSerializer
+    lean_list = True # Listado serializado desde values_list (ver lean.py)
+    pagination_class = KeysetPagination # Paginación por clave; '?page=N' mantiene el modo clásico
+    keyset_ordering = ('factura', 'pk')
+    filtros = {'factura': ('factura', 'exacto'), 'producto': ('producto', 'exacto')}
+
+    # POST /api/facturas-detalle/bulk/ : todas las líneas de una factura en una sola petición
+    @action(detail=False, methods=['post'], serializer_class=FacturaDetalleBulkSerializer)
+    def bulk(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+# Mixin para los resúmenes de ventas: filtros por clave y rango de meses (?desde=AAAA-MM&hasta=AAAA-MM)
+class VentaMesFiltroMixin:
+    filtro_clave = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        try:
+            if params.get(self.filtro_clave):
+                queryset = queryset.filter(**{self.filtro_clave: int(params[self.filtro_clave])})
+            if params.get('desde'):
+                queryset = queryset.filter(mes__gte=datetime.datetime.strptime(params['desde'], '%Y-%m').date())
+            if params.get('hasta'):
+                queryset = queryset.filter(mes__lte=datetime.datetime.strptime(params['hasta'], '%Y-%m').date())
+        except ValueError:
+            raise ValidationError('Parámetros no válidos: %s entero, desde/hasta con formato AAAA-MM.'
+                                  % self.filtro_clave)
+        return queryset
+
+# ViewSet de solo lectura para las ventas mensuales por cliente
+class VentaClienteMesViewSet(VentaMesFiltroMixin, PrefetchPlanMixin, BatchRetrieveMixin,
+                             viewsets.ReadOnlyModelViewSet):
+    queryset = VentaClienteMes.objects.all()
+    serializer_class = VentaClienteMesSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('mes', 'pk')
+    filtro_clave = 'cliente'
+
+# ViewSet de solo lectura para las ventas mensuales por producto
+class VentaProductoMesViewSet(VentaMesFiltroMixin, PrefetchPlanMixin, BatchRetrieveMixin,
+                             viewsets.ReadOnlyModelViewSet):
+    queryset = VentaProductoMes.objects.all()
+    serializer_class = VentaProductoMesSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('mes', 'pk')
+    filtro_clave = 'producto'
+
+# ViewSet para los trabajos en segundo plano (ver trabajos.py); uso interno: solo personal
+# POST /api/trabajos/ {"tipo": "exportar", "parametros": {"recurso": "facturas", "formato": "csv"}}
+class TrabajoViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin,
+                     viewsets.GenericViewSet):
+    queryset = Trabajo.objects.all()
+    serializer_class = TrabajoSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = KeysetPagination
+    filtros = {'estado': ('estado', 'exacto')}
+
+    def create(self, request, *args, **kwargs):
+        # Solo se encola: lo ejecuta 'manage.py trabajos'; el estado se consulta en la URL del trabajo
+        respuesta = super().create(request, *args, **kwargs)
+        respuesta.status_code = status.HTTP_202_ACCEPTED
+        respuesta['Location'] = self.reverse_action('detail', args=[respuesta.data['id']])
+        return respuesta
+
+    # GET /api/trabajos/<id>/descarga/ : el fichero generado, cuando el trabajo ha terminado
+    @action(detail=True, methods=['get'])
+    def descarga(self, request, pk=None):
+        trabajo = self.get_object()
+        if trabajo.estado != Trabajo.TERMINADO or not trabajo.fichero:
+            raise Http404('El trabajo no tiene fichero.')
+        try:
+            fichero = open(trabajos.ruta_fichero(trabajo.fichero), 'rb')
+        except FileNotFoundError:
+            raise Http404('El fichero del trabajo ya no existe.')
+        return FileResponse(fichero, as_attachment=True, filename=trabajo.fichero)
+
+    def perform_content_negotiation(self, request, force=False):
+        # La descarga no pasa por los renderers: se acepta cualquier cabecera Accept
+        return super().perform_content_negotiation(request, force=force or self.action == 'descarga')
+
+# Estadísticas de la caché de la API (aciertos/fallos por recurso) para monitorización
+@api_view(['GET'])
+def cache_estadisticas(request):
+    return Response(cache.estadisticas(['productos', 'proveedores', 'informes']))
+
+# Métricas de rendimiento por endpoint (histogramas del proceso); uso interno: solo personal
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def metricas(request):
+    if request.method == 'DELETE':
+        metrics.reiniciar()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(metrics.resumen())
+
+
+# ViewSet de cada recurso del registro de cambios: queryset, plan de relaciones y serializador
+VIEWSETS_CAMBIOS = {
+    cambios.RECURSOS[viewset.queryset.model]: viewset
+    for viewset in (ClienteViewSet, ProveedorViewSet, ProductoViewSet, PedidoViewSet, FacturaViewSet,
+                    FacturaDetalleViewSet)
+}
+
+class CursorCaducado(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'El cursor es anterior a los cambios conservados: descargue de nuevo los listados.'
+    default_code = 'cursor_caducado'
+
+# Sincronización incremental: altas, modificaciones y bajas posteriores a un cursor (ver cambios.py)
+# GET /api/cambios/?cursor=...&recursos=clientes,productos&limite=500
+@api_view(['GET'])
+def cambios_desde(request):
+    params = request.query_params
+    errores = {}
+    recursos = [recurso for recurso in params.get('recursos', '').split(',') if recurso]
+    if set(recursos) - set(VIEWSETS_CAMBIOS):
+        errores['recursos'] = ['Recursos admitidos: %s.' % ', '.join(VIEWSETS_CAMBIOS)]
+    try:
+        limite = int(params.get('limite', 500))
+        if not 1 <= limite <= 1000:
+            raise ValueError(limite)
+    except ValueError:
+        errores['limite'] = ['Debe ser un entero entre 1 y 1000.']
+    desde = None
+    if params.get('cursor'):
+        try:
+            desde = cambios.decodificar_cursor(params['cursor'])
+        except ValueError:
+            errores['cursor'] = ['Cursor no válido.']
+    if errores:
+        raise ValidationError(errores)
+
+    # Sin cursor: solo la posición actual, que el cliente guarda antes de descargar los listados
+    if desde is None:
+        return Response({'cursor': cambios.codificar_cursor(cambios.posicion_estable()),
+                         'hay_mas': False, 'cambios': []})
+    if cambios.caducado(desde):
+        raise CursorCaducado()
+
+    filas, hasta, hay_mas = cambios.leer(desde, recursos, limite)
+    # Estado actual de las altas y modificaciones: una consulta (más su plan) por recurso
+    por_recurso = {}
+    for recurso, clave, operacion in filas:
+        if operacion != Cambio.BAJA:
+            por_recurso.setdefault(recurso, []).append(clave)
+    datos = {}
+    for recurso, claves in por_recurso.items():
+        vista = VIEWSETS_CAMBIOS[recurso](request=request, format_kwarg=None, args=(), kwargs={},
+                                          action='retrieve')
+        objetos = list(vista.get_queryset().filter(pk__in=claves))
+        serializados = vista.get_serializer(objetos, many=True).data
+        datos.update(((recurso, str(objeto.pk)), dato) for objeto, dato in zip(objetos, serializados))
+
+    resultado = []
+    for recurso, clave, operacion in filas:
+        cambio = {'recurso': recurso, 'clave': clave, 'operacion': cambios.NOMBRES_OPERACION[operacion]}
+        if operacion != Cambio.BAJA:
+            if (recurso, clave) not in datos:
+                continue  # Borrado después: su baja llega con un cursor posterior
+            cambio['datos'] = datos[(recurso, clave)]
+        resultado.append(cambio)
+    return Response({'cursor': cambios.codificar_cursor(hasta), 'hay_mas': hay_mas, 'cambios': resultado})
+
+
+# --- Informes de ventas (ver informes.py) -------------------------------------
+
+MESES, DIAS = ('%Y-%m', 'AAAA-MM'), ('%Y-%m-%d', 'AAAA-MM-DD')
+
+def _parametros_informe(request, formato, desde_defecto, con_limite=False, **opciones):
+    """
+    desde/hasta con 'formato' ((formato de strptime, texto para el error)), 'limite' (entero
+    entre 1 y 100) si 'con_limite' y las opciones {nombre: (valores admitidos, por defecto)}.
+    """
+    params = request.query_params
+    errores, valores = {}, {}
+    hoy = timezone.localdate()
+    for nombre, defecto in (('desde', desde_defecto(hoy)), ('hasta', hoy)):
+        try:
+            valores[nombre] = (datetime.datetime.strptime(params[nombre], formato[0]).date()
+                               if params.get(nombre) else defecto)
+        except ValueError:
+            errores[nombre] = ['Formato %s.' % formato[1]]
+    if not errores and valores['desde'] > valores['hasta']:
+        errores['desde'] = ["Debe ser anterior o igual a 'hasta'."]
+    for nombre, (admitidos, defecto) in opciones.items():
+        valores[nombre] = params.get(nombre, defecto)
+        if valores[nombre] not in admitidos:
+            errores[nombre] = ['Valores admitidos: %s.' % ', '.join(admitidos)]
+    if con_limite:
+        try:
+            valores['limite'] = int(params.get('limite', 10))
+            if not 1 <= valores['limite'] <= 100:
+                raise ValueError(valores['limite'])
+        except ValueError:
+            errores['limite'] = ['Debe ser un entero entre 1 y 100.']
+    if errores:
+        raise ValidationError(errores)
+    return valores
+
+
+def _respuesta_informe(nombre, parametros, calcular):
+    datos, acierto = informes.en_cache(nombre, parametros, calcular)
+    respuesta = Response({**parametros, 'resultados': datos})
+    respuesta['X-Cache'] = 'HIT' if acierto else 'MISS'
+    return respuesta
+
+
+# Productos más vendidos por importe o cantidad entre dos meses (por defecto, los últimos 12)
+# GET /api/informes/top-productos/?desde=2025-01&hasta=2025-12&criterio=cantidad&limite=20
+@api_view(['GET'])
+def informe_top_productos(request):
+    p = _parametros_informe(request, MESES, lambda hoy: hoy.replace(year=hoy.year - 1, day=1), con_limite=True,
+                            criterio=(informes.CRITERIOS, 'importe'))
+    p['desde'], p['hasta'] = rollups.mes_de(p['desde']), rollups.mes_de(p['hasta'])
+    return _respuesta_informe('top-productos', p, lambda: informes.top_productos(**p))
+
+
+# Clientes con mayor importe de ventas entre dos meses (por defecto, los últimos 12)
+# GET /api/informes/ranking-clientes/?desde=2025-01&hasta=2025-12&limite=20
+@api_view(['GET'])
+def informe_ranking_clientes(request):
+    p = _parametros_informe(request, MESES, lambda hoy: hoy.replace(year=hoy.year - 1, day=1), con_limite=True)
+    p['desde'], p['hasta'] = rollups.mes_de(p['desde']), rollups.mes_de(p['hasta'])
+    return _respuesta_informe('ranking-clientes', p, lambda: informes.ranking_clientes(**p))
+
+
+# Facturas e importe por día, semana o mes entre dos fechas (por defecto, los últimos 30 días)
+# GET /api/informes/serie-ventas/?desde=2025-01-01&hasta=2025-03-31&periodo=semana
+@api_view(['GET'])
+def informe_serie_ventas(request):
+    p = _parametros_informe(request, DIAS, lambda hoy: hoy - datetime.timedelta(days=30),
+                            periodo=(informes.PERIODOS, 'dia'))
+    maximo = informes.MAXIMO_DIAS[p['periodo']]
+    if (p['hasta'] - p['desde']).days >= maximo:
+        mensaje = "Con periodo=%s, como mucho %d días desde 'desde'." % (p['periodo'], maximo)
+        raise ValidationError({'hasta': [mensaje]})
+    return _respuesta_informe('serie-ventas', p, lambda: informes.serie_ventas(**p))